@@ -1,6 +1,7 @@
 from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 import os
 from config import config
 
@@ -17,6 +18,10 @@ def create_app(config_name='default'):
     db.init_app(app)
     CORS(app)
     
+    # 初始化后台任务执行器
+    from .jobs import init_job_executors
+    init_job_executors(app)
+    
     # 注册蓝图
     from .api import videos_bp
     from .api.routes import health_bp
@@ -26,5 +31,23 @@ def create_app(config_name='default'):
     # 创建数据库表
     with app.app_context():
         db.create_all()
+        _upgrade_schema()
     
     return app
+
+def _upgrade_schema():
+    """为已存在的表补充模型中新增的列（create_all不会修改已有表）"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            print(f"数据库表 {table.name} 新增列: {column.name}")
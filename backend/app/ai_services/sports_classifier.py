@@ -2,6 +2,7 @@ import cv2
 import numpy as np
 from typing import List, Tuple, Dict
 import os
+from ..video_processing.frame_sampler import get_frame_sampler
 
 class SportsClassifier:
     """运动类型识别服务"""
@@ -24,41 +25,28 @@ class SportsClassifier:
             'athletics': self._detect_athletics_features
         }
     
-    def classify_sport(self, video_path: str) -> Dict[str, float]:
+    def classify_sport(self, video_path: str, analysis_width: int = None, 
+                       video_info: Dict = None) -> Dict[str, float]:
         """
         识别视频中的运动类型
         
         Args:
             video_path: 视频文件路径
+            analysis_width: 分析分辨率（宽度），为空时使用原始分辨率；
+                像素数量阈值和霍夫变换参数会按缩放比例调整
+            video_info: 已探测的视频信息（可选）
             
         Returns:
             运动类型及其置信度
         """
         try:
             # 提取视频帧进行分析
-            frames = self._extract_key_frames(video_path, num_frames=10)
+            frames, scale = get_frame_sampler().sample_array(
+                video_path, 10, width=analysis_width, pix_fmt='bgr24', video_info=video_info
+            )
             
             # 分析每一帧
-            sport_scores = {sport: 0.0 for sport in self.sport_keywords.keys()}
-            
-            for frame in frames:
-                frame_scores = self._analyze_frame(frame)
-                for sport, score in frame_scores.items():
-                    sport_scores[sport] += score
-            
-            # 计算平均分数
-            total_frames = len(frames)
-            if total_frames > 0:
-                for sport in sport_scores:
-                    sport_scores[sport] /= total_frames
-            
-            # 归一化分数
-            max_score = max(sport_scores.values())
-            if max_score > 0:
-                for sport in sport_scores:
-                    sport_scores[sport] = sport_scores[sport] / max_score
-            
-            return sport_scores
+            return self.normalize_scores(self.accumulate_frame_scores(frames, scale), len(frames))
             
         except Exception as e:
             print(f"运动类型识别错误: {e}")
@@ -66,28 +54,38 @@ class SportsClassifier:
             return {'basketball': 0.2, 'football': 0.2, 'tennis': 0.2, 
                    'swimming': 0.2, 'athletics': 0.2}
     
-    def _extract_key_frames(self, video_path: str, num_frames: int = 10) -> List[np.ndarray]:
-        """提取关键帧"""
-        frames = []
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            return frames
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        frame_indices = np.linspace(0, total_frames-1, num_frames, dtype=int)
-        
-        for idx in frame_indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if ret:
-                frames.append(frame)
-        
-        cap.release()
-        return frames
+    def accumulate_frame_scores(self, frames, scale: float = 1.0) -> Dict[str, float]:
+        """累加多帧的特征分数（分片分析时各分片分别累加，合并后再归一化）"""
+        sport_sums = {sport: 0.0 for sport in self.sport_keywords.keys()}
+        for frame in frames:
+            frame_scores = self._analyze_frame(frame, scale)
+            for sport, score in frame_scores.items():
+                sport_sums[sport] += score
+        return sport_sums
+    
+    def normalize_scores(self, sport_sums: Dict[str, float], total_frames: int) -> Dict[str, float]:
+        """由累加分数计算平均分数，并按最高分归一化"""
+        sport_scores = {sport: sport_sums.get(sport, 0.0) for sport in self.sport_keywords.keys()}
+        
+        # 计算平均分数
+        if total_frames > 0:
+            for sport in sport_scores:
+                sport_scores[sport] /= total_frames
+        
+        # 归一化分数
+        max_score = max(sport_scores.values())
+        if max_score > 0:
+            for sport in sport_scores:
+                sport_scores[sport] = sport_scores[sport] / max_score
+        
+        return sport_scores
     
-    def _analyze_frame(self, frame: np.ndarray) -> Dict[str, float]:
-        """分析单帧的运动特征"""
+    def _analyze_frame(self, frame: np.ndarray, scale: float = 1.0) -> Dict[str, float]:
+        """
+        分析单帧的运动特征
+        
+        scale: 帧相对原始分辨率的缩放比例，长度参数按scale、像素数量阈值按scale²调整
+        """
         scores = {sport: 0.0 for sport in self.sport_keywords.keys()}
         
         # 转换为灰度图
@@ -97,20 +95,24 @@ class SportsClassifier:
         edges = cv2.Canny(gray, 50, 150)
         
         # 检测线条
-        lines = cv2.HoughLinesP(edges, 1, np.pi/180, 50, 
-                               minLineLength=50, maxLineGap=10)
+        lines = cv2.HoughLinesP(edges, 1, np.pi/180, max(1, int(50 * scale)), 
+                               minLineLength=max(1, int(50 * scale)), 
+                               maxLineGap=max(1, int(10 * scale)))
         
         # 检测圆形
-        circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1, 20,
-                                 param1=50, param2=30, minRadius=10, maxRadius=100)
+        circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1, max(1, 20 * scale),
+                                 param1=50, param2=30, 
+                                 minRadius=max(1, int(10 * scale)), 
+                                 maxRadius=max(2, int(100 * scale)))
         
         # 分析特征
+        pixel_scale = scale * scale
         for sport, detector in self.feature_detectors.items():
-            scores[sport] = detector(frame, gray, edges, lines, circles)
+            scores[sport] = detector(frame, gray, edges, lines, circles, pixel_scale)
         
         return scores
     
-    def _detect_basketball_features(self, frame, gray, edges, lines, circles) -> float:
+    def _detect_basketball_features(self, frame, gray, edges, lines, circles, pixel_scale: float = 1.0) -> float:
         """检测篮球特征"""
         score = 0.0
         
@@ -120,8 +122,9 @@ class SportsClassifier:
         
         # 检测矩形（球场边界）
         if lines is not None:
-            horizontal_lines = sum(1 for line in lines if abs(line[0][1] - line[0][3]) < 10)
-            vertical_lines = sum(1 for line in lines if abs(line[0][0] - line[0][2]) < 10)
+            tolerance = 10 * pixel_scale ** 0.5
+            horizontal_lines = sum(1 for line in lines if abs(line[0][1] - line[0][3]) < tolerance)
+            vertical_lines = sum(1 for line in lines if abs(line[0][0] - line[0][2]) < tolerance)
             if horizontal_lines > 2 and vertical_lines > 2:
                 score += 0.4
         
@@ -129,12 +132,12 @@ class SportsClassifier:
         hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
         orange_mask = cv2.inRange(hsv, (5, 50, 50), (15, 255, 255))
         orange_pixels = np.sum(orange_mask > 0)
-        if orange_pixels > 1000:
+        if orange_pixels > 1000 * pixel_scale:
             score += 0.3
         
         return min(score, 1.0)
     
-    def _detect_football_features(self, frame, gray, edges, lines, circles) -> float:
+    def _detect_football_features(self, frame, gray, edges, lines, circles, pixel_scale: float = 1.0) -> float:
         """检测足球特征"""
         score = 0.0
         
@@ -146,18 +149,18 @@ class SportsClassifier:
         hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
         green_mask = cv2.inRange(hsv, (35, 50, 50), (85, 255, 255))
         green_pixels = np.sum(green_mask > 0)
-        if green_pixels > 5000:
+        if green_pixels > 5000 * pixel_scale:
             score += 0.4
         
         # 检测白色（球门线）
         white_mask = cv2.inRange(hsv, (0, 0, 200), (180, 30, 255))
         white_pixels = np.sum(white_mask > 0)
-        if white_pixels > 2000:
+        if white_pixels > 2000 * pixel_scale:
             score += 0.3
         
         return min(score, 1.0)
     
-    def _detect_tennis_features(self, frame, gray, edges, lines, circles) -> float:
+    def _detect_tennis_features(self, frame, gray, edges, lines, circles, pixel_scale: float = 1.0) -> float:
         """检测网球特征"""
         score = 0.0
         
@@ -165,24 +168,24 @@ class SportsClassifier:
         hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
         green_mask = cv2.inRange(hsv, (35, 50, 50), (85, 255, 255))
         green_pixels = np.sum(green_mask > 0)
-        if green_pixels > 3000:
+        if green_pixels > 3000 * pixel_scale:
             score += 0.4
         
         # 检测白色（网球场线）
         white_mask = cv2.inRange(hsv, (0, 0, 200), (180, 30, 255))
         white_pixels = np.sum(white_mask > 0)
-        if white_pixels > 1000:
+        if white_pixels > 1000 * pixel_scale:
             score += 0.3
         
         # 检测黄色（网球）
         yellow_mask = cv2.inRange(hsv, (20, 100, 100), (30, 255, 255))
         yellow_pixels = np.sum(yellow_mask > 0)
-        if yellow_pixels > 500:
+        if yellow_pixels > 500 * pixel_scale:
             score += 0.3
         
         return min(score, 1.0)
     
-    def _detect_swimming_features(self, frame, gray, edges, lines, circles) -> float:
+    def _detect_swimming_features(self, frame, gray, edges, lines, circles, pixel_scale: float = 1.0) -> float:
         """检测游泳特征"""
         score = 0.0
         
@@ -190,18 +193,18 @@ class SportsClassifier:
         hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
         blue_mask = cv2.inRange(hsv, (100, 50, 50), (130, 255, 255))
         blue_pixels = np.sum(blue_mask > 0)
-        if blue_pixels > 8000:
+        if blue_pixels > 8000 * pixel_scale:
             score += 0.6
         
         # 检测白色（泳道线）
         white_mask = cv2.inRange(hsv, (0, 0, 200), (180, 30, 255))
         white_pixels = np.sum(white_mask > 0)
-        if white_pixels > 2000:
+        if white_pixels > 2000 * pixel_scale:
             score += 0.4
         
         return min(score, 1.0)
     
-    def _detect_athletics_features(self, frame, gray, edges, lines, circles) -> float:
+    def _detect_athletics_features(self, frame, gray, edges, lines, circles, pixel_scale: float = 1.0) -> float:
         """检测田径特征"""
         score = 0.0
         
@@ -210,19 +213,19 @@ class SportsClassifier:
         red_mask1 = cv2.inRange(hsv, (0, 50, 50), (10, 255, 255))
         red_mask2 = cv2.inRange(hsv, (170, 50, 50), (180, 255, 255))
         red_pixels = np.sum(red_mask1 > 0) + np.sum(red_mask2 > 0)
-        if red_pixels > 3000:
+        if red_pixels > 3000 * pixel_scale:
             score += 0.5
         
         # 检测白色（跑道线）
         white_mask = cv2.inRange(hsv, (0, 0, 200), (180, 30, 255))
         white_pixels = np.sum(white_mask > 0)
-        if white_pixels > 1000:
+        if white_pixels > 1000 * pixel_scale:
             score += 0.3
         
         # 检测绿色（草地）
         green_mask = cv2.inRange(hsv, (35, 50, 50), (85, 255, 255))
         green_pixels = np.sum(green_mask > 0)
-        if green_pixels > 2000:
+        if green_pixels > 2000 * pixel_scale:
             score += 0.2
         
         return min(score, 1.0)
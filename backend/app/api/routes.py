@@ -1,13 +1,16 @@
 import os
 import uuid
+from datetime import datetime, timedelta
+from typing import Optional
 from flask import request, jsonify, current_app, Blueprint
 from werkzeug.utils import secure_filename
 from . import videos_bp
-from ..models import Video, ClipRequest
+from ..models import Video, ClipRequest, UploadSession
+from ..storage import (BlobStore, ChunkedUpload, ChunkError, ChunkAlreadyReceived,
+                       compute_content_hash, remember_content_hash, save_stream_with_hash)
 from .. import db
-from ..ai_services import SportsClassifier, TextAnalyzer
-from ..video_processing import FFmpegWrapper, MoviePyEditor
-import threading
+from ..jobs import QueueFullError, LIGHT_POOL, HEAVY_POOL, get_executor, final_render_job_id
+from ..jobs.tasks import resubmit_final_render
 import time
 
 # 创建健康检查蓝图
@@ -19,15 +22,76 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': time.time(),
-        'service': 'sports-video-editing-platform'
+        'service': 'sports-video-editing-platform',
+        'jobs': {name: executor.stats() 
+                 for name, executor in current_app.extensions['job_executors'].items()}
     })
 
+@health_bp.route('/health/cache', methods=['GET'])
+def cache_stats():
+    """
+    分析缓存和已编码片段缓存的状态
+    
+    命中/未命中次数汇总所有执行任务的进程（保存在缓存目录中），条目数和占用空间来自缓存目录
+    """
+    from ..video_processing.analysis_cache import get_analysis_cache
+    from ..video_processing.segment_cache import get_segment_cache
+    
+    stats = {}
+    if current_app.config.get('ANALYSIS_CACHE_DIR'):
+        stats['analysisCache'] = get_analysis_cache(
+            current_app.config['ANALYSIS_CACHE_DIR'],
+            current_app.config.get('ANALYSIS_CACHE_MAX_BYTES') or 1024 * 1024 * 1024
+        ).stats()
+    if current_app.config.get('SEGMENT_CACHE_DIR'):
+        stats['segmentCache'] = get_segment_cache(
+            current_app.config['SEGMENT_CACHE_DIR'],
+            current_app.config.get('SEGMENT_CACHE_MAX_BYTES') or 5 * 1024 * 1024 * 1024
+        ).stats()
+    return jsonify(stats)
+
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
 UPLOAD_FOLDER = 'storage/uploads'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def analysis_options() -> dict:
+    """后台任务使用的分析参数（任务可能在其他进程中执行，不能直接读取应用配置）"""
+    return {
+        'analysis_width': current_app.config.get('ANALYSIS_WIDTH') or None,
+        'analysis_mode': current_app.config.get('ANALYSIS_MODE', 'sampled'),
+        'analysis_fps': current_app.config.get('ANALYSIS_FPS'),
+        'shard_options': {
+            'min_duration': current_app.config.get('ANALYSIS_SHARD_MIN_DURATION', 0),
+            'min_shard_seconds': current_app.config.get('ANALYSIS_SHARD_SECONDS', 300),
+            'max_workers': current_app.config.get('ANALYSIS_SHARD_WORKERS') or None,
+            'start_method': current_app.config.get('JOB_PROCESS_START_METHOD', 'spawn')
+        },
+        'render_mode': current_app.config.get('RENDER_MODE', 'moviepy'),
+        'render_workers': current_app.config.get('RENDER_WORKERS') or None,
+        'preview_height': current_app.config.get('RENDER_PREVIEW_HEIGHT') or None,
+        'start_method': current_app.config.get('JOB_PROCESS_START_METHOD', 'spawn'),
+        'analysis_cache_dir': current_app.config.get('ANALYSIS_CACHE_DIR'),
+        'analysis_cache_max_bytes': current_app.config.get('ANALYSIS_CACHE_MAX_BYTES'),
+        'segment_cache_dir': current_app.config.get('SEGMENT_CACHE_DIR'),
+        'segment_cache_max_bytes': current_app.config.get('SEGMENT_CACHE_MAX_BYTES'),
+        'scratch_dir': current_app.config.get('SCRATCH_DIR'),
+        'scratch_tmpfs_dir': current_app.config.get('SCRATCH_TMPFS_DIR') or None,
+        'scratch_quota_bytes': current_app.config.get('SCRATCH_JOB_QUOTA_BYTES') or 0
+    }
+
+def queue_full_response(error: QueueFullError):
+    """任务队列已满时返回429，并通过Retry-After提示客户端重试时间"""
+    response = jsonify({
+        'error': '服务繁忙，任务队列已满，请稍后重试',
+        'pool': error.pool_name,
+        'retryAfter': error.retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @videos_bp.route('/upload', methods=['POST'])
 def upload_video():
     """视频上传接口"""
@@ -39,6 +103,11 @@ def upload_video():
         return jsonify({'error': '没有选择文件'}), 400
     
     if file and allowed_file(file.filename):
+        # 分析队列已满时直接拒绝，避免先保存大文件
+        executor = get_executor(LIGHT_POOL)
+        if executor.is_full():
+            return queue_full_response(QueueFullError(executor.name, executor.retry_after))
+        
         filename = secure_filename(file.filename)
         video_id = str(uuid.uuid4())
         filepath = os.path.join(UPLOAD_FOLDER, f"{video_id}_{filename}")
@@ -46,77 +115,347 @@ def upload_video():
         # 确保上传目录存在
         os.makedirs(UPLOAD_FOLDER, exist_ok=True)
         
-        # 保存文件
-        file.save(filepath)
+        # 保存文件，同时计算完整哈希
+        content_hash = save_stream_with_hash(file.stream, filepath)
+        fingerprint = upload_fingerprint(filepath)
+        filepath = store_upload(filepath, content_hash, fingerprint)
         
-        # 创建数据库记录
-        video = Video(
-            id=video_id,
-            filename=filename,
-            filepath=filepath,
-            status='uploaded'
-        )
-        db.session.add(video)
-        db.session.commit()
-        
-        # 启动后台任务：运动类型识别和视频分析
-        def analyze_video_background():
-            try:
-                # 运动类型识别
-                classifier = SportsClassifier()
-                sport_scores = classifier.classify_sport(filepath)
-                dominant_sport, confidence = classifier.get_dominant_sport(sport_scores)
-                
-                # 获取视频信息
-                try:
-                    ffmpeg = FFmpegWrapper()
-                    video_info = ffmpeg.get_video_info(filepath)
-                    duration = video_info.get('duration', 0)
-                except Exception as e:
-                    print(f"FFmpeg获取视频信息失败: {e}")
-                    duration = 0
-                
-                # 更新数据库 - 使用全局变量避免上下文问题
-                try:
-                    from app import create_app
-                    app = create_app('development')
-                    with app.app_context():
-                        # 重新查询视频对象
-                        video_obj = Video.query.get(video_id)
-                        if video_obj:
-                            video_obj.sport_type = dominant_sport
-                            video_obj.duration = duration
-                            video_obj.status = 'analyzed'
-                            db.session.commit()
-                            print(f"视频分析完成: {dominant_sport}, 时长: {duration}秒")
-                except Exception as e:
-                    print(f"数据库更新失败: {e}")
-                    
-            except Exception as e:
-                print(f"视频分析失败: {e}")
-                try:
-                    from app import create_app
-                    app = create_app('development')
-                    with app.app_context():
-                        video_obj = Video.query.get(video_id)
-                        if video_obj:
-                            video_obj.status = 'error'
-                            db.session.commit()
-                except Exception as db_error:
-                    print(f"数据库错误状态更新失败: {db_error}")
-        
-        # 启动后台线程
-        thread = threading.Thread(target=analyze_video_background)
-        thread.daemon = True
-        thread.start()
+        try:
+            body, status = register_upload(executor, video_id, filename, filepath, content_hash,
+                                           fingerprint)
+        except QueueFullError as e:
+            release_upload(filepath)
+            return queue_full_response(e)
         
-        return jsonify({
+        return jsonify(body), status
+    
+    return jsonify({'error': '不支持的文件格式'}), 400
+
+def stream_analysis_enabled() -> bool:
+    """
+    分块上传时是否边接收边计算运动时间线
+    
+    只在timeline模式下启用（其他模式使用采样分析，不需要完整时间线）。multipart表单上传
+    在进入视图前已由Werkzeug完整接收，没有可以重叠的接收过程，不做流式分析。
+    """
+    return bool(current_app.config.get('UPLOAD_STREAM_ANALYSIS')
+                and current_app.config.get('ANALYSIS_MODE') == 'timeline'
+                and current_app.config.get('ANALYSIS_CACHE_DIR'))
+
+def stream_analysis_params() -> tuple:
+    """与MoviePyEditor._load_motion_timeline一致的分析帧率和宽度"""
+    options = analysis_options()
+    return options.get('analysis_fps') or 2.0, options.get('analysis_width') or 160
+
+def save_stream_analysis(content_hash: str, result):
+    """把上传时算好的运动时间线写入分析缓存，分析任务和剪辑请求直接使用"""
+    if not result:
+        return
+    
+    from ..video_processing.analysis_cache import get_analysis_cache
+    
+    timeline, stats = result
+    fps, width = stream_analysis_params()
+    cache = get_analysis_cache(current_app.config['ANALYSIS_CACHE_DIR'],
+                               current_app.config.get('ANALYSIS_CACHE_MAX_BYTES') or 1024 * 1024 * 1024)
+    cache.save(content_hash, {'kind': 'timeline', 'fps': fps, 'width': width},
+               arrays={'timeline': timeline}, meta={'stats': stats})
+
+def upload_fingerprint(filepath: str) -> Optional[str]:
+    """
+    UPLOAD_HASH_MODE为sampled时上传文件的快速指纹，full模式返回None
+    
+    快速指纹在内容不同时也可能相同，只用于查找重复上传的候选；存储、分析缓存和片段缓存
+    都以上传时已经算出的完整SHA-256为键
+    """
+    if current_app.config.get('UPLOAD_HASH_MODE', 'full') != 'sampled':
+        return None
+    return compute_content_hash(filepath, 'sampled')
+
+def store_upload(filepath: str, content_hash: str, fingerprint: str = None) -> str:
+    """把上传文件按完整哈希移入内容寻址存储（内容相同时复用已有文件），返回存储中的路径"""
+    blob_path = BlobStore(current_app.config.get('BLOB_STORE_DIR', 'storage/blobs')).ingest(
+        filepath, content_hash)
+    remember_content_hash(blob_path, content_hash)
+    if fingerprint:
+        remember_content_hash(blob_path, fingerprint, 'sampled')
+    return blob_path
+
+def release_upload(filepath: str):
+    """没有视频记录或上传会话再引用该文件时删除文件及其关键帧索引"""
+    if (Video.query.filter_by(filepath=filepath).count()
+            or UploadSession.query.filter_by(filepath=filepath).count()):
+        return
+    
+    from ..video_processing.keyframe_index import KeyframeIndex
+    
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    KeyframeIndex.remove(filepath)
+
+def register_upload(executor, video_id: str, filename: str, filepath: str, content_hash: str,
+                    fingerprint: str = None):
+    """
+    创建视频记录：相同内容已分析过时直接继承其结果（运动类型、时长、元数据，分析缓存按内容哈希
+    共享），否则提交分析任务。返回 (响应体, 状态码)；队列已满时删除记录并抛出QueueFullError
+    """
+    query = Video.query.filter(Video.status == 'analyzed')
+    if fingerprint:
+        # 按快速指纹查找候选，是否为相同内容仍以完整哈希为准（不同文件的快速指纹可能相同）
+        query = query.filter(Video.fingerprint == fingerprint, Video.content_hash == content_hash)
+    else:
+        query = query.filter(Video.content_hash == content_hash)
+    original = query.order_by(Video.created_at).first()
+    
+    video = Video(
+        id=video_id,
+        filename=filename,
+        filepath=filepath,
+        status='uploaded',
+        content_hash=content_hash,
+        fingerprint=fingerprint
+    )
+    if original:
+        video.sport_type = original.sport_type
+        video.apply_video_info(original.video_info)
+        video.duration = original.duration
+        video.status = 'analyzed'
+    db.session.add(video)
+    db.session.commit()
+    
+    if original:
+        print(f"重复上传，复用视频 {original.id} 的分析结果")
+        return {
             'videoId': video_id,
-            'status': 'uploaded',
+            'status': 'analyzed',
+            'queuePosition': None,
+            'contentHash': content_hash,
+            'deduplicatedFrom': original.id,
             'message': '视频上传成功'
-        }), 201
+        }, 201
     
-    return jsonify({'error': '不支持的文件格式'}), 400
+    options = analysis_options()
+    options['content_hash'] = content_hash
+    try:
+        queue_position = executor.submit_task('analyze_video', video_id, filepath, options)
+    except QueueFullError:
+        db.session.delete(video)
+        db.session.commit()
+        raise
+    
+    return {
+        'videoId': video_id,
+        'status': 'uploaded',
+        'queuePosition': queue_position,
+        'contentHash': content_hash,
+        'message': '视频上传成功'
+    }, 201
+
+# ---- 可续传的分块上传：初始化 -> 按偏移上传分块（可并发、可重试） -> 完成 ----
+
+def _chunked_upload(session: UploadSession) -> ChunkedUpload:
+    return ChunkedUpload(session.filepath, session.total_size, session.chunk_size)
+
+def _abort_upload_analysis(upload_id: str):
+    if not stream_analysis_enabled():
+        return
+    
+    from ..video_processing.stream_analysis import pop_upload_analysis
+    
+    analysis = pop_upload_analysis(upload_id)
+    if analysis:
+        analysis.abort()
+
+def _discard_upload_session(session: UploadSession):
+    """
+    删除上传会话及其数据
+    
+    已完成的会话（有content_hash）的文件已移入内容寻址存储，可能与其他视频或会话共享，
+    先删除会话记录再按引用释放；未完成的会话删除分块文件和位图
+    """
+    _abort_upload_analysis(session.id)
+    db.session.delete(session)
+    db.session.flush()
+    if session.content_hash:
+        release_upload(session.filepath)
+    else:
+        _chunked_upload(session).abort()
+
+def _expire_upload_sessions():
+    """删除超过保留时间仍未完成的上传会话及其数据"""
+    ttl = current_app.config.get('UPLOAD_SESSION_TTL', 86400)
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    expired = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for session in expired:
+        _discard_upload_session(session)
+    if expired:
+        db.session.commit()
+
+def _finish_upload_analysis(upload_id: str):
+    """等待分块上传的流式分析处理完剩余数据；会话由其他进程创建时没有对应的分析，返回None"""
+    if not stream_analysis_enabled():
+        return None
+    
+    from ..video_processing.stream_analysis import pop_upload_analysis
+    
+    analysis = pop_upload_analysis(upload_id)
+    return analysis.finish() if analysis else None
+
+@videos_bp.route('/uploads', methods=['POST'])
+def create_upload_session():
+    """初始化分块上传，请求体: {"filename": ..., "size": 字节数, "chunkSize": 可选}"""
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': '不支持的文件格式'}), 400
+    
+    try:
+        total_size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': '缺少文件大小'}), 400
+    max_size = current_app.config.get('MAX_UPLOAD_SIZE') or current_app.config.get('MAX_CONTENT_LENGTH')
+    if total_size <= 0 or (max_size and total_size > max_size):
+        return jsonify({'error': '文件大小无效或超出限制'}), 400
+    
+    default_chunk = current_app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    max_chunk = current_app.config.get('UPLOAD_MAX_CHUNK_SIZE', 64 * 1024 * 1024)
+    try:
+        chunk_size = int(data.get('chunkSize') or default_chunk)
+    except (TypeError, ValueError):
+        chunk_size = default_chunk
+    chunk_size = max(256 * 1024, min(chunk_size, max_chunk))
+    
+    _expire_upload_sessions()
+    
+    video_id = str(uuid.uuid4())
+    session = UploadSession(
+        id=str(uuid.uuid4()),
+        video_id=video_id,
+        filename=filename,
+        filepath=os.path.join(UPLOAD_FOLDER, f"{video_id}_{filename}"),
+        total_size=total_size,
+        chunk_size=chunk_size
+    )
+    upload = _chunked_upload(session)
+    upload.create()
+    db.session.add(session)
+    db.session.commit()
+    
+    if stream_analysis_enabled():
+        # 后台线程跟随已连续写入的分块读取文件，送入流式分析
+        from ..video_processing.stream_analysis import start_upload_analysis
+        
+        fps, width = stream_analysis_params()
+        start_upload_analysis(session.id, upload, fps, width)
+    
+    return jsonify({
+        'uploadId': session.id,
+        'chunkSize': chunk_size,
+        'chunkCount': upload.chunk_count,
+        'uploadUrl': f'/api/videos/uploads/{session.id}'
+    }), 201
+
+@videos_bp.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """上传一个分块：PUT /uploads/<id>?offset=<字节偏移>，请求体为分块的原始数据"""
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({'error': '上传会话不存在'}), 404
+    if session.content_hash:
+        return jsonify({'error': '上传已完成'}), 409
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': '缺少offset参数'}), 400
+    if request.content_length is None:
+        return jsonify({'error': '缺少Content-Length'}), 411
+    
+    upload = _chunked_upload(session)
+    try:
+        index = upload.write_chunk(offset, request.stream, request.content_length)
+    except ChunkAlreadyReceived as e:
+        # 已写入的分块可能已计入内容哈希，覆盖会使哈希与文件不一致；重试的客户端按已收到处理
+        return jsonify({'error': str(e), 'receivedBytes': upload.received_bytes()}), 409
+    except ChunkError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 仍在上传的会话不会被过期清理（过期按最后一次收到分块的时间计算）
+    session.updated_at = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify({
+        'uploadId': session.id,
+        'chunk': index,
+        'receivedBytes': upload.received_bytes(),
+        'totalSize': session.total_size
+    })
+
+@videos_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    """查询上传进度，断线后根据missingChunks继续上传"""
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({'error': '上传会话不存在'}), 404
+    
+    upload = _chunked_upload(session)
+    missing = [] if session.content_hash else upload.missing_chunks()
+    return jsonify({
+        'uploadId': session.id,
+        'chunkSize': session.chunk_size,
+        'chunkCount': upload.chunk_count,
+        'totalSize': session.total_size,
+        'receivedBytes': session.total_size if session.content_hash else upload.received_bytes(),
+        'missingChunks': missing
+    })
+
+@videos_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload_session(upload_id):
+    """放弃上传"""
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({'error': '上传会话不存在'}), 404
+    
+    _discard_upload_session(session)
+    db.session.commit()
+    return jsonify({'message': '上传已取消'})
+
+@videos_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    """所有分块上传完成后创建视频记录并提交分析；队列已满时会话保留，客户端稍后重试"""
+    session = UploadSession.query.get(upload_id)
+    if not session:
+        return jsonify({'error': '上传会话不存在'}), 404
+    
+    executor = get_executor(LIGHT_POOL)
+    if executor.is_full():
+        return queue_full_response(QueueFullError(executor.name, executor.retry_after))
+    
+    if not session.content_hash:
+        upload = _chunked_upload(session)
+        try:
+            full_hash = upload.finalize()
+        except ChunkError as e:
+            return jsonify({'error': str(e), 'missingChunks': upload.missing_chunks()}), 409
+        
+        # 上传过程中已算出完整哈希，分析任务不再读取整个文件
+        remember_content_hash(session.filepath, full_hash)
+        session.content_hash = full_hash
+        session.fingerprint = upload_fingerprint(session.filepath)
+        save_stream_analysis(session.content_hash, _finish_upload_analysis(session.id))
+        session.filepath = store_upload(session.filepath, session.content_hash,
+                                        session.fingerprint)
+        db.session.commit()
+    
+    try:
+        body, status = register_upload(executor, session.video_id, session.filename,
+                                       session.filepath, session.content_hash,
+                                       session.fingerprint)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    db.session.delete(session)
+    db.session.commit()
+    return jsonify(body), status
 
 @videos_bp.route('/<video_id>/status', methods=['GET'])
 def get_video_status(video_id):
@@ -128,8 +467,10 @@ def get_video_status(video_id):
     return jsonify({
         'videoId': video.id,
         'status': video.status,
+        'queuePosition': get_executor(LIGHT_POOL).queue_position(video.id),
         'sportType': video.sport_type,
-        'duration': video.duration
+        'duration': video.duration,
+        'videoInfo': video.video_info
     })
 
 @videos_bp.route('/<video_id>/clip', methods=['POST'])
@@ -143,7 +484,11 @@ def request_clip(video_id):
     if not data or 'text' not in data:
         return jsonify({'error': '缺少文本输入'}), 400
     
-        # 创建剪辑请求
+    executor = get_executor(HEAVY_POOL)
+    if executor.is_full():
+        return queue_full_response(QueueFullError(executor.name, executor.retry_after))
+    
+    # 创建剪辑请求
     clip_request = ClipRequest(
         video_id=video_id,
         text_input=data['text'],
@@ -152,126 +497,31 @@ def request_clip(video_id):
     db.session.add(clip_request)
     db.session.commit()
     
-    # 启动后台剪辑任务
-    def process_clip_background():
-        try:
-            # 更新状态为处理中
-            try:
-                from app import create_app
-                app = create_app('development')
-                with app.app_context():
-                    clip_obj = ClipRequest.query.get(clip_request.id)
-                    if clip_obj:
-                        clip_obj.status = 'processing'
-                        db.session.commit()
-                        print(f"剪辑请求 {clip_request.id} 开始处理")
-            except Exception as e:
-                print(f"更新剪辑状态失败: {e}")
-            
-            # 在后台线程中重新查询视频对象
-            try:
-                with app.app_context():
-                    video_obj = Video.query.get(video_id)
-                    if not video_obj:
-                        print(f"视频 {video_id} 不存在")
-                        return
-                    
-                    # 文本分析
-                    text_analyzer = TextAnalyzer()
-                    analysis_result = text_analyzer.analyze_clip_request(
-                        data['text'], 
-                        video_obj.sport_type
-                    )
-                    
-                    print(f"AI分析结果: {analysis_result}")
-                    
-                    # 根据AI分析结果调整剪辑策略
-                    clip_target = analysis_result.get('clip_target', 'highlights')
-                    focus_moments = analysis_result.get('focus_moments', [])
-                    clip_style = analysis_result.get('clip_style', '标准剪辑')
-                    
-                    # 精彩瞬间检测 - 使用AI分析结果指导
-                    moviepy_editor = MoviePyEditor()
-                    highlight_segments = moviepy_editor.detect_highlight_moments(
-                        video_obj.filepath, 
-                        video_obj.sport_type,
-                        clip_target=clip_target,
-                        focus_moments=focus_moments
-                    )
-            except Exception as e:
-                print(f"查询视频对象失败: {e}")
-                return
-            
-            if not highlight_segments:
-                # 如果没有检测到精彩瞬间，使用均匀分布
-                video_duration = video_obj.duration or 60
-                segment_count = 5
-                segment_duration = min(8, video_duration / segment_count)
-                highlight_segments = []
-                for i in range(segment_count):
-                    start = i * segment_duration
-                    end = start + segment_duration
-                    highlight_segments.append((start, end))
-            
-            # 创建输出目录
-            output_dir = os.path.join(os.getcwd(), 'storage', 'results')
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # 生成输出文件名
-            output_filename = f"clip_{clip_request.id}.mp4"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            # 执行视频剪辑
-            success = moviepy_editor.create_highlight_video(
-                video_obj.filepath,
-                highlight_segments,
-                output_path,
-                clip_request.target_duration
-            )
-            
-            if success:
-                # 更新状态为完成
-                try:
-                    with app.app_context():
-                        clip_obj = ClipRequest.query.get(clip_request.id)
-                        if clip_obj:
-                            clip_obj.status = 'completed'
-                            clip_obj.result_path = output_path
-                            db.session.commit()
-                            print(f"剪辑请求 {clip_request.id} 完成")
-                except Exception as e:
-                    print(f"更新剪辑完成状态失败: {e}")
-            else:
-                # 更新状态为失败
-                try:
-                    with app.app_context():
-                        clip_obj = ClipRequest.query.get(clip_request.id)
-                        if clip_obj:
-                            clip_obj.status = 'error'
-                            db.session.commit()
-                            print(f"剪辑请求 {clip_request.id} 失败")
-                except Exception as e:
-                    print(f"更新剪辑失败状态失败: {e}")
-                    
-        except Exception as e:
-            print(f"视频剪辑失败: {e}")
-            try:
-                with app.app_context():
-                    clip_obj = ClipRequest.query.get(clip_request.id)
-                    if clip_obj:
-                        clip_obj.status = 'error'
-                        db.session.commit()
-            except Exception as db_error:
-                print(f"数据库错误状态更新失败: {db_error}")
-    
-    # 启动后台线程
-    thread = threading.Thread(target=process_clip_background)
-    thread.daemon = True
-    thread.start()
+    # 任务参数只包含基本类型，可在独立进程中执行
+    clip_id = clip_request.id
+    video_params = {
+        'filepath': video.filepath,
+        'sport_type': video.sport_type,
+        'duration': video.duration,
+        'info': video.video_info if video.width else None,
+        'content_hash': video.content_hash
+    }
+    
+    # 提交到渲染任务队列
+    try:
+        queue_position = executor.submit_task(
+            'render_clip', clip_id, clip_id, video_params, 
+            clip_request.text_input, clip_request.target_duration, analysis_options()
+        )
+    except QueueFullError as e:
+        db.session.delete(clip_request)
+        db.session.commit()
+        return queue_full_response(e)
     
     return jsonify({
-        'clipId': clip_request.id,
+        'clipId': clip_id,
         'status': 'pending',
+        'queuePosition': queue_position,
         'message': '剪辑请求已提交'
         }), 201
 
@@ -283,15 +533,36 @@ def get_clip_result(video_id, clip_id):
         return jsonify({'error': '剪辑请求不存在'}), 404
     
     if clip_request.status != 'completed':
-        return jsonify({
+        # 预览已生成时排队的是最终版本渲染任务
+        has_preview = clip_request.render_tier == 'preview'
+        job_id = final_render_job_id(clip_request.id) if has_preview else clip_request.id
+        response = {
             'clipId': clip_request.id,
             'status': clip_request.status,
-            'message': '剪辑处理中'
+            'renderTier': clip_request.render_tier,
+            'queuePosition': get_executor(HEAVY_POOL).queue_position(job_id),
+            'message': '预览已生成，正在渲染最终版本' if has_preview else '剪辑处理中'
+        }
+        if has_preview:
+            response['previewUrl'] = f'/api/videos/{video_id}/clip/{clip_id}/preview'
+        return jsonify(response)
+    
+    if clip_request.render_tier == 'preview':
+        # 渲染队列已满时以预览完成，最终版本稍后渲染（定时重新提交之外，查询时也尝试提交）
+        resubmit_final_render(clip_request)
+        return jsonify({
+            'clipId': clip_request.id,
+            'status': 'completed',
+            'renderTier': 'preview',
+            'queuePosition': get_executor(HEAVY_POOL).queue_position(final_render_job_id(clip_request.id)),
+            'previewUrl': f'/api/videos/{video_id}/clip/{clip_id}/preview',
+            'message': '预览已完成，最终版本稍后渲染'
         })
     
     return jsonify({
         'clipId': clip_request.id,
         'status': 'completed',
+        'renderTier': 'final',
         'downloadUrl': f'/api/videos/{video_id}/clip/{clip_id}/file',
         'previewUrl': f'/api/videos/{video_id}/clip/{clip_id}/preview',
         'message': '剪辑完成'
@@ -304,14 +575,14 @@ def delete_video(video_id):
     if not video:
         return jsonify({'error': '视频不存在'}), 404
     
-    # 删除文件
-    if os.path.exists(video.filepath):
-        os.remove(video.filepath)
-    
     # 删除数据库记录
+    filepath = video.filepath
     db.session.delete(video)
     db.session.commit()
     
+    # 内容相同的其他上传共享同一个文件，没有引用后才删除文件及其关键帧索引
+    release_upload(filepath)
+    
     return jsonify({'message': '视频删除成功'})
 
 @videos_bp.route('/<video_id>/clip/<clip_id>/download', methods=['GET'])
@@ -335,21 +606,22 @@ def download_clip(video_id, clip_id):
 
 @videos_bp.route('/<video_id>/clip/<clip_id>/preview', methods=['GET'])
 def preview_clip(video_id, clip_id):
-    """提供剪辑文件预览"""
+    """提供剪辑文件预览（最终版本完成前返回低分辨率预览）"""
     from flask import send_file
     
     clip_request = ClipRequest.query.get(clip_id)
     if not clip_request or clip_request.video_id != video_id:
         return jsonify({'error': '剪辑请求不存在'}), 404
     
-    if clip_request.status != 'completed':
+    playable_path = clip_request.playable_path
+    if not playable_path:
         return jsonify({'error': '剪辑尚未完成'}), 400
     
-    if not clip_request.result_path or not os.path.exists(clip_request.result_path):
+    if not os.path.exists(playable_path):
         return jsonify({'error': '文件不存在'}), 404
     
     return send_file(
-        clip_request.result_path,
+        playable_path,
         as_attachment=False,
         mimetype='video/mp4'
     )
@@ -0,0 +1,98 @@
+from flask import current_app
+from .executor import JobExecutor, QueueFullError
+from .redis_queue import RedisJobQueue, RedisBroker, MemoryBroker
+
+# 轻量任务（视频分析）与重量任务（剪辑渲染）使用独立的执行器，避免长时间渲染饿死分析任务
+LIGHT_POOL = 'light'
+HEAVY_POOL = 'heavy'
+
+# 剪辑的最终版本渲染作为单独的任务提交，任务ID为剪辑ID加该后缀
+FINAL_RENDER_SUFFIX = ':final'
+
+def final_render_job_id(clip_id: str) -> str:
+    return f'{clip_id}{FINAL_RENDER_SUFFIX}'
+
+def clip_id_from_job(job_id: str) -> str:
+    """从剪辑任务ID（预览或最终版本）得到剪辑ID"""
+    if job_id.endswith(FINAL_RENDER_SUFFIX):
+        return job_id[:-len(FINAL_RENDER_SUFFIX)]
+    return job_id
+
+def init_job_executors(app):
+    """
+    根据配置创建任务执行器并挂载到应用上
+    
+    JOB_BACKEND=local 时任务在API进程内的执行器中运行，回调复用该应用的上下文和数据库连接池；
+    JOB_BACKEND=redis 时任务写入Redis队列，由worker.py启动的工作进程消费；
+    REDIS_URL=memory:// 时队列只存在于本进程，由进程内的工作线程消费
+    """
+    if app.config.get('JOB_BACKEND', 'local') == 'redis':
+        queues = create_redis_queues(app)
+        app.extensions['job_executors'] = queues
+        if isinstance(queues[LIGHT_POOL].broker, MemoryBroker):
+            _start_memory_worker(app, queues)
+        return
+    
+    retry_after = app.config.get('JOB_RETRY_AFTER', 30)
+    mode = app.config.get('JOB_EXECUTION_MODE', 'thread')
+    start_method = app.config.get('JOB_PROCESS_START_METHOD', 'spawn')
+    app.extensions['job_executors'] = {
+        LIGHT_POOL: JobExecutor(
+            LIGHT_POOL,
+            max_workers=app.config.get('LIGHT_JOB_WORKERS', 2),
+            max_queue_size=app.config.get('LIGHT_JOB_QUEUE_SIZE', 20),
+            retry_after=retry_after,
+            mode=mode,
+            start_method=start_method,
+            app=app
+        ),
+        HEAVY_POOL: JobExecutor(
+            HEAVY_POOL,
+            max_workers=app.config.get('HEAVY_JOB_WORKERS', 1),
+            max_queue_size=app.config.get('HEAVY_JOB_QUEUE_SIZE', 10),
+            retry_after=retry_after,
+            mode=mode,
+            start_method=start_method,
+            app=app
+        )
+    }
+
+def create_redis_queues(app, broker=None) -> dict:
+    """创建分布式任务队列，broker为空时连接REDIS_URL（REDIS_URL=memory:// 使用进程内实现）"""
+    if broker is None:
+        redis_url = app.config.get('REDIS_URL', 'redis://localhost:6379/0')
+        if redis_url.startswith('memory://'):
+            broker = MemoryBroker()
+        else:
+            broker = RedisBroker.from_url(redis_url, app.config.get('JOB_QUEUE_PREFIX', 'video_jobs'))
+    
+    options = {
+        'retry_after': app.config.get('JOB_RETRY_AFTER', 30),
+        'visibility_timeout': app.config.get('JOB_VISIBILITY_TIMEOUT', 600),
+        'max_attempts': app.config.get('JOB_MAX_ATTEMPTS', 3),
+        'retry_backoff': app.config.get('JOB_RETRY_BACKOFF', 10),
+        'retry_backoff_max': app.config.get('JOB_RETRY_BACKOFF_MAX', 600)
+    }
+    return {
+        LIGHT_POOL: RedisJobQueue(LIGHT_POOL, broker,
+                                  max_queue_size=app.config.get('LIGHT_JOB_QUEUE_SIZE', 20), **options),
+        HEAVY_POOL: RedisJobQueue(HEAVY_POOL, broker,
+                                  max_queue_size=app.config.get('HEAVY_JOB_QUEUE_SIZE', 10), **options)
+    }
+
+def _start_memory_worker(app, queues: dict):
+    """进程内队列没有外部工作进程可以消费，在API进程中启动工作线程（分析任务优先）"""
+    from .worker import JobWorker
+    
+    concurrency = app.config.get('LIGHT_JOB_WORKERS', 2) + app.config.get('HEAVY_JOB_WORKERS', 1)
+    worker = JobWorker(app, [queues[LIGHT_POOL], queues[HEAVY_POOL]], concurrency=concurrency)
+    worker.start(daemon=True)
+    app.extensions['job_worker'] = worker
+
+def get_executor(name: str):
+    """获取当前应用的任务执行器（JobExecutor或RedisJobQueue）"""
+    return current_app.extensions['job_executors'][name]
+
+__all__ = ['JobExecutor', 'QueueFullError', 'RedisJobQueue', 'RedisBroker', 'MemoryBroker',
+           'LIGHT_POOL', 'HEAVY_POOL', 'init_job_executors', 'create_redis_queues', 'get_executor',
+           'final_render_job_id', 'clip_id_from_job']
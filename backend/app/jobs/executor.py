@@ -0,0 +1,203 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """任务队列已满，调用方应稍后重试"""
+    
+    def __init__(self, pool_name: str, retry_after: int):
+        super().__init__(f"任务队列 {pool_name} 已满")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+class JobExecutor:
+    """
+    有界的后台任务执行器：固定数量的工作线程 + 有限长度的等待队列
+    
+    mode='thread' 时任务直接在工作线程中执行；mode='process' 时工作线程只负责调度，
+    任务函数在独立的进程池中执行（绕开GIL），结果通过回调在API进程中写回数据库。
+    进程模式下任务函数及其参数、返回值必须可以被pickle。
+    
+    传入app时，回调在该应用的短生命周期app context中执行：每个回调获得独立的
+    scoped session，context结束时自动释放，所有任务共享同一个engine和连接池。
+    """
+    
+    def __init__(self, name: str, max_workers: int = 2, max_queue_size: int = 20,
+                 retry_after: int = 30, mode: str = 'thread', start_method: str = 'spawn',
+                 app=None):
+        self.name = name
+        self.app = app
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+        self.retry_after = retry_after
+        self.mode = mode
+        self.start_method = start_method
+        
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix=f'{name}-job')
+        self._process_pool = self._create_process_pool() if mode == 'process' else None
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # job_id -> 提交时间，尚未开始执行
+        self._running = {}  # job_id -> 开始时间
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._crashed = 0
+    
+    def is_full(self) -> bool:
+        """判断是否还能接收新任务"""
+        with self._lock:
+            return self._outstanding() >= self.max_workers + self.max_queue_size
+    
+    def submit(self, job_id: str, fn: Callable, *args,
+               start_callback: Callable = None, callback: Callable = None,
+               error_callback: Callable = None) -> int:
+        """
+        提交任务
+        
+        Args:
+            job_id: 任务ID
+            fn: 任务函数
+            start_callback: 任务开始执行时在API进程中调用，无参数
+            callback: 任务成功后在API进程中以返回值调用
+            error_callback: 任务失败（包括工作进程崩溃）后在API进程中以异常调用
+        
+        Returns:
+            排队位置：0表示立即执行，n表示前面还有n-1个等待中的任务
+            
+        Raises:
+            QueueFullError: 队列已满
+        """
+        with self._lock:
+            if self._outstanding() >= self.max_workers + self.max_queue_size:
+                self._rejected += 1
+                raise QueueFullError(self.name, self.retry_after)
+            
+            self._pending[job_id] = time.time()
+            position = self._position(job_id)
+        
+        self._executor.submit(self._run, job_id, fn, args,
+                              start_callback, callback, error_callback)
+        return position
+    
+    def submit_task(self, task_name: str, job_id: str, *args) -> int:
+        """按任务类型提交任务，回调从任务注册表中查找"""
+        from .tasks import TASK_HANDLERS
+        
+        handler = TASK_HANDLERS[task_name]
+        return self.submit(
+            job_id, handler['run'], *args,
+            start_callback=partial(handler['on_start'], job_id) if handler['on_start'] else None,
+            callback=partial(handler['on_success'], job_id),
+            error_callback=partial(handler['on_error'], job_id)
+        )
+    
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """查询任务的排队位置，0表示正在执行，None表示不在该执行器中"""
+        with self._lock:
+            if job_id in self._running:
+                return 0
+            if job_id in self._pending:
+                return self._position(job_id)
+            return None
+    
+    def stats(self) -> Dict:
+        """执行器运行状态"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'workers': self.max_workers,
+                'maxQueueSize': self.max_queue_size,
+                'running': len(self._running),
+                'queued': max(0, len(self._pending) - self._idle_workers()),
+                'mode': self.mode,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'crashed': self._crashed
+            }
+    
+    def shutdown(self, wait: bool = True):
+        """关闭执行器"""
+        self._executor.shutdown(wait=wait)
+        if self._process_pool:
+            self._process_pool.shutdown(wait=wait)
+    
+    def _create_process_pool(self) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context(self.start_method)
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+    
+    def _execute(self, fn: Callable, args: tuple):
+        """按执行模式运行任务函数"""
+        if self._process_pool is None:
+            return fn(*args)
+        
+        pool = self._process_pool
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # 工作进程异常退出（段错误、OOM等）只影响当前任务，重建进程池后继续服务
+            with self._lock:
+                self._crashed += 1
+                if self._process_pool is pool:
+                    print(f"⚠️ 任务进程池 {self.name} 中的工作进程崩溃，正在重建进程池")
+                    self._process_pool = self._create_process_pool()
+            pool.shutdown(wait=False)
+            raise
+    
+    def _run(self, job_id: str, fn: Callable, args: tuple,
+             start_callback: Optional[Callable], callback: Optional[Callable],
+             error_callback: Optional[Callable]):
+        """在工作线程中执行任务并维护排队状态"""
+        with self._lock:
+            self._pending.pop(job_id, None)
+            self._running[job_id] = time.time()
+        
+        try:
+            if start_callback:
+                self._invoke(start_callback)
+            result = self._execute(fn, args)
+            with self._lock:
+                self._completed += 1
+        except Exception as e:
+            print(f"后台任务 {self.name}/{job_id} 执行失败: {e}")
+            with self._lock:
+                self._failed += 1
+            self._invoke(error_callback, e)
+            return
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+        
+        self._invoke(callback, result)
+    
+    def _invoke(self, fn: Optional[Callable], *args):
+        """在应用上下文中执行回调，回调本身的异常不影响工作线程"""
+        if not fn:
+            return
+        try:
+            if self.app is None:
+                fn(*args)
+            else:
+                with self.app.app_context():
+                    fn(*args)
+        except Exception as e:
+            print(f"后台任务回调执行失败: {e}")
+    
+    def _outstanding(self) -> int:
+        return len(self._pending) + len(self._running)
+    
+    def _idle_workers(self) -> int:
+        return max(0, self.max_workers - len(self._running))
+    
+    def _position(self, job_id: str) -> int:
+        """等待中的任务在所有空闲线程被占满后的排队位置"""
+        index = list(self._pending).index(job_id)
+        return max(0, index + 1 - self._idle_workers())
@@ -0,0 +1,335 @@
+"""
+基于Redis的分布式任务队列
+
+投递语义为"至少一次"：任务被领取后进入in-flight集合并设置可见性超时，
+工作进程在超时前确认（ack）才会删除；工作进程崩溃或超时未确认的任务会重新入队。
+失败的任务按指数退避重试，超过最大次数后调用失败回调。反复导致工作进程崩溃的任务
+（段错误、OOM）不会经过失败处理，在可见性超时重新入队时检查尝试次数，超过最大次数的
+任务移入死信集合，由工作进程调用失败回调后删除。
+
+RedisBroker使用Lua脚本保证领取和重新入队的原子性；MemoryBroker是同一接口的
+进程内实现，用于单机调试和测试，不需要Redis服务。
+"""
+import json
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .executor import QueueFullError
+
+# 领取一个已到期的任务：从等待队列移到in-flight集合，并累加尝试次数
+CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+if #ids == 0 then
+    return nil
+end
+redis.call('ZREM', KEYS[1], ids[1])
+redis.call('ZADD', KEYS[2], tonumber(ARGV[1]) + tonumber(ARGV[2]), ids[1])
+local attempts = redis.call('HINCRBY', KEYS[4], ids[1], 1)
+return {ids[1], redis.call('HGET', KEYS[3], ids[1]), attempts}
+"""
+
+# 将可见性超时已过期的in-flight任务放回等待队列，已达到最大尝试次数的移入死信集合
+REQUEUE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+local requeued = 0
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[2], id)
+    local attempts = tonumber(redis.call('HGET', KEYS[3], id) or '0')
+    if attempts >= tonumber(ARGV[2]) then
+        redis.call('ZADD', KEYS[4], ARGV[1], id)
+    else
+        redis.call('ZADD', KEYS[1], ARGV[1], id)
+        requeued = requeued + 1
+    end
+end
+return requeued
+"""
+
+# 取出一个死信任务（之后由ack删除其数据）
+CLAIM_DEAD_SCRIPT = """
+local ids = redis.call('ZRANGE', KEYS[1], 0, 0)
+if #ids == 0 then
+    return nil
+end
+redis.call('ZREM', KEYS[1], ids[1])
+return {ids[1], redis.call('HGET', KEYS[2], ids[1]), redis.call('HGET', KEYS[3], ids[1])}
+"""
+
+
+class JobExpiredError(Exception):
+    """任务在可见性超时内多次未被确认（工作进程崩溃或被杀死），已达到最大尝试次数"""
+    
+    def __init__(self, job_id: str, attempts: int):
+        super().__init__(f"任务 {job_id} 执行{attempts}次均未完成（工作进程可能崩溃），不再重试")
+        self.job_id = job_id
+        self.attempts = attempts
+
+
+class RedisBroker:
+    """Redis存储层：等待队列和in-flight均为按时间排序的有序集合"""
+    
+    def __init__(self, client, prefix: str = 'video_jobs'):
+        self.client = client
+        self.prefix = prefix
+        self._claim = client.register_script(CLAIM_SCRIPT)
+        self._requeue = client.register_script(REQUEUE_SCRIPT)
+        self._claim_dead = client.register_script(CLAIM_DEAD_SCRIPT)
+    
+    @classmethod
+    def from_url(cls, url: str, prefix: str = 'video_jobs') -> 'RedisBroker':
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("使用Redis任务队列需要安装redis: pip install redis")
+        return cls(redis.Redis.from_url(url, decode_responses=True), prefix)
+    
+    def _keys(self, queue: str) -> Tuple[str, str, str, str]:
+        return (f'{self.prefix}:{queue}:queue', f'{self.prefix}:{queue}:inflight',
+                f'{self.prefix}:{queue}:payloads', f'{self.prefix}:{queue}:attempts')
+    
+    def _dead_key(self, queue: str) -> str:
+        return f'{self.prefix}:{queue}:dead'
+    
+    def push(self, queue: str, job_id: str, payload: Dict, available_at: float):
+        queue_key, _, payload_key, attempts_key = self._keys(queue)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(payload_key, job_id, json.dumps(payload))
+        pipe.hdel(attempts_key, job_id)
+        pipe.zadd(queue_key, {job_id: available_at})
+        pipe.execute()
+    
+    def claim(self, queue: str, now: float, visibility_timeout: float) -> Optional[Tuple[str, Dict, int]]:
+        result = self._claim(keys=list(self._keys(queue)), args=[now, visibility_timeout])
+        if not result:
+            return None
+        job_id, payload, attempts = result
+        return job_id, json.loads(payload or '{}'), int(attempts)
+    
+    def extend(self, queue: str, job_id: str, deadline: float):
+        _, inflight_key, _, _ = self._keys(queue)
+        self.client.zadd(inflight_key, {job_id: deadline}, xx=True)
+    
+    def ack(self, queue: str, job_id: str):
+        _, inflight_key, payload_key, attempts_key = self._keys(queue)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem(inflight_key, job_id)
+        pipe.zrem(self._dead_key(queue), job_id)
+        pipe.hdel(payload_key, job_id)
+        pipe.hdel(attempts_key, job_id)
+        pipe.execute()
+    
+    def retry(self, queue: str, job_id: str, available_at: float):
+        queue_key, inflight_key, _, _ = self._keys(queue)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrem(inflight_key, job_id)
+        pipe.zadd(queue_key, {job_id: available_at})
+        pipe.execute()
+    
+    def requeue_expired(self, queue: str, now: float, max_attempts: int) -> int:
+        queue_key, inflight_key, _, attempts_key = self._keys(queue)
+        return int(self._requeue(keys=[queue_key, inflight_key, attempts_key, self._dead_key(queue)],
+                                 args=[now, max_attempts]))
+    
+    def claim_dead(self, queue: str) -> Optional[Tuple[str, Dict, int]]:
+        _, _, payload_key, attempts_key = self._keys(queue)
+        result = self._claim_dead(keys=[self._dead_key(queue), payload_key, attempts_key])
+        if not result:
+            return None
+        job_id, payload, attempts = result
+        return job_id, json.loads(payload or '{}'), int(attempts or 0)
+    
+    def size(self, queue: str) -> int:
+        return int(self.client.zcard(self._keys(queue)[0]))
+    
+    def in_flight(self, queue: str) -> int:
+        return int(self.client.zcard(self._keys(queue)[1]))
+    
+    def rank(self, queue: str, job_id: str) -> Optional[int]:
+        queue_key, inflight_key, _, _ = self._keys(queue)
+        if self.client.zscore(inflight_key, job_id) is not None:
+            return 0
+        rank = self.client.zrank(queue_key, job_id)
+        return None if rank is None else rank + 1
+
+
+class MemoryBroker:
+    """RedisBroker的进程内实现，语义相同"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._inflight = {}
+        self._payloads = {}
+        self._attempts = {}
+        self._dead = {}
+    
+    def _state(self, queue: str):
+        return (self._queues.setdefault(queue, {}), self._inflight.setdefault(queue, {}),
+                self._payloads.setdefault(queue, {}), self._attempts.setdefault(queue, {}))
+    
+    def push(self, queue: str, job_id: str, payload: Dict, available_at: float):
+        with self._lock:
+            waiting, _, payloads, attempts = self._state(queue)
+            payloads[job_id] = json.loads(json.dumps(payload))
+            attempts.pop(job_id, None)
+            waiting[job_id] = available_at
+    
+    def claim(self, queue: str, now: float, visibility_timeout: float) -> Optional[Tuple[str, Dict, int]]:
+        with self._lock:
+            waiting, inflight, payloads, attempts = self._state(queue)
+            due = [(score, job_id) for job_id, score in waiting.items() if score <= now]
+            if not due:
+                return None
+            _, job_id = min(due)
+            del waiting[job_id]
+            inflight[job_id] = now + visibility_timeout
+            attempts[job_id] = attempts.get(job_id, 0) + 1
+            return job_id, payloads.get(job_id, {}), attempts[job_id]
+    
+    def extend(self, queue: str, job_id: str, deadline: float):
+        with self._lock:
+            _, inflight, _, _ = self._state(queue)
+            if job_id in inflight:
+                inflight[job_id] = deadline
+    
+    def ack(self, queue: str, job_id: str):
+        with self._lock:
+            _, inflight, payloads, attempts = self._state(queue)
+            inflight.pop(job_id, None)
+            self._dead.setdefault(queue, {}).pop(job_id, None)
+            payloads.pop(job_id, None)
+            attempts.pop(job_id, None)
+    
+    def retry(self, queue: str, job_id: str, available_at: float):
+        with self._lock:
+            waiting, inflight, _, _ = self._state(queue)
+            inflight.pop(job_id, None)
+            waiting[job_id] = available_at
+    
+    def requeue_expired(self, queue: str, now: float, max_attempts: int) -> int:
+        with self._lock:
+            waiting, inflight, _, attempts = self._state(queue)
+            dead = self._dead.setdefault(queue, {})
+            expired = [job_id for job_id, deadline in inflight.items() if deadline <= now]
+            requeued = 0
+            for job_id in expired:
+                del inflight[job_id]
+                if attempts.get(job_id, 0) >= max_attempts:
+                    dead[job_id] = now
+                else:
+                    waiting[job_id] = now
+                    requeued += 1
+            return requeued
+    
+    def claim_dead(self, queue: str) -> Optional[Tuple[str, Dict, int]]:
+        with self._lock:
+            _, _, payloads, attempts = self._state(queue)
+            dead = self._dead.setdefault(queue, {})
+            if not dead:
+                return None
+            job_id = min(dead, key=lambda item: (dead[item], item))
+            del dead[job_id]
+            return job_id, payloads.get(job_id, {}), attempts.get(job_id, 0)
+    
+    def size(self, queue: str) -> int:
+        with self._lock:
+            return len(self._state(queue)[0])
+    
+    def in_flight(self, queue: str) -> int:
+        with self._lock:
+            return len(self._state(queue)[1])
+    
+    def rank(self, queue: str, job_id: str) -> Optional[int]:
+        with self._lock:
+            waiting, inflight, _, _ = self._state(queue)
+            if job_id in inflight:
+                return 0
+            if job_id not in waiting:
+                return None
+            ordered = sorted(waiting.items(), key=lambda item: (item[1], item[0]))
+            return [item[0] for item in ordered].index(job_id) + 1
+
+
+class RedisJobQueue:
+    """
+    分布式任务队列，对API层提供与JobExecutor相同的接口（submit_task、is_full、
+    queue_position、stats），任务由worker.py启动的工作进程消费
+    """
+    
+    def __init__(self, name: str, broker, max_queue_size: int = 20, retry_after: int = 30,
+                 visibility_timeout: float = 600, max_attempts: int = 3,
+                 retry_backoff: float = 10, retry_backoff_max: float = 600):
+        self.name = name
+        self.broker = broker
+        self.max_queue_size = max_queue_size
+        self.retry_after = retry_after
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+    
+    def is_full(self) -> bool:
+        return self.broker.size(self.name) >= self.max_queue_size
+    
+    def submit_task(self, task_name: str, job_id: str, *args) -> int:
+        """
+        将任务写入队列
+        
+        Returns:
+            排队位置（从1开始）
+        
+        Raises:
+            QueueFullError: 队列已满
+        """
+        if self.is_full():
+            raise QueueFullError(self.name, self.retry_after)
+        
+        self.broker.push(self.name, job_id, {'task': task_name, 'args': list(args)}, time.time())
+        return self.queue_position(job_id) or 1
+    
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """0表示正在被某个工作进程处理，None表示不在队列中"""
+        return self.broker.rank(self.name, job_id)
+    
+    def claim(self) -> Optional[Tuple[str, Dict, int]]:
+        """领取一个任务，返回 (job_id, payload, 第几次尝试)"""
+        now = time.time()
+        self.broker.requeue_expired(self.name, now, self.max_attempts)
+        return self.broker.claim(self.name, now, self.visibility_timeout)
+    
+    def claim_dead(self) -> Optional[Tuple[str, Dict, int]]:
+        """取出一个因工作进程崩溃而耗尽尝试次数的任务，处理失败回调后需要ack"""
+        self.broker.requeue_expired(self.name, time.time(), self.max_attempts)
+        return self.broker.claim_dead(self.name)
+    
+    def heartbeat(self, job_id: str):
+        """延长正在处理的任务的可见性超时"""
+        self.broker.extend(self.name, job_id, time.time() + self.visibility_timeout)
+    
+    def ack(self, job_id: str):
+        self.broker.ack(self.name, job_id)
+    
+    def retry(self, job_id: str, attempts: int) -> bool:
+        """
+        失败后按指数退避重新入队
+        
+        Returns:
+            False表示已达到最大尝试次数，不再重试
+        """
+        if attempts >= self.max_attempts:
+            return False
+        
+        delay = min(self.retry_backoff * (2 ** (attempts - 1)), self.retry_backoff_max)
+        self.broker.retry(self.name, job_id, time.time() + delay)
+        print(f"任务 {self.name}/{job_id} 第{attempts}次执行失败，{delay:.1f}秒后重试")
+        return True
+    
+    def stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'backend': 'redis',
+            'maxQueueSize': self.max_queue_size,
+            'queued': self.broker.size(self.name),
+            'running': self.broker.in_flight(self.name)
+        }
@@ -0,0 +1,433 @@
+"""
+后台任务
+
+计算部分（运动识别、精彩瞬间检测、渲染）是模块级函数，参数和返回值均为基本类型，
+可以在线程或独立进程中执行；数据库写回部分作为回调在API进程中执行。
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from .. import db
+from . import HEAVY_POOL, QueueFullError, get_executor, final_render_job_id, clip_id_from_job
+from ..models import Video, ClipRequest
+from ..ai_services import SportsClassifier, TextAnalyzer
+from ..video_processing import FFmpegWrapper, MoviePyEditor
+from ..video_processing.analysis_cache import get_analysis_cache
+from ..video_processing.segment_cache import get_segment_cache
+from ..video_processing.sharded_analysis import analyze_sharded
+from ..video_processing.keyframe_index import get_keyframe_index
+from ..storage import compute_content_hash, get_scratch_space
+
+# 渲染队列已满时推迟的最终版本渲染最多重新提交的次数
+FINAL_RENDER_RETRY_LIMIT = 20
+
+
+def analyze_video(filepath: str, options: Dict = None) -> Dict:
+    """
+    运动类型识别和视频信息探测
+    
+    options: 分析参数，如 analysis_width（分析分辨率宽度）、content_hash（已知的内容哈希）、
+        analysis_cache_dir / analysis_cache_max_bytes（分析缓存）
+    """
+    options = options or {}
+    content_hash = options.get('content_hash') or compute_content_hash(filepath)
+    
+    # 建立关键帧索引（只解复用），供采样、切割和缩略图定位使用
+    keyframe_index = get_keyframe_index(filepath)
+    cache = _analysis_cache(options)
+    cache_params = {'kind': 'classification', 'width': options.get('analysis_width')}
+    
+    cached = cache.load(content_hash, cache_params) if cache else None
+    if cached:
+        _, meta = cached
+        print(f"命中分析缓存: {content_hash[:12]}")
+        video_info = meta['video_info']
+        sport_scores = meta['sport_scores']
+    else:
+        # 获取视频信息（ffprobe只读取头部）
+        try:
+            ffmpeg = FFmpegWrapper()
+            video_info = ffmpeg.get_video_info(filepath)
+        except Exception as e:
+            print(f"FFmpeg获取视频信息失败: {e}")
+            video_info = {}
+        
+        # 用完整索引得到的平均关键帧间隔代替只读取开头一段的估算
+        if keyframe_index is not None and video_info.get('fps'):
+            video_info['keyframe_interval'] = keyframe_index.average_gop_frames / video_info['fps']
+        
+        # 运动类型识别（timeline模式下的长视频分片并行完成识别和运动时间线）
+        sport_scores = _classify_sharded(filepath, video_info, content_hash, cache, options)
+        if sport_scores is None:
+            sport_scores = SportsClassifier().classify_sport(
+                filepath, 
+                analysis_width=options.get('analysis_width'),
+                video_info=video_info or None
+            )
+        
+        if cache:
+            cache.save(content_hash, cache_params, 
+                       meta={'video_info': video_info, 'sport_scores': sport_scores})
+    
+    dominant_sport, confidence = SportsClassifier().get_dominant_sport(sport_scores)
+    
+    return {
+        'sport_type': dominant_sport,
+        'confidence': confidence,
+        'sport_scores': sport_scores,
+        'video_info': video_info,
+        'content_hash': content_hash
+    }
+
+
+def render_clip(clip_id: str, video: Dict, text: str, target_duration: int, 
+                options: Dict = None) -> Dict:
+    """
+    文本分析、精彩瞬间检测和剪辑渲染
+    
+    配置了预览高度时只渲染预览并返回tier=preview，最终版本由render_clip_final任务渲染
+    
+    Args:
+        clip_id: 剪辑请求ID
+        video: 视频信息，包含filepath、sport_type、duration、info（已探测的元数据）
+        text: 用户输入的剪辑需求
+        target_duration: 目标时长（秒）
+        options: 分析和渲染参数
+    """
+    options = options or {}
+    
+    # 文本分析
+    text_analyzer = TextAnalyzer()
+    analysis_result = text_analyzer.analyze_clip_request(text, video['sport_type'])
+    
+    print(f"AI分析结果: {analysis_result}")
+    
+    # 根据AI分析结果调整剪辑策略
+    clip_target = analysis_result.get('clip_target', 'highlights')
+    focus_moments = analysis_result.get('focus_moments', [])
+    
+    # 精彩瞬间检测 - 使用AI分析结果指导
+    moviepy_editor = MoviePyEditor()
+    highlight_segments = moviepy_editor.detect_highlight_moments(
+        video['filepath'],
+        video['sport_type'],
+        clip_target=clip_target,
+        focus_moments=focus_moments,
+        video_duration=video['duration'],
+        analysis_width=options.get('analysis_width'),
+        video_info=video.get('info'),
+        content_hash=video.get('content_hash'),
+        analysis_cache=_analysis_cache(options),
+        analysis_mode=options.get('analysis_mode', 'sampled'),
+        analysis_fps=options.get('analysis_fps'),
+        shard_options=options.get('shard_options')
+    )
+    
+    if not highlight_segments:
+        highlight_segments = _uniform_segments(video['duration'] or 60)
+    
+    # 先快速生成低分辨率预览，最终版本作为单独的任务在后台渲染
+    preview_height = options.get('preview_height')
+    if preview_height:
+        preview_path = _result_path(clip_id, 'preview')
+        if moviepy_editor.create_preview_video(
+            video['filepath'],
+            highlight_segments,
+            preview_path,
+            target_duration,
+            video_duration=video['duration'],
+            video_info=video.get('info'),
+            preview_height=preview_height
+        ):
+            return {
+                'success': True,
+                'tier': 'preview',
+                'preview_path': preview_path,
+                'segments': highlight_segments,
+                'final_args': [video, highlight_segments, target_duration, options]
+            }
+        print("预览渲染失败，直接渲染最终版本")
+    
+    return render_clip_final(clip_id, video, highlight_segments, target_duration, options)
+
+
+def render_clip_final(clip_id: str, video: Dict, segments: List[Tuple[float, float]],
+                      target_duration: int, options: Dict = None) -> Dict:
+    """
+    渲染最终质量的剪辑
+    
+    先写入临时文件，完成后原子替换到结果路径，读取方不会看到写了一半的文件
+    """
+    options = options or {}
+    output_path = _result_path(clip_id)
+    root, ext = os.path.splitext(output_path)
+    rendering_path = f'{root}.rendering{ext}'
+    
+    # 执行视频剪辑，中间文件写在任务独占的临时目录中，结束时整个删除
+    with _scratch_space(options).job(clip_id) as scratch:
+        success = MoviePyEditor(scratch=scratch).create_highlight_video(
+            video['filepath'],
+            segments,
+            rendering_path,
+            target_duration,
+            render_mode=options.get('render_mode', 'moviepy'),
+            video_duration=video['duration'],
+            keyframe_index=get_keyframe_index(video['filepath']),
+            video_info=video.get('info'),
+            render_workers=options.get('render_workers'),
+            start_method=options.get('start_method', 'spawn'),
+            content_hash=video.get('content_hash'),
+            segment_cache=_segment_cache(options)
+        )
+    
+    if success:
+        os.replace(rendering_path, output_path)
+    elif os.path.exists(rendering_path):
+        os.remove(rendering_path)
+    
+    return {
+        'success': success,
+        'tier': 'final',
+        'result_path': output_path if success else None,
+        'segments': segments
+    }
+
+
+def _result_path(clip_id: str, tier: str = None) -> str:
+    """剪辑结果文件路径，预览文件名带 .preview 后缀"""
+    output_dir = os.path.join(os.getcwd(), 'storage', 'results')
+    os.makedirs(output_dir, exist_ok=True)
+    suffix = f'.{tier}' if tier else ''
+    return os.path.join(output_dir, f"clip_{clip_id}{suffix}.mp4")
+
+
+def _classify_sharded(filepath: str, video_info: Dict, content_hash: str, cache,
+                      options: Dict) -> Optional[Dict[str, float]]:
+    """
+    长视频在一次分片并行解码中同时完成运动识别和运动时间线计算，
+    时间线写入分析缓存供后续剪辑请求直接使用；不满足条件或失败时返回None
+    """
+    shard_options = options.get('shard_options') or {}
+    min_duration = shard_options.get('min_duration') or 0
+    duration = (video_info or {}).get('duration') or 0.0
+    if options.get('analysis_mode') != 'timeline' or not min_duration or duration < min_duration:
+        return None
+    
+    fps = options.get('analysis_fps') or 2.0
+    width = options.get('analysis_width') or 160
+    if cache and cache.contains(content_hash, {'kind': 'timeline', 'fps': fps, 'width': width}):
+        # 时间线已在上传时流式计算（或由之前的分析写入），只需采样识别运动类型
+        return None
+    
+    try:
+        result = analyze_sharded(
+            filepath, video_info, fps, width,
+            max_workers=shard_options.get('max_workers'),
+            min_shard_seconds=shard_options.get('min_shard_seconds') or 300,
+            classify_samples=10,
+            start_method=shard_options.get('start_method', 'spawn')
+        )
+    except Exception as e:
+        print(f"分片分析失败，回退到单进程分析: {e}")
+        return None
+    
+    if cache:
+        # 与MoviePyEditor._load_motion_timeline使用相同的缓存参数
+        cache.save(content_hash, {'kind': 'timeline', 'fps': fps, 'width': width},
+                   arrays={'timeline': result['timeline']}, meta={'stats': result['stats']})
+    
+    classifier = SportsClassifier()
+    return classifier.normalize_scores(result['sport_sums'], result['classified'])
+
+
+def _analysis_cache(options: Dict):
+    """根据任务参数获取分析缓存，未配置时返回None"""
+    if not options.get('analysis_cache_dir'):
+        return None
+    return get_analysis_cache(options['analysis_cache_dir'], 
+                              options.get('analysis_cache_max_bytes') or 1024 * 1024 * 1024)
+
+
+def _segment_cache(options: Dict):
+    """根据任务参数获取已编码片段缓存，未配置时返回None"""
+    if not options.get('segment_cache_dir'):
+        return None
+    return get_segment_cache(options['segment_cache_dir'],
+                             options.get('segment_cache_max_bytes') or 5 * 1024 * 1024 * 1024)
+
+
+def _scratch_space(options: Dict):
+    """根据任务参数获取临时目录管理器"""
+    return get_scratch_space(options.get('scratch_dir') or 'storage/temp',
+                             options.get('scratch_tmpfs_dir') or None,
+                             options.get('scratch_quota_bytes') or 0)
+
+
+def _uniform_segments(video_duration: float, segment_count: int = 5) -> List[Tuple[float, float]]:
+    """没有检测到精彩瞬间时，使用均匀分布的片段"""
+    segment_duration = min(8, video_duration / segment_count)
+    segments = []
+    for i in range(segment_count):
+        start = i * segment_duration
+        end = start + segment_duration
+        segments.append((start, end))
+    return segments
+
+
+# ---- 数据库写回（由JobExecutor在API进程的app context中调用） ----
+
+def save_video_analysis(video_id: str, result: Dict):
+    """写回视频分析结果"""
+    video_obj = Video.query.get(video_id)
+    if video_obj:
+        video_info = result.get('video_info') or {}
+        video_obj.sport_type = result['sport_type']
+        video_obj.content_hash = result.get('content_hash')
+        video_obj.apply_video_info(video_info)
+        video_obj.duration = video_info.get('duration', 0)
+        video_obj.status = 'analyzed'
+        db.session.commit()
+        print(f"视频分析完成: {video_obj.sport_type}, 时长: {video_obj.duration}秒")
+
+
+def mark_video_error(video_id: str, error: Exception):
+    """视频分析失败"""
+    print(f"视频分析失败: {error}")
+    video_obj = Video.query.get(video_id)
+    if video_obj:
+        video_obj.status = 'error'
+        db.session.commit()
+
+
+def mark_clip_processing(clip_id: str):
+    """剪辑任务开始执行"""
+    clip_obj = ClipRequest.query.get(clip_id)
+    if clip_obj:
+        clip_obj.status = 'processing'
+        db.session.commit()
+        print(f"剪辑请求 {clip_id} 开始处理")
+
+
+def save_clip_result(clip_id: str, result: Dict):
+    """写回剪辑结果：预览完成后提交最终版本的渲染任务，最终版本完成后替换预览"""
+    clip_obj = ClipRequest.query.get(clip_id)
+    if not clip_obj:
+        return
+    
+    if result.get('tier') == 'preview':
+        clip_obj.preview_path = result['preview_path']
+        clip_obj.render_tier = 'preview'
+        db.session.commit()
+        print(f"剪辑请求 {clip_id} 预览完成")
+        _submit_final_render(clip_obj, result['final_args'])
+        return
+    
+    if result.get('success'):
+        clip_obj.status = 'completed'
+        clip_obj.result_path = result['result_path']
+        clip_obj.render_tier = 'final'
+        preview_path, clip_obj.preview_path = clip_obj.preview_path, None
+        print(f"剪辑请求 {clip_id} 完成")
+    else:
+        clip_obj.status = 'error'
+        preview_path = None
+        print(f"剪辑请求 {clip_id} 失败")
+    db.session.commit()
+    
+    # 数据库已切换到最终版本后再删除预览（正在读取预览的请求不受影响）
+    if preview_path and os.path.exists(preview_path):
+        os.remove(preview_path)
+
+
+def save_final_clip_result(job_id: str, result: Dict):
+    save_clip_result(clip_id_from_job(job_id), result)
+
+
+def _submit_final_render(clip_obj: ClipRequest, final_args: List):
+    """
+    预览完成后提交最终版本渲染任务
+    
+    队列已满时剪辑以预览版本完成（render_tier仍为preview），渲染参数保存在final_render_args中，
+    按队列建议的重试间隔稍后重新提交
+    """
+    try:
+        get_executor(HEAVY_POOL).submit_task('render_clip_final', final_render_job_id(clip_obj.id),
+                                             clip_obj.id, *final_args)
+    except QueueFullError as e:
+        print(f"渲染队列已满，剪辑请求 {clip_obj.id} 先以预览完成，{e.retry_after}秒后重新提交最终版本")
+        clip_obj.status = 'completed'
+        clip_obj.final_render_args = json.dumps(final_args)
+        db.session.commit()
+        _schedule_final_render_retry(clip_obj.id, e.retry_after)
+
+
+def resubmit_final_render(clip_obj: ClipRequest) -> bool:
+    """重新提交推迟的最终版本渲染，已提交或无需提交时返回True"""
+    if not clip_obj.final_render_args:
+        return True
+    try:
+        get_executor(HEAVY_POOL).submit_task('render_clip_final', final_render_job_id(clip_obj.id),
+                                             clip_obj.id, *json.loads(clip_obj.final_render_args))
+    except QueueFullError:
+        return False
+    clip_obj.final_render_args = None
+    db.session.commit()
+    print(f"剪辑请求 {clip_obj.id} 的最终版本渲染已重新提交")
+    return True
+
+
+def _schedule_final_render_retry(clip_id: str, delay: float, attempt: int = 1):
+    """在后台定时重新提交最终版本渲染，队列仍然已满时继续等待，最多FINAL_RENDER_RETRY_LIMIT次"""
+    app = current_app._get_current_object()
+    
+    def retry():
+        with app.app_context():
+            clip_obj = ClipRequest.query.get(clip_id)
+            if clip_obj and not resubmit_final_render(clip_obj) and attempt < FINAL_RENDER_RETRY_LIMIT:
+                _schedule_final_render_retry(clip_id, delay, attempt + 1)
+    
+    timer = threading.Timer(delay, retry)
+    timer.daemon = True
+    timer.start()
+
+
+def mark_clip_error(clip_id: str, error: Exception):
+    """剪辑任务失败（包括工作进程崩溃）"""
+    print(f"视频剪辑失败: {error}")
+    clip_obj = ClipRequest.query.get(clip_id)
+    if clip_obj:
+        clip_obj.status = 'error'
+        db.session.commit()
+
+
+def mark_final_clip_error(job_id: str, error: Exception):
+    """最终版本渲染失败，已生成的预览仍可播放"""
+    mark_clip_error(clip_id_from_job(job_id), error)
+
+
+# 任务类型注册表：本地执行器和分布式队列都通过名称查找任务函数及其回调，
+# 回调的第一个参数是任务ID（视频分析为video_id，剪辑为clip_id，最终版本渲染为final_render_job_id）
+TASK_HANDLERS = {
+    'analyze_video': {
+        'run': analyze_video,
+        'on_start': None,
+        'on_success': save_video_analysis,
+        'on_error': mark_video_error
+    },
+    'render_clip': {
+        'run': render_clip,
+        'on_start': mark_clip_processing,
+        'on_success': save_clip_result,
+        'on_error': mark_clip_error
+    },
+    'render_clip_final': {
+        'run': render_clip_final,
+        'on_start': None,
+        'on_success': save_final_clip_result,
+        'on_error': mark_final_clip_error
+    }
+}
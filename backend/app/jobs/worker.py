@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import List
+
+from .redis_queue import JobExpiredError, RedisJobQueue
+
+
+class JobWorker:
+    """
+    分布式队列的消费者
+    
+    每个工作线程循环从队列中领取任务：执行计算函数，在应用上下文中写回数据库后确认；
+    执行期间定期心跳延长可见性超时，失败时按退避策略重试，最终失败才调用失败回调。
+    因工作进程崩溃而耗尽尝试次数的任务（死信）同样调用失败回调。
+    """
+    
+    def __init__(self, app, queues: List[RedisJobQueue], concurrency: int = 1,
+                 poll_interval: float = 1.0):
+        self.app = app
+        self.queues = queues
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+    
+    def start(self, daemon: bool = False):
+        """启动工作线程后立即返回"""
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=daemon)
+            thread.start()
+            self._threads.append(thread)
+    
+    def run(self):
+        """启动工作线程并阻塞直到stop()被调用"""
+        self.start()
+        
+        try:
+            while not self._stop.is_set():
+                self._stop.wait(1.0)
+        finally:
+            self.stop()
+    
+    def request_stop(self):
+        """通知工作线程不再领取新任务（可在信号处理函数中调用）"""
+        self._stop.set()
+    
+    def stop(self):
+        """停止领取新任务，等待正在执行的任务结束"""
+        self._stop.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+    
+    def _loop(self):
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._stop.wait(self.poll_interval)
+    
+    def run_once(self) -> bool:
+        """按队列优先级领取并执行一个任务，没有任务时返回False"""
+        for queue in self.queues:
+            try:
+                dead = queue.claim_dead()
+                claimed = None if dead else queue.claim()
+            except Exception as e:
+                print(f"领取任务失败 ({queue.name}): {e}")
+                continue
+            
+            if dead:
+                job_id, payload, attempts = dead
+                self._fail(queue, job_id, payload, JobExpiredError(job_id, attempts))
+                return True
+            
+            if claimed:
+                job_id, payload, attempts = claimed
+                self._process(queue, job_id, payload, attempts)
+                return True
+        
+        return False
+    
+    def _process(self, queue: RedisJobQueue, job_id: str, payload: dict, attempts: int):
+        from .tasks import TASK_HANDLERS
+        
+        handler = TASK_HANDLERS.get(payload.get('task'))
+        if handler is None:
+            print(f"未知的任务类型: {payload.get('task')}，丢弃任务 {job_id}")
+            queue.ack(job_id)
+            return
+        
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(queue, job_id, heartbeat_stop),
+                                     daemon=True)
+        heartbeat.start()
+        
+        try:
+            print(f"开始执行任务 {queue.name}/{job_id} (第{attempts}次)")
+            if handler['on_start']:
+                with self.app.app_context():
+                    handler['on_start'](job_id)
+            
+            started = time.time()
+            result = handler['run'](*payload.get('args', []))
+            
+            with self.app.app_context():
+                handler['on_success'](job_id, result)
+            queue.ack(job_id)
+            print(f"任务 {queue.name}/{job_id} 完成，耗时 {time.time() - started:.1f}秒")
+        
+        except Exception as e:
+            print(f"任务 {queue.name}/{job_id} 执行失败: {e}")
+            if not queue.retry(job_id, attempts):
+                self._fail(queue, job_id, payload, e)
+        finally:
+            heartbeat_stop.set()
+            heartbeat.join()
+    
+    def _fail(self, queue: RedisJobQueue, job_id: str, payload: dict, error: Exception):
+        """最终失败：调用失败回调后从队列中删除"""
+        from .tasks import TASK_HANDLERS
+        
+        handler = TASK_HANDLERS.get(payload.get('task'))
+        try:
+            if handler is not None:
+                with self.app.app_context():
+                    handler['on_error'](job_id, error)
+            else:
+                print(f"未知的任务类型: {payload.get('task')}，丢弃任务 {job_id}")
+        finally:
+            queue.ack(job_id)
+    
+    def _heartbeat(self, queue: RedisJobQueue, job_id: str, stop: threading.Event):
+        """长时间渲染任务期间持续延长可见性超时，避免被其他工作进程重复领取"""
+        interval = max(1.0, queue.visibility_timeout / 3)
+        while not stop.wait(interval):
+            try:
+                queue.heartbeat(job_id)
+            except Exception as e:
+                print(f"任务心跳失败 ({queue.name}/{job_id}): {e}")
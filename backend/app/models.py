@@ -14,9 +14,70 @@ class Video(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 探测得到的视频元数据（ffprobe头部信息），避免后续重复打开文件
+    fps = db.Column(db.Float)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    codec = db.Column(db.String(32))
+    bitrate = db.Column(db.Integer)  # kb/s
+    audio_streams = db.Column(db.Integer)
+    rotation = db.Column(db.Integer)
+    keyframe_interval = db.Column(db.Float)
+    file_size = db.Column(db.BigInteger)
+    content_hash = db.Column(db.String(80), index=True)  # 完整文件的SHA-256，用作存储、分析缓存和片段缓存的键
+    fingerprint = db.Column(db.String(80), index=True)  # sampled模式的快速指纹，只用于查找重复上传的候选
+    
+    def apply_video_info(self, info: dict):
+        """将FFmpegWrapper.get_video_info的结果写入元数据列"""
+        self.duration = info.get('duration') or self.duration
+        self.fps = info.get('fps') or None
+        self.width = info.get('width') or None
+        self.height = info.get('height') or None
+        self.codec = info.get('codec') or None
+        self.bitrate = info.get('bitrate') or None
+        self.audio_streams = info.get('audio_streams', self.audio_streams)
+        self.rotation = info.get('rotation', 0)
+        self.keyframe_interval = info.get('keyframe_interval') or None
+        self.file_size = info.get('size') or None
+    
+    @property
+    def video_info(self) -> dict:
+        """以get_video_info相同的结构返回已存储的元数据"""
+        return {
+            'duration': self.duration or 0.0,
+            'fps': self.fps or 0.0,
+            'width': self.width or 0,
+            'height': self.height or 0,
+            'resolution': f"{self.width}x{self.height}" if self.width and self.height else '',
+            'codec': self.codec or '',
+            'bitrate': self.bitrate or 0,
+            'audio_streams': self.audio_streams or 0,
+            'rotation': self.rotation or 0,
+            'keyframe_interval': self.keyframe_interval or 0.0,
+            'size': self.file_size or 0
+        }
+    
     def __repr__(self):
         return f'<Video {self.filename}>'
 
+class UploadSession(db.Model):
+    """分块上传会话，完成后创建对应的Video记录"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    video_id = db.Column(db.String(36), nullable=False, default=lambda: str(uuid.uuid4()))
+    filename = db.Column(db.String(255), nullable=False)
+    filepath = db.Column(db.String(500), nullable=False)  # 分块直接写入的最终路径
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(80))  # 所有分块写完后得到的SHA-256
+    fingerprint = db.Column(db.String(80))  # sampled模式的快速指纹
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id}>'
+
 class ClipRequest(db.Model):
     __tablename__ = 'clip_requests'
     
@@ -26,11 +87,23 @@ class ClipRequest(db.Model):
     target_duration = db.Column(db.Integer, default=60)
     status = db.Column(db.String(20), default='pending')
     result_path = db.Column(db.String(500))
+    preview_path = db.Column(db.String(500))  # 低分辨率快速预览
+    render_tier = db.Column(db.String(20))  # 已可播放的版本：preview / final
+    final_render_args = db.Column(db.Text)  # 渲染队列已满时推迟提交的最终版本渲染参数（JSON）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # 关系
     video = db.relationship('Video', backref=db.backref('clip_requests', lazy=True))
     
+    @property
+    def playable_path(self):
+        """预览接口使用的文件：最终版本完成后为result_path，在此之前为预览文件"""
+        if self.render_tier == 'preview':
+            return self.preview_path
+        if self.render_tier == 'final' or self.status == 'completed':
+            return self.result_path
+        return None
+    
     def __repr__(self):
         return f'<ClipRequest {self.id}>'
 
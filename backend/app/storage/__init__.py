@@ -0,0 +1,8 @@
+from .hashing import compute_content_hash, remember_content_hash, save_stream_with_hash
+from .scratch import ScratchSpace, ScratchDir, ScratchQuotaExceeded, get_scratch_space
+from .chunked_upload import ChunkedUpload, ChunkError, ChunkAlreadyReceived
+from .blob_store import BlobStore
+
+__all__ = ['compute_content_hash', 'remember_content_hash', 'save_stream_with_hash', 'ScratchSpace',
+           'ScratchDir', 'ScratchQuotaExceeded', 'get_scratch_space', 'ChunkedUpload', 'ChunkError',
+           'ChunkAlreadyReceived', 'BlobStore']
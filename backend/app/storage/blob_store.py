@@ -0,0 +1,68 @@
+import os
+import shutil
+from typing import Optional
+
+
+class BlobStore:
+    """
+    按完整内容哈希（SHA-256）寻址的上传文件存储
+    
+    文件保存为 <root>/<哈希前两位>/<哈希>.<扩展名>，内容相同的上传只保存一份，多个Video记录
+    指向同一个文件；文件旁的关键帧索引等派生数据也随之共享。写入使用硬链接，
+    同一内容并发写入时只有第一个生效，其余直接丢弃自己的副本。
+    """
+    
+    def __init__(self, root: str = 'storage/blobs'):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+    
+    @staticmethod
+    def _name(content_hash: str) -> str:
+        return content_hash.replace(':', '_')  # 快速哈希带有 "s:" 前缀
+    
+    def _shard_dir(self, content_hash: str) -> str:
+        return os.path.join(self.root, self._name(content_hash)[:2])
+    
+    def path_for(self, content_hash: str, ext: str) -> str:
+        ext = ext if ext.startswith('.') else f'.{ext}'
+        return os.path.join(self._shard_dir(content_hash), f'{self._name(content_hash)}{ext.lower()}')
+    
+    def find(self, content_hash: str) -> Optional[str]:
+        """已保存的同内容文件（不论扩展名），不存在时返回None"""
+        shard_dir = self._shard_dir(content_hash)
+        prefix = f'{self._name(content_hash)}.'
+        try:
+            names = os.listdir(shard_dir)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            # 只匹配 <哈希>.<扩展名>，跳过 <哈希>.<扩展名>.keyframes.npz 等派生文件
+            if name.startswith(prefix) and '.' not in name[len(prefix):]:
+                return os.path.join(shard_dir, name)
+        return None
+    
+    def ingest(self, file_path: str, content_hash: str) -> str:
+        """
+        把上传的文件移入存储，返回存储中的路径
+        
+        已有相同内容时删除file_path并返回已有文件；file_path已经在存储中时直接返回
+        """
+        existing = self.find(content_hash)
+        if existing:
+            if os.path.abspath(existing) != os.path.abspath(file_path) and os.path.exists(file_path):
+                os.remove(file_path)
+            return existing
+        
+        blob_path = self.path_for(content_hash, os.path.splitext(file_path)[1] or '.mp4')
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(file_path, blob_path)
+        except FileExistsError:
+            pass  # 并发上传的相同内容已先写入
+        except OSError:
+            # 跨文件系统时无法硬链接
+            if not os.path.exists(blob_path):
+                shutil.copyfile(file_path, f'{blob_path}.tmp')
+                os.replace(f'{blob_path}.tmp', blob_path)
+        os.remove(file_path)
+        return blob_path
@@ -0,0 +1,185 @@
+import hashlib
+import math
+import os
+import threading
+from typing import BinaryIO, Dict, List, Optional
+
+STREAM_BLOCK_SIZE = 1024 * 1024  # 从请求体读取并写入磁盘的块大小
+BITMAP_SUFFIX = '.chunks'
+
+
+class ChunkError(Exception):
+    """分块不合法（偏移未对齐、长度不符、超出文件大小等）"""
+
+
+class ChunkAlreadyReceived(ChunkError):
+    """分块已经写入；内容可能已计入增量哈希或送入流式分析，不能再覆盖"""
+
+
+class ChunkedUpload:
+    """
+    可续传的分块上传文件
+    
+    初始化时在最终路径预分配（稀疏）文件，每个分块按偏移用pwrite直接写入，不经过临时文件
+    和二次拷贝；分块之间互不重叠，客户端可以并发上传。已收到的分块记录在旁边的位图文件中
+    （每个分块一个字节，同样用pwrite写入），进程重启后依然可以查询缺少的分块继续上传。
+    
+    内容哈希在上传过程中增量计算：每个分块写完后，按顺序把从已哈希位置开始的连续分块
+    （刚写入、仍在页缓存中）送入SHA-256，完成时通常只剩最后几个分块需要处理。
+    """
+    
+    def __init__(self, path: str, total_size: int, chunk_size: int):
+        self.path = path
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+    
+    @property
+    def chunk_count(self) -> int:
+        return max(1, math.ceil(self.total_size / self.chunk_size))
+    
+    @property
+    def bitmap_path(self) -> str:
+        return f'{self.path}{BITMAP_SUFFIX}'
+    
+    def create(self):
+        """预分配目标文件和分块位图"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.truncate(self.total_size)
+        with open(self.bitmap_path, 'wb') as f:
+            f.write(bytes(self.chunk_count))
+    
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.total_size - index * self.chunk_size)
+    
+    def write_chunk(self, offset: int, stream: BinaryIO, length: int) -> int:
+        """
+        把请求体中的一个分块写到offset处，返回分块序号
+        
+        Raises:
+            ChunkAlreadyReceived: 该分块已经写入（重试的请求已经成功）
+            ChunkError: 偏移未对齐到分块边界、长度与分块大小不符或数据不完整
+        """
+        if offset < 0 or offset % self.chunk_size or offset >= max(self.total_size, 1):
+            raise ChunkError(f"偏移 {offset} 不是有效的分块起点")
+        index = offset // self.chunk_size
+        expected = self.chunk_length(index)
+        if length != expected:
+            raise ChunkError(f"分块 {index} 的长度应为 {expected} 字节，实际为 {length}")
+        if self.received()[index]:
+            raise ChunkAlreadyReceived(f"分块 {index} 已上传")
+        
+        fd = os.open(self.path, os.O_WRONLY)
+        try:
+            written = 0
+            while written < expected:
+                block = stream.read(min(STREAM_BLOCK_SIZE, expected - written))
+                if not block:
+                    break
+                os.pwrite(fd, block, offset + written)
+                written += len(block)
+        finally:
+            os.close(fd)
+        
+        if written != expected:
+            raise ChunkError(f"分块 {index} 数据不完整: {written}/{expected} 字节")
+        
+        self._mark_received(index)
+        _hasher_for(self).advance(self)
+        return index
+    
+    def _mark_received(self, index: int):
+        fd = os.open(self.bitmap_path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, b'\x01', index)
+        finally:
+            os.close(fd)
+    
+    def received(self) -> bytes:
+        """位图：第i个字节不为0表示第i个分块已写入"""
+        try:
+            with open(self.bitmap_path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return bytes(self.chunk_count)
+    
+    def missing_chunks(self) -> List[int]:
+        return [i for i, flag in enumerate(self.received()) if not flag]
+    
+    def received_bytes(self) -> int:
+        return sum(self.chunk_length(i) for i, flag in enumerate(self.received()) if flag)
+    
+    def finalize(self) -> str:
+        """
+        确认所有分块已写入，删除位图，返回完整文件的SHA-256
+        
+        Raises:
+            ChunkError: 还有分块未上传
+        """
+        missing = self.missing_chunks()
+        if missing:
+            raise ChunkError(f"还有 {len(missing)} 个分块未上传")
+        
+        hasher = _hasher_for(self)
+        hasher.advance(self)
+        content_hash = hasher.hexdigest(self)
+        _discard_hasher(self.path)
+        if os.path.exists(self.bitmap_path):
+            os.remove(self.bitmap_path)
+        return content_hash
+    
+    def abort(self):
+        """放弃上传，删除已写入的数据"""
+        _discard_hasher(self.path)
+        for path in (self.path, self.bitmap_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class _IncrementalHasher:
+    """按顺序消费连续已写入分块的SHA-256"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sha256 = hashlib.sha256()
+        self.next_chunk = 0
+    
+    def advance(self, upload: ChunkedUpload):
+        with self.lock:
+            received = upload.received()
+            if self.next_chunk >= len(received) or not received[self.next_chunk]:
+                return
+            with open(upload.path, 'rb') as f:
+                f.seek(self.next_chunk * upload.chunk_size)
+                while self.next_chunk < len(received) and received[self.next_chunk]:
+                    remaining = upload.chunk_length(self.next_chunk)
+                    while remaining > 0:
+                        block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+                        if not block:
+                            break
+                        self.sha256.update(block)
+                        remaining -= len(block)
+                    self.next_chunk += 1
+    
+    def hexdigest(self, upload: ChunkedUpload) -> str:
+        with self.lock:
+            if self.next_chunk < upload.chunk_count:
+                raise ChunkError("内容哈希尚未覆盖全部分块")
+            return self.sha256.hexdigest()
+
+
+# 进程内的增量哈希状态（SHA-256的中间状态无法持久化）；
+# 分块由其他进程接收或进程重启后，缺失的部分在下一次advance时从磁盘补齐
+_hashers: Dict[str, _IncrementalHasher] = {}
+_hashers_lock = threading.Lock()
+
+def _hasher_for(upload: ChunkedUpload) -> _IncrementalHasher:
+    key = os.path.abspath(upload.path)
+    with _hashers_lock:
+        if key not in _hashers:
+            _hashers[key] = _IncrementalHasher()
+        return _hashers[key]
+
+def _discard_hasher(path: str) -> Optional[_IncrementalHasher]:
+    with _hashers_lock:
+        return _hashers.pop(os.path.abspath(path), None)
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import threading
+from typing import Dict, Tuple
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024  # 4MB
+SAMPLED_BLOCK_SIZE = 1024 * 1024  # 快速哈希每个采样块的大小
+SAMPLED_BLOCK_COUNT = 8  # 快速哈希的采样块数量（含首尾）
+
+_hash_memo: Dict[Tuple, str] = {}
+_hash_memo_lock = threading.Lock()
+
+def compute_content_hash(file_path: str, mode: str = 'full') -> str:
+    """
+    计算文件内容哈希
+    
+    Args:
+        file_path: 文件路径
+        mode: full 为完整文件的SHA-256；sampled 为文件大小加若干等间距数据块的SHA-256，
+            速度与文件大小无关，但只适合作为快速指纹
+    
+    Returns:
+        十六进制哈希字符串，sampled模式带有 "s:" 前缀以免与完整哈希混淆
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime, mode)
+    with _hash_memo_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+    
+    if mode == 'sampled':
+        content_hash = 's:' + _sampled_hash(file_path, stat.st_size)
+    else:
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        content_hash = hasher.hexdigest()
+    
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = content_hash
+    return content_hash
+
+def save_stream_with_hash(stream, file_path: str) -> str:
+    """把上传流写入文件的同时计算完整SHA-256（与compute_content_hash的full模式一致）"""
+    hasher = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            f.write(chunk)
+    content_hash = hasher.hexdigest()
+    remember_content_hash(file_path, content_hash)
+    return content_hash
+
+def remember_content_hash(file_path: str, content_hash: str, mode: str = 'full'):
+    """登记已经算好的哈希（如上传时增量计算的结果），之后compute_content_hash不再读取文件"""
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime, mode)
+    with _hash_memo_lock:
+        _hash_memo[memo_key] = content_hash
+
+def _sampled_hash(file_path: str, size: int) -> str:
+    """文件大小 + 等间距采样块的哈希"""
+    hasher = hashlib.sha256()
+    hasher.update(str(size).encode())
+    
+    with open(file_path, 'rb') as f:
+        if size <= SAMPLED_BLOCK_SIZE * SAMPLED_BLOCK_COUNT:
+            hasher.update(f.read())
+        else:
+            step = (size - SAMPLED_BLOCK_SIZE) / (SAMPLED_BLOCK_COUNT - 1)
+            for i in range(SAMPLED_BLOCK_COUNT):
+                f.seek(int(i * step))
+                hasher.update(f.read(SAMPLED_BLOCK_SIZE))
+    
+    return hasher.hexdigest()
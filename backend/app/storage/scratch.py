@@ -0,0 +1,152 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+DEFAULT_SCRATCH_ROOT = 'storage/temp'
+TMPFS_MIN_FREE_BYTES = 1024 * 1024 * 1024  # 没有配额时，tmpfs至少有这么多空闲空间才使用
+
+
+class ScratchQuotaExceeded(Exception):
+    """任务的临时目录超出配额"""
+    
+    def __init__(self, job_id: str, used: int, quota: int):
+        super().__init__(f"任务 {job_id} 的临时文件 {used} 字节超出配额 {quota} 字节")
+        self.job_id = job_id
+        self.used = used
+        self.quota = quota
+
+
+class ScratchDir:
+    """单个任务独占的临时目录"""
+    
+    def __init__(self, job_id: str, path: str, quota_bytes: int = 0, on_tmpfs: bool = False):
+        self.job_id = job_id
+        self.path = path
+        self.quota_bytes = quota_bytes
+        self.on_tmpfs = on_tmpfs
+    
+    def file(self, name: str) -> str:
+        """目录内的文件路径"""
+        return os.path.join(self.path, name)
+    
+    def usage(self) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    continue
+        return total
+    
+    def check_quota(self):
+        """超出配额时抛出ScratchQuotaExceeded（在每写完一个中间文件后调用）"""
+        if not self.quota_bytes:
+            return
+        used = self.usage()
+        if used > self.quota_bytes:
+            raise ScratchQuotaExceeded(self.job_id, used, self.quota_bytes)
+
+
+class ScratchSpace:
+    """
+    任务临时目录管理
+    
+    每个任务在 root 下获得独立的目录（名称包含主机名和进程号），任务内的所有中间文件
+    （片段、音频、concat列表）都写在其中，并发任务之间互不影响；任务结束时无论成功与否
+    都删除整个目录，进程崩溃留下的目录在下一次启动时清理。
+    
+    配置了 tmpfs_root（如 /dev/shm）且空闲空间足够时优先使用内存文件系统。
+    quota_bytes 不为0时限制每个任务的临时文件总大小。
+    """
+    
+    def __init__(self, root: str = DEFAULT_SCRATCH_ROOT, tmpfs_root: str = None,
+                 quota_bytes: int = 0):
+        self.root = root
+        self.tmpfs_root = tmpfs_root
+        self.quota_bytes = quota_bytes
+        self._host = socket.gethostname().replace('.', '-')  # 目录名以 . 分隔各部分
+        os.makedirs(root, exist_ok=True)
+    
+    @contextmanager
+    def job(self, job_id: str, quota_bytes: int = None) -> Iterator[ScratchDir]:
+        """创建任务的临时目录，退出时删除"""
+        quota = self.quota_bytes if quota_bytes is None else quota_bytes
+        base = self._choose_root(quota)
+        safe_id = ''.join(c if c.isalnum() or c in '-_' else '_' for c in job_id)
+        path = tempfile.mkdtemp(prefix=f'job_{safe_id}.{self._host}.{os.getpid()}.', dir=base)
+        scratch = ScratchDir(job_id, path, quota, on_tmpfs=base != self.root)
+        try:
+            yield scratch
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def _choose_root(self, quota: int) -> str:
+        if not self.tmpfs_root or not os.path.isdir(self.tmpfs_root):
+            return self.root
+        try:
+            free = shutil.disk_usage(self.tmpfs_root).free
+        except OSError:
+            return self.root
+        if free < (quota or TMPFS_MIN_FREE_BYTES):
+            return self.root
+        base = os.path.join(self.tmpfs_root, 'video_scratch')
+        os.makedirs(base, exist_ok=True)
+        return base
+    
+    def sweep(self) -> int:
+        """删除本机已退出进程留下的任务目录，返回删除的数量"""
+        removed = 0
+        roots = [self.root]
+        if self.tmpfs_root:
+            roots.append(os.path.join(self.tmpfs_root, 'video_scratch'))
+        for base in roots:
+            if not os.path.isdir(base):
+                continue
+            for name in os.listdir(base):
+                parts = name.split('.')
+                if not name.startswith('job_') or len(parts) < 4 or parts[-3] != self._host:
+                    continue
+                try:
+                    pid = int(parts[-2])
+                except ValueError:
+                    continue
+                if pid == os.getpid() or process_alive(pid):
+                    continue
+                shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+                removed += 1
+        if removed:
+            print(f"清理了 {removed} 个残留的任务临时目录")
+        return removed
+
+
+def process_alive(pid: int) -> bool:
+    """本机上该pid的进程是否仍在运行"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+_spaces: Dict[tuple, ScratchSpace] = {}
+_spaces_lock = threading.Lock()
+
+def get_scratch_space(root: str = DEFAULT_SCRATCH_ROOT, tmpfs_root: Optional[str] = None,
+                      quota_bytes: int = 0) -> ScratchSpace:
+    """进程内共享的临时目录管理器，首次创建时清理残留目录"""
+    key = (root, tmpfs_root or None, quota_bytes)
+    with _spaces_lock:
+        if key not in _spaces:
+            space = ScratchSpace(root, tmpfs_root, quota_bytes)
+            space.sweep()
+            _spaces[key] = space
+        return _spaces[key]
@@ -1,4 +1,8 @@
 from .ffmpeg_wrapper import FFmpegWrapper
 from .moviepy_editor import MoviePyEditor
+from .frame_sampler import FrameSampler, SampledFrame, get_frame_sampler
+from .frame_pipe import FFmpegFramePipe
+from .keyframe_index import KeyframeIndex, get_keyframe_index
 
-__all__ = ['FFmpegWrapper', 'MoviePyEditor']
+__all__ = ['FFmpegWrapper', 'MoviePyEditor', 'FrameSampler', 'SampledFrame', 'get_frame_sampler',
+           'FFmpegFramePipe', 'KeyframeIndex', 'get_keyframe_index']
@@ -0,0 +1,150 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .frame_sampler import FrameSampler, get_frame_sampler
+
+
+class CoarseToFineSearch:
+    """
+    由粗到细的精彩瞬间搜索
+    
+    第0层在全片均匀取少量位置打分；之后每一层只在上一层得分最高的top_k个局部峰值附近、
+    以上一层步长为半径的窗口内按更小的步长重新采样，直到步长不超过min_step秒。
+    每个位置的运动强度取该帧与其后lag帧的差异，只需精确解码两帧，不必解码整个区间。
+    
+    最后把各层的打分点插值到最细步长的均匀时间线上，供_find_highlight_segments使用。
+    """
+    
+    def __init__(self, sampler: FrameSampler = None, coarse_samples: int = 64, top_k: int = 8,
+                 refine_factor: int = 8, min_step: float = 0.5, width: int = 160,
+                 pair_lag: float = 0.2):
+        """
+        Args:
+            sampler: 帧采样器，默认使用进程共享实例
+            coarse_samples: 第0层的采样数量
+            top_k: 每层细化的候选峰值数量
+            refine_factor: 每层步长缩小的倍数
+            min_step: 最细步长（秒），决定片段边界的定位精度
+            width: 计算帧差时的缩放宽度
+            pair_lag: 计算运动强度的帧对间隔（秒）
+        """
+        self.sampler = sampler or get_frame_sampler()
+        self.coarse_samples = max(2, coarse_samples)
+        self.top_k = max(1, top_k)
+        self.refine_factor = max(2, refine_factor)
+        self.min_step = min_step
+        self.width = width
+        self.pair_lag = pair_lag
+        self.last_stats: Dict = {}
+    
+    def run(self, video_path: str) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        执行搜索
+        
+        Returns:
+            (float32时间线, 相邻两点的时间间隔秒数)，无法解码时返回None
+        """
+        total_frames, fps = self.sampler.video_properties(video_path)
+        if total_frames < 2 or fps <= 0:
+            return None
+        
+        lag = max(1, int(round(self.pair_lag * fps)))
+        last = total_frames - 1 - lag
+        if last <= 0:
+            return None
+        
+        min_step_frames = max(1.0, self.min_step * fps)
+        step = max(last / (self.coarse_samples - 1), min_step_frames)
+        positions = np.unique(np.linspace(0, last, self.coarse_samples).astype(int))
+        
+        scores: Dict[int, float] = {}
+        levels = []
+        started = time.time()
+        
+        while True:
+            pending = np.array([p for p in positions.tolist() if p not in scores], dtype=int)
+            new_scores = self._score(video_path, pending, lag) if len(pending) else {}
+            scores.update(new_scores)
+            levels.append({
+                'level': len(levels),
+                'step': step / fps,
+                'samples': len(new_scores),
+                'decodedFrames': self.sampler.last_stats.get('decodedFrames', 0) if new_scores else 0
+            })
+            
+            # 本层窗口内的所有打分点（包括上一层已打分的峰值本身）
+            level_scores = {p: scores[p] for p in positions.tolist() if p in scores}
+            if step <= min_step_frames or not level_scores:
+                break
+            
+            radius = step
+            step = max(step / self.refine_factor, min_step_frames)
+            positions = self._refine_positions(level_scores, radius, step, last)
+            if len(positions) == 0:
+                break
+        
+        elapsed = time.time() - started
+        decoded = sum(level['decodedFrames'] for level in levels)
+        self.last_stats = {
+            'levels': levels,
+            'decodedFrames': decoded,
+            'totalFrames': total_frames,
+            'decodedRatio': decoded / total_frames,
+            'elapsed': elapsed
+        }
+        for level in levels:
+            print(f"由粗到细搜索 第{level['level']}层: 步长{level['step']:.2f}秒, "
+                  f"采样{level['samples']}个位置, 解码约{level['decodedFrames']}帧")
+        print(f"由粗到细搜索完成: 共解码约{decoded}帧 / {total_frames}帧 "
+              f"({self.last_stats['decodedRatio']:.1%}), 耗时{elapsed:.2f}秒")
+        
+        if len(scores) < 2:
+            return None
+        
+        # 插值到最细步长的均匀时间线
+        known = np.array(sorted(scores))
+        values = np.array([scores[i] for i in known], dtype=np.float64)
+        grid = np.arange(0, last + 1, step)
+        timeline = np.interp(grid, known, values).astype(np.float32)
+        return timeline, step / fps
+    
+    def _score(self, video_path: str, positions: np.ndarray, lag: int) -> Dict[int, float]:
+        """解码每个位置及其后lag帧，返回 {帧号: 运动强度}"""
+        indices = np.concatenate((positions, positions + lag)).tolist()
+        frames = {frame.index: frame for frame in self.sampler.sample_at(video_path, indices)}
+        
+        result = {}
+        for position in positions.tolist():
+            first, second = frames.get(position), frames.get(position + lag)
+            if first is None or second is None:
+                continue
+            diff = cv2.absdiff(first.resized(self.width), second.resized(self.width))
+            result[position] = min(float(cv2.mean(diff)[0]) / 255.0, 1.0)
+        
+        # 帧对只用于打分一次，不占用采样缓存
+        self.sampler.release(video_path, indices)
+        return result
+    
+    def _refine_positions(self, level_scores: Dict[int, float], radius: float, step: float,
+                          last: int) -> np.ndarray:
+        """在本层top_k个局部峰值附近生成下一层的采样位置"""
+        ordered = sorted(level_scores)
+        values = np.array([level_scores[i] for i in ordered])
+        padded = np.concatenate(([-np.inf], values, [-np.inf]))
+        is_peak = (values >= padded[:-2]) & (values >= padded[2:])
+        
+        peaks = [ordered[i] for i in np.nonzero(is_peak)[0]]
+        peaks = sorted(peaks, key=lambda i: level_scores[i], reverse=True)[:self.top_k]
+        
+        candidates: List[np.ndarray] = []
+        for peak in peaks:
+            start, end = max(0.0, peak - radius), min(float(last), peak + radius)
+            candidates.append(np.arange(start, end + 1, step).astype(int))
+        
+        if not candidates:
+            return np.empty(0, dtype=int)
+        
+        return np.unique(np.concatenate(candidates))
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from .cache_stats import CacheStats
+
+class AnalysisCache:
+    """
+    持久化的视频分析结果缓存
+    
+    以 (文件内容哈希, 分析参数) 为键，将运动强度序列等数组和分类分数、视频信息等元数据
+    保存为npz文件。同一视频的后续剪辑请求命中缓存时无需重新解码；缓存目录按总字节数
+    做LRU淘汰（以文件修改时间作为最近访问时间）。命中和未命中次数保存在缓存目录中，汇总所有进程。
+    """
+    
+    def __init__(self, root: str = 'storage/analysis_cache', max_bytes: int = 1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.counters = CacheStats(root, ('hits', 'misses'))
+    
+    def key(self, content_hash: str, params: Dict) -> str:
+        payload = json.dumps({'content_hash': content_hash, 'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:40]
+    
+    def path(self, content_hash: str, params: Dict) -> str:
+        return os.path.join(self.root, f'{self.key(content_hash, params)}.npz')
+    
+    def contains(self, content_hash: str, params: Dict) -> bool:
+        """是否已有缓存（不读取内容，不计入命中统计）"""
+        return bool(content_hash) and os.path.exists(self.path(content_hash, params))
+    
+    def load(self, content_hash: str, params: Dict) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+        """
+        读取缓存
+        
+        Returns:
+            (数组字典, 元数据)，未命中时返回None
+        """
+        if not content_hash:
+            return None
+        
+        path = self.path(content_hash, params)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files if name != '__meta__'}
+                meta = json.loads(str(data['__meta__'])) if '__meta__' in data.files else {}
+            os.utime(path)  # 更新最近访问时间
+            self.counters.increment('hits')
+            return arrays, meta
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取分析缓存失败，忽略: {e}")
+        
+        self.counters.increment('misses')
+        return None
+    
+    def save(self, content_hash: str, params: Dict, arrays: Dict[str, np.ndarray] = None,
+             meta: Dict = None):
+        """写入缓存（先写临时文件再原子替换）"""
+        if not content_hash:
+            return
+        
+        path = self.path(content_hash, params)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, __meta__=np.array(json.dumps(meta or {})), **(arrays or {}))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入分析缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        
+        self._evict()
+    
+    def _evict(self):
+        """按最近访问时间淘汰，直到缓存总大小不超过上限"""
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+                total -= size
+            except OSError:
+                continue
+    
+    def stats(self) -> Dict:
+        return dict(self.counters.totals(), root=self.root)
+
+
+_caches: Dict[str, AnalysisCache] = {}
+_caches_lock = threading.Lock()
+
+def get_analysis_cache(root: str = 'storage/analysis_cache',
+                       max_bytes: int = 1024 * 1024 * 1024) -> AnalysisCache:
+    """进程内按目录共享的分析缓存实例"""
+    with _caches_lock:
+        if root not in _caches:
+            _caches[root] = AnalysisCache(root, max_bytes)
+        return _caches[root]
@@ -0,0 +1,178 @@
+"""
+缓存命中统计
+
+任务可能在进程池或独立的任务worker进程中执行，进程内的计数器在API进程中读不到。每个进程把
+自己的累计次数写到缓存目录下 .stats 目录中独立的文件（<主机名>.<pid>.<随机串>.json，先写临时
+文件再原子替换，进程之间不需要加锁）。计数先在内存中累加，累计 FLUSH_EVERY 次或距上次写入
+超过 FLUSH_INTERVAL 秒后的下一次计数时写入，进程退出时写入剩余部分，大多数缓存查询不写磁盘。
+
+读取时汇总所有文件：本机已退出进程的文件先并入 aggregate.json 再删除，文件数量不随进程的
+创建和重启增长。
+"""
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from multiprocessing import util
+from typing import Dict, Tuple
+
+from ..storage.scratch import process_alive
+
+STATS_DIR = '.stats'
+AGGREGATE_FILE = 'aggregate.json'
+LOCK_FILE = '.lock'
+FLUSH_EVERY = 100  # 累计多少次计数后写入文件
+FLUSH_INTERVAL = 10.0  # 距上次写入超过多少秒时写入文件
+
+
+class _ProcessCounts:
+    """当前进程对一个统计目录的累计次数"""
+    
+    def __init__(self, directory: str, names: Tuple[str, ...]):
+        self.path = os.path.join(
+            directory, f'{socket.gethostname()}.{os.getpid()}.{uuid.uuid4().hex[:8]}.json')
+        self.counts = dict.fromkeys(names, 0)
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def add(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+            self.pending += 1
+            due = (self.pending >= FLUSH_EVERY
+                   or time.monotonic() - self.flushed_at >= FLUSH_INTERVAL)
+        if due:
+            self.flush()
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
+    
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            tmp_path = f'{self.path}.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.counts, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"写入缓存统计失败: {e}")
+                return
+            self.pending = 0
+            self.flushed_at = time.monotonic()
+
+
+# 进程内按统计目录共享的计数（同一目录的多个CacheStats实例写同一个文件）
+_process_counts: Dict[str, _ProcessCounts] = {}
+_process_counts_pid = None
+_process_counts_lock = threading.Lock()
+
+def _counts_for(directory: str, names: Tuple[str, ...]) -> _ProcessCounts:
+    global _process_counts_pid
+    with _process_counts_lock:
+        if _process_counts_pid != os.getpid():
+            # 新进程（包括fork出的子进程）从0开始计数，写入自己的文件
+            _process_counts_pid = os.getpid()
+            _process_counts.clear()
+        key = os.path.abspath(directory)
+        if key not in _process_counts:
+            counts = _ProcessCounts(directory, names)
+            # 进程退出时写入剩余的计数；multiprocessing的子进程退出时不执行atexit，但会执行Finalize
+            util.Finalize(counts, counts.flush, exitpriority=10)
+            _process_counts[key] = counts
+        return _process_counts[key]
+
+
+class CacheStats:
+    """保存在缓存目录中、可跨进程汇总的计数器"""
+    
+    def __init__(self, root: str, names: Tuple[str, ...]):
+        self.dir = os.path.join(root, STATS_DIR)
+        self.names = names
+        os.makedirs(self.dir, exist_ok=True)
+    
+    def increment(self, name: str):
+        _counts_for(self.dir, self.names).add(name)
+    
+    def flush(self):
+        """立即写入当前进程尚未写入的计数"""
+        _counts_for(self.dir, self.names).flush()
+    
+    def totals(self) -> Dict[str, int]:
+        """所有进程的累计次数（当前进程使用内存中的最新计数）"""
+        self._fold_exited()
+        own = _counts_for(self.dir, self.names)
+        totals = dict.fromkeys(self.names, 0)
+        for key, value in own.snapshot().items():
+            totals[key] += value
+        
+        try:
+            names = os.listdir(self.dir)
+        except FileNotFoundError:
+            return totals
+        for name in names:
+            path = os.path.join(self.dir, name)
+            if not name.endswith('.json') or path == own.path:
+                continue
+            for key, value in self._read(path).items():
+                totals[key] += value
+        return totals
+    
+    def _fold_exited(self):
+        """把本机已退出进程的计数文件并入汇总文件后删除"""
+        prefix = f'{socket.gethostname()}.'
+        try:
+            lock = open(os.path.join(self.dir, LOCK_FILE), 'a')
+        except OSError:
+            return
+        with lock:
+            # 多个进程同时汇总时只有一个生效，避免重复计入
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            exited = []
+            for name in os.listdir(self.dir):
+                if not name.startswith(prefix) or not name.endswith('.json'):
+                    continue
+                try:
+                    pid = int(name[len(prefix):].split('.')[0])
+                except ValueError:
+                    continue
+                if pid != os.getpid() and not process_alive(pid):
+                    exited.append(os.path.join(self.dir, name))
+            if not exited:
+                return
+            
+            aggregate_path = os.path.join(self.dir, AGGREGATE_FILE)
+            aggregate = self._read(aggregate_path)
+            for path in exited:
+                for key, value in self._read(path).items():
+                    aggregate[key] += value
+            tmp_path = f'{aggregate_path}.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(aggregate, f)
+                os.replace(tmp_path, aggregate_path)
+            except OSError as e:
+                print(f"汇总缓存统计失败: {e}")
+                return
+            for path in exited:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _read(self, path: str) -> Dict[str, int]:
+        counts = dict.fromkeys(self.names, 0)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return counts  # 文件不存在，或其他进程正在替换
+        for key in self.names:
+            counts[key] += int(data.get(key, 0))
+        return counts
@@ -0,0 +1,377 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .ffmpeg_wrapper import FFmpegWrapper
+from .keyframe_index import KeyframeIndex, get_keyframe_index
+from .segment_cache import SegmentCache
+
+# smart模式下重新编码边界帧使用的编码器（与源视频编码格式一致才能直接拼接）
+SMART_ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265'
+}
+
+# ffprobe输出的profile名称 -> 编码器参数
+ENCODER_PROFILES = {
+    'h264': {'Baseline': 'baseline', 'Constrained Baseline': 'baseline', 'Main': 'main',
+             'High': 'high', 'High 10': 'high10', 'High 4:2:2': 'high422',
+             'High 4:4:4 Predictive': 'high444'},
+    'hevc': {'Main': 'main', 'Main 10': 'main10', 'Main Still Picture': 'mainstillpicture'}
+}
+
+# smart模式的重新编码段和源视频的SPS/PPS不同，不能只依赖容器的全局参数集：直接复制的数据包
+# 先转换为annex-b（在每个关键帧前插入参数集），每段都带内联参数集；拼接后的MP4使用允许内联
+# 参数集的样本描述（avc3/hev1）
+ANNEXB_FILTERS = {
+    'h264': 'h264_mp4toannexb',
+    'hevc': 'hevc_mp4toannexb'
+}
+INBAND_TAGS = {
+    'h264': 'avc3',
+    'hevc': 'hev1'
+}
+
+# 小于该时长（秒）的边界片段不单独生成
+MIN_PIECE_DURATION = 0.001
+
+
+class FFmpegRenderer:
+    """
+    基于FFmpeg的精彩集锦渲染，不经过MoviePy逐帧处理
+    
+    - copy: 每个片段的起点对齐到之前最近的关键帧，用 -c copy 直接复制数据包切出片段，
+      再用concat demuxer（FFmpegWrapper.merge_videos）拼接。整个过程不解码，耗时只取决于
+      读写的数据量；代价是片段起点最多提前一个GOP。
+    - smart: 只重新编码切点到相邻关键帧之间的不完整GOP（使用与源视频相同的编码格式、
+      profile和像素格式），中间完整的GOP直接复制，得到帧精确的片段边界。视频分段写成只含
+      视频、参数集内联的Matroska文件（不依赖MP4的全局参数集），音频对全部片段统一重新编码一次，
+      避免分段编码的AAC在每个拼接点引入priming静音。拼接后完整解码一遍检查帧数和解码错误，
+      不通过时返回False，由调用方回退到其他渲染方式。
+    
+    两种方式都不能添加效果。中间文件写在temp_dir下每次渲染独立的工作目录中，
+    每写完一段调用quota_check（如ScratchDir.check_quota），超出配额时抛出的异常中止渲染。
+    """
+    
+    def __init__(self, ffmpeg: FFmpegWrapper = None, temp_dir: str = None,
+                 quota_check: Callable[[], None] = None):
+        self.ffmpeg = ffmpeg or FFmpegWrapper()
+        self.temp_dir = temp_dir or tempfile.gettempdir()
+        self.quota_check = quota_check
+    
+    def plan_segments(self, clip_segments: List[Tuple[float, float]], target_duration: float,
+                      video_duration: float = None,
+                      keyframe_index: Optional[KeyframeIndex] = None) -> List[Tuple[float, float]]:
+        """
+        计算实际切割的片段
+        
+        与MoviePyEditor一致：丢弃无效片段，总时长超过目标时每个片段按比例保留开头部分；
+        然后把起点对齐到关键帧，并合并对齐后重叠的片段。
+        """
+        segments = self.select_segments(clip_segments, target_duration, video_duration)
+        
+        if keyframe_index is not None:
+            segments = [(keyframe_index.keyframe_before(start), end) for start, end in segments]
+        
+        merged = []
+        for start, end in segments:
+            if merged and merged[-1][0] <= start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+    
+    def plan_smart_pieces(self, clip_segments: List[Tuple[float, float]], target_duration: float,
+                          video_duration: float, 
+                          keyframe_index: KeyframeIndex) -> List[Tuple[str, float, float]]:
+        """
+        把每个片段拆成 (方式, 起点, 终点) 的小段，方式为 encode 或 copy：
+        [起点, 之后第一个关键帧) 重新编码，[第一个关键帧, 终点前最后一个关键帧) 直接复制，
+        [最后一个关键帧, 终点) 重新编码
+        """
+        pieces = []
+        for start, end in self.select_segments(clip_segments, target_duration, video_duration):
+            first_key = keyframe_index.keyframe_after(start)
+            last_key = keyframe_index.keyframe_before(end)
+            
+            if first_key is None or first_key >= end or last_key <= first_key:
+                # 片段内没有完整的GOP，整段重新编码
+                pieces.append(('encode', start, end))
+                continue
+            
+            pieces.append(('encode', start, first_key))
+            pieces.append(('copy', first_key, last_key))
+            pieces.append(('encode', last_key, end))
+        
+        return [(mode, start, end) for mode, start, end in pieces 
+                if end - start >= MIN_PIECE_DURATION]
+    
+    def render(self, video_path: str, clip_segments: List[Tuple[float, float]], output_path: str,
+               target_duration: float = 60, video_duration: float = None,
+               keyframe_index: Optional[KeyframeIndex] = None, mode: str = 'copy',
+               video_info: Dict = None, segment_cache: SegmentCache = None,
+               content_hash: str = None) -> bool:
+        """
+        切割并拼接片段，成功返回True
+        
+        mode: copy 或 smart；smart模式的源视频编码格式不受支持时返回False
+        segment_cache / content_hash: smart模式重新编码的边界段使用的片段缓存
+        """
+        if not self.ffmpeg.ffmpeg_path:
+            print("FFmpeg不可用，无法使用FFmpeg渲染")
+            return False
+        
+        if keyframe_index is None:
+            keyframe_index = get_keyframe_index(video_path)
+        
+        if mode == 'smart':
+            if keyframe_index is None:
+                return False
+            if not video_info or not video_info.get('pix_fmt'):
+                video_info = self.ffmpeg.probe_video(video_path, keyframe_window=0) or {}
+            encode_args = self.smart_encode_args(video_path, video_info)
+            if encode_args is None:
+                return False
+            pieces = self.plan_smart_pieces(clip_segments, target_duration, video_duration, 
+                                            keyframe_index)
+        else:
+            encode_args = None
+            pieces = [('copy', start, end) for start, end in 
+                      self.plan_segments(clip_segments, target_duration, video_duration, keyframe_index)]
+        
+        if not pieces:
+            return False
+        
+        os.makedirs(self.temp_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=f'{mode}_render_', dir=self.temp_dir)
+        try:
+            if mode == 'smart':
+                ext = '.mkv'
+                copy_args = ['-map', '0:v:0', '-c', 'copy', '-bsf:v', ANNEXB_FILTERS[video_info['codec']],
+                             '-f', 'matroska']
+            else:
+                ext = os.path.splitext(output_path)[1] or '.mp4'
+                copy_args = None
+            parts = []
+            durations = []
+            cached = 0
+            for i, (piece_mode, start, end) in enumerate(pieces):
+                part_path = os.path.abspath(os.path.join(work_dir, f'part_{i:04d}{ext}'))
+                if mode == 'smart':
+                    # 按帧数截断（-t 会多带几个解码顺序靠后的B帧，且受时间舍入影响），
+                    # 拼接时按帧的实际时长排列
+                    frames, first, after = keyframe_index.frame_span(start, end)
+                    if not frames:
+                        continue
+                    limit = ['-frames:v', str(frames)]
+                    durations.append(after - first)
+                if piece_mode == 'encode':
+                    encoder = {'args': encode_args}
+                    if segment_cache is not None and segment_cache.fetch(content_hash, start, end, {},
+                                                                         encoder, part_path):
+                        cached += 1
+                        ok = True
+                    else:
+                        ok = self.encode_segment(video_path, start, end - start, part_path, 
+                                                 encode_args + limit)
+                        if ok and segment_cache is not None:
+                            segment_cache.store(content_hash, start, end, {}, encoder, part_path)
+                elif copy_args:
+                    ok = self.cut_segment(video_path, start, end - start, part_path, copy_args + limit)
+                else:
+                    ok = self.cut_segment(video_path, start, end - start, part_path)
+                if not ok:
+                    return False
+                parts.append(part_path)
+                if self.quota_check:
+                    self.quota_check()
+            
+            encoded = sum(end - start for piece_mode, start, end in pieces if piece_mode == 'encode')
+            copied = sum(end - start for piece_mode, start, end in pieces if piece_mode == 'copy')
+            print(f"FFmpeg渲染({mode}): {len(pieces)}段, 重新编码{encoded:.2f}秒(缓存命中{cached}段), "
+                  f"直接复制{copied:.2f}秒")
+            
+            if mode == 'smart':
+                if not parts:
+                    return False
+                # 音频按每个片段实际包含的视频帧的时间范围截取，与视频保持同步
+                audio_ranges = []
+                for start, end in self.select_segments(clip_segments, target_duration, video_duration):
+                    frames, first, after = keyframe_index.frame_span(start, end)
+                    if frames:
+                        audio_ranges.append((first, after))
+                expected_frames = sum(keyframe_index.frame_span(start, end)[0] 
+                                      for _, start, end in pieces)
+                return (self._mux_smart(video_path, parts, durations, audio_ranges, output_path,
+                                        video_info, work_dir)
+                        and self.verify_output(output_path, expected_frames))
+            
+            if len(parts) == 1:
+                shutil.move(parts[0], output_path)
+                return True
+            return self.ffmpeg.merge_videos(parts, output_path, temp_dir=work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def select_segments(self, clip_segments: List[Tuple[float, float]], target_duration: float,
+                         video_duration: float = None) -> List[Tuple[float, float]]:
+        """与MoviePyEditor一致：丢弃无效片段，总时长超过目标时每个片段按比例保留开头部分"""
+        segments = [(start, end) for start, end in clip_segments
+                    if start < end and (not video_duration or end <= video_duration)]
+        if not segments:
+            return []
+        
+        total = sum(end - start for start, end in segments)
+        if target_duration and total > target_duration:
+            ratio = target_duration / total
+            segments = [(start, start + (end - start) * ratio) for start, end in segments]
+        return segments
+    
+    def smart_encode_args(self, video_path: str, video_info: Dict = None) -> Optional[List[str]]:
+        """
+        生成与源视频参数一致的视频编码参数（输出只含视频的Matroska），使重新编码的边界段
+        可以和直接复制的数据包拼接；编码格式不受支持时返回None
+        """
+        if not video_info or not video_info.get('pix_fmt'):
+            video_info = self.ffmpeg.probe_video(video_path, keyframe_window=0) or {}
+        
+        codec = video_info.get('codec')
+        encoder = SMART_ENCODERS.get(codec)
+        if encoder is None:
+            print(f"smart渲染不支持的编码格式: {codec}")
+            return None
+        
+        args = ['-an', '-c:v', encoder, '-preset', 'veryfast', '-crf', '18']
+        if video_info.get('pix_fmt'):
+            args += ['-pix_fmt', video_info['pix_fmt']]
+        profile = ENCODER_PROFILES.get(codec, {}).get(video_info.get('profile'))
+        if profile:
+            args += ['-profile:v', profile]
+        return args + ['-f', 'matroska']
+    
+    def encode_segment(self, video_path: str, start: float, duration: float, output_path: str,
+                       encode_args: List[str]) -> bool:
+        """帧精确地重新编码一小段（输入端定位，从之前的关键帧解码后丢弃多余的帧）"""
+        cmd = [
+            self.ffmpeg.ffmpeg_path,
+            '-v', 'error',
+            '-ss', f'{start:.6f}',
+            '-i', video_path,
+            '-t', f'{duration:.6f}',
+            '-map', '0:v:0',
+            '-map', '0:a:0?'
+        ] + encode_args + [
+            '-avoid_negative_ts', 'make_zero',
+            '-y',
+            output_path
+        ]
+        return self._run(cmd, f"重新编码片段失败 ({start:.2f}s, {duration:.2f}s)")
+    
+    def cut_segment(self, video_path: str, start: float, duration: float, output_path: str,
+                    output_args: List[str] = None) -> bool:
+        """
+        从关键帧start开始直接复制duration秒的数据包
+        
+        关键帧时间为微秒精度，定位时间不能舍入到毫秒：舍入到关键帧之前会从上一个关键帧开始复制，
+        多出一整个GOP。output_args 替换默认的流选择和复制参数
+        """
+        cmd = [
+            self.ffmpeg.ffmpeg_path,
+            '-v', 'error',
+            '-ss', f'{start:.6f}',
+            '-i', video_path,
+            '-t', f'{duration:.6f}'
+        ] + (output_args or ['-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy']) + [
+            '-avoid_negative_ts', 'make_zero',
+            '-y',
+            output_path
+        ]
+        return self._run(cmd, f"切割片段失败 ({start:.2f}s, {duration:.2f}s)")
+    
+    def encode_audio(self, video_path: str, segments: List[Tuple[float, float]], output_path: str,
+                     video_info: Dict) -> bool:
+        """把所有片段的音频按顺序一次性解码、拼接并编码为AAC"""
+        cmd = [self.ffmpeg.ffmpeg_path, '-v', 'error']
+        for start, end in segments:
+            cmd += ['-ss', f'{start:.6f}', '-t', f'{end - start:.6f}', '-i', video_path]
+        inputs = ''.join(f'[{i}:a:0]' for i in range(len(segments)))
+        cmd += ['-filter_complex', f'{inputs}concat=n={len(segments)}:v=0:a=1[a]',
+                '-map', '[a]', '-c:a', 'aac']
+        if video_info.get('audio_sample_rate'):
+            cmd += ['-ar', str(video_info['audio_sample_rate'])]
+        if video_info.get('audio_channels'):
+            cmd += ['-ac', str(video_info['audio_channels'])]
+        cmd += ['-y', output_path]
+        return self._run(cmd, "编码音频失败")
+    
+    def verify_output(self, output_path: str, expected_frames: int, tolerance: int = 0) -> bool:
+        """完整解码一遍输出的视频流，有解码或时间戳错误、帧数与预期不符时返回False"""
+        cmd = [
+            self.ffmpeg.ffmpeg_path,
+            '-v', 'error',
+            '-nostats',
+            '-i', output_path,
+            '-map', '0:v:0',
+            '-f', 'null',
+            '-progress', 'pipe:1',
+            '-'
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        except Exception as e:
+            print(f"校验输出视频失败: {e}")
+            return False
+        
+        if result.returncode != 0 or result.stderr.strip():
+            print(f"输出视频解码出错: {result.stderr.strip()[:500]}")
+            return False
+        frames = [line for line in result.stdout.splitlines() if line.startswith('frame=')]
+        decoded = int(frames[-1].split('=', 1)[1]) if frames else 0
+        if abs(decoded - expected_frames) > tolerance:
+            print(f"输出视频帧数不符: 解码{decoded}帧, 预期{expected_frames}帧")
+            return False
+        return True
+    
+    def _mux_smart(self, video_path: str, parts: List[str], durations: List[float],
+                   audio_ranges: List[Tuple[float, float]], output_path: str, video_info: Dict,
+                   work_dir: str) -> bool:
+        """
+        用concat demuxer拼接视频分段，与统一编码的音频一起封装
+        
+        每段按其帧的实际时长排列：分段文件的时长包含B帧延迟，按文件时长排列会在拼接点留下空隙
+        """
+        list_file = os.path.join(work_dir, 'concat.txt')
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for path, duration in zip(parts, durations):
+                f.write(f"file '{path}'\nduration {duration:.6f}\n")
+        
+        cmd = [self.ffmpeg.ffmpeg_path, '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_file]
+        maps = ['-map', '0:v:0']
+        if video_info.get('audio_streams'):
+            audio_path = os.path.join(work_dir, 'audio.m4a')
+            if not self.encode_audio(video_path, audio_ranges, audio_path, video_info):
+                return False
+            cmd += ['-i', audio_path]
+            maps += ['-map', '1:a:0']
+        cmd += maps + ['-c', 'copy', '-tag:v', INBAND_TAGS[video_info['codec']]]
+        
+        # 保持源视频的时间基
+        time_base = video_info.get('time_base') or ''
+        if time_base.startswith('1/'):
+            cmd += ['-video_track_timescale', time_base[2:]]
+        cmd += ['-y', output_path]
+        return self._run(cmd, "拼接视频失败")
+    
+    def _run(self, cmd: List[str], error_message: str) -> bool:
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        except Exception as e:
+            print(f"{error_message}: {e}")
+            return False
+        
+        if result.returncode != 0:
+            print(f"{error_message}: {result.stderr.strip()}")
+            return False
+        return True
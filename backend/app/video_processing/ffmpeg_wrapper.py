@@ -1,5 +1,6 @@
 import subprocess
 import os
+import tempfile
 from typing import List, Tuple, Dict, Optional
 import json
 
@@ -8,6 +9,7 @@ class FFmpegWrapper:
     
     def __init__(self):
         self.ffmpeg_path = self._find_ffmpeg()
+        self.ffprobe_path = self._find_ffprobe()
         if not self.ffmpeg_path:
             print("⚠️ 未找到FFmpeg，视频时长检测功能将不可用")
             print("💡 请安装FFmpeg或将其复制到项目目录")
@@ -36,8 +38,44 @@ class FFmpegWrapper:
         
         return None
     
-    def get_video_info(self, video_path: str) -> Dict:
-        """获取视频信息"""
+    def _find_ffprobe(self) -> Optional[str]:
+        """查找FFprobe可执行文件（通常与FFmpeg位于同一目录）"""
+        common_paths = ['ffprobe']
+        if self.ffmpeg_path and os.path.dirname(self.ffmpeg_path):
+            ffmpeg_dir = os.path.dirname(self.ffmpeg_path)
+            ffprobe_name = os.path.basename(self.ffmpeg_path).replace('ffmpeg', 'ffprobe')
+            common_paths.append(os.path.join(ffmpeg_dir, ffprobe_name))
+        common_paths.extend([
+            'C:\\ffmpeg\\bin\\ffprobe.exe',
+            '/usr/bin/ffprobe',
+            '/usr/local/bin/ffprobe'
+        ])
+        
+        for path in common_paths:
+            try:
+                result = subprocess.run([path, '-version'], 
+                                     capture_output=True, text=True, timeout=5)
+                if result.returncode == 0:
+                    return path
+            except (subprocess.TimeoutExpired, FileNotFoundError):
+                continue
+        
+        return None
+    
+    def get_video_info(self, video_path: str, full_decode: bool = False) -> Dict:
+        """
+        获取视频信息
+        
+        Args:
+            video_path: 视频文件路径
+            full_decode: 是否解码整个文件获取信息（旧模式，大文件非常慢）。
+                默认只读取容器头部（ffprobe），毫秒级返回
+        """
+        if not full_decode and self.ffprobe_path:
+            info = self.probe_video(video_path)
+            if info:
+                return info
+        
         if not self.ffmpeg_available:
             print("⚠️ FFmpeg不可用，返回默认视频信息")
             return {
@@ -79,6 +117,174 @@ class FFmpegWrapper:
                 'size': 0
             }
     
+    def probe_video(self, video_path: str, keyframe_window: float = 30.0) -> Optional[Dict]:
+        """
+        只读取容器头部的快速探测（ffprobe JSON输出），不解码视频帧
+        
+        Args:
+            video_path: 视频文件路径
+            keyframe_window: 估算关键帧间隔时读取的包时间窗口（秒），为0时跳过
+            
+        Returns:
+            视频信息字典，探测失败时返回None
+        """
+        if not self.ffprobe_path:
+            return None
+        
+        try:
+            cmd = [
+                self.ffprobe_path,
+                '-v', 'error',
+                '-print_format', 'json',
+                '-show_format',
+                '-show_streams',
+                video_path
+            ]
+            
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            if result.returncode != 0:
+                print(f"ffprobe探测失败: {result.stderr.strip()}")
+                return None
+            
+            info = self._parse_probe_output(json.loads(result.stdout or '{}'))
+            
+            if keyframe_window > 0:
+                info['keyframe_interval'] = self._probe_keyframe_interval(video_path, keyframe_window)
+            
+            if not info['size'] and os.path.exists(video_path):
+                info['size'] = os.path.getsize(video_path)
+            
+            return info
+            
+        except Exception as e:
+            print(f"ffprobe探测失败: {e}")
+            return None
+    
+    def _parse_probe_output(self, probe: Dict) -> Dict:
+        """解析ffprobe的JSON输出"""
+        info = {
+            'duration': 0.0,
+            'fps': 0.0,
+            'resolution': '',
+            'width': 0,
+            'height': 0,
+            'bitrate': 0,
+            'codec': '',
+            'pix_fmt': '',
+            'profile': '',
+            'time_base': '',
+            'rotation': 0,
+            'nb_frames': 0,
+            'audio_streams': 0,
+            'audio_codec': '',
+            'audio_sample_rate': 0,
+            'audio_channels': 0,
+            'keyframe_interval': 0.0,
+            'size': 0
+        }
+        
+        streams = probe.get('streams', [])
+        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio_streams = [s for s in streams if s.get('codec_type') == 'audio']
+        fmt = probe.get('format', {})
+        
+        info['duration'] = self._to_float(fmt.get('duration'))
+        info['size'] = int(self._to_float(fmt.get('size')))
+        # 与旧的stderr解析保持一致，比特率单位为kb/s
+        info['bitrate'] = int(self._to_float(fmt.get('bit_rate')) / 1000)
+        
+        if video_stream:
+            info['codec'] = video_stream.get('codec_name', '')
+            info['pix_fmt'] = video_stream.get('pix_fmt', '')
+            info['profile'] = video_stream.get('profile', '')
+            info['time_base'] = video_stream.get('time_base', '')
+            info['width'] = int(video_stream.get('width') or 0)
+            info['height'] = int(video_stream.get('height') or 0)
+            if info['width'] and info['height']:
+                info['resolution'] = f"{info['width']}x{info['height']}"
+            info['fps'] = self._parse_frame_rate(
+                video_stream.get('avg_frame_rate') or video_stream.get('r_frame_rate')
+            )
+            info['nb_frames'] = int(self._to_float(video_stream.get('nb_frames')))
+            info['rotation'] = self._parse_rotation(video_stream)
+            if not info['duration']:
+                info['duration'] = self._to_float(video_stream.get('duration'))
+        
+        info['audio_streams'] = len(audio_streams)
+        if audio_streams:
+            info['audio_codec'] = audio_streams[0].get('codec_name', '')
+            info['audio_sample_rate'] = int(self._to_float(audio_streams[0].get('sample_rate')))
+            info['audio_channels'] = int(audio_streams[0].get('channels') or 0)
+        
+        return info
+    
+    def _probe_keyframe_interval(self, video_path: str, window: float) -> float:
+        """读取开头一段时间内的视频包（只解复用不解码），估算平均关键帧间隔（秒）"""
+        try:
+            cmd = [
+                self.ffprobe_path,
+                '-v', 'error',
+                '-select_streams', 'v:0',
+                '-read_intervals', f'%+{window}',
+                '-show_entries', 'packet=pts_time,flags',
+                '-print_format', 'csv=p=0',
+                video_path
+            ]
+            
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            if result.returncode != 0:
+                return 0.0
+            
+            keyframe_times = []
+            for line in result.stdout.splitlines():
+                parts = line.strip().split(',')
+                if len(parts) >= 2 and 'K' in parts[1]:
+                    try:
+                        keyframe_times.append(float(parts[0]))
+                    except ValueError:
+                        continue
+            
+            keyframe_times.sort()
+            if len(keyframe_times) < 2:
+                return 0.0
+            
+            return (keyframe_times[-1] - keyframe_times[0]) / (len(keyframe_times) - 1)
+            
+        except Exception as e:
+            print(f"估算关键帧间隔失败: {e}")
+            return 0.0
+    
+    def _parse_frame_rate(self, rate: Optional[str]) -> float:
+        """解析形如 30000/1001 的帧率"""
+        if not rate:
+            return 0.0
+        try:
+            if '/' in rate:
+                num, den = rate.split('/')
+                return float(num) / float(den) if float(den) else 0.0
+            return float(rate)
+        except ValueError:
+            return 0.0
+    
+    def _parse_rotation(self, video_stream: Dict) -> int:
+        """解析视频旋转角度（旧版本在tags.rotate，新版本在显示矩阵side data中）"""
+        rotate = video_stream.get('tags', {}).get('rotate')
+        if rotate is not None:
+            return int(self._to_float(rotate)) % 360
+        
+        for side_data in video_stream.get('side_data_list', []):
+            if 'rotation' in side_data:
+                return int(self._to_float(side_data['rotation'])) % 360
+        
+        return 0
+    
+    def _to_float(self, value) -> float:
+        """安全地将ffprobe的字符串数值转换为浮点数"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+    
     def _parse_video_info(self, ffmpeg_output: str) -> Dict:
         """解析FFmpeg输出获取视频信息"""
         info = {
@@ -241,15 +447,25 @@ class FFmpegWrapper:
             return False
     
     def create_thumbnail(self, video_path: str, output_path: str, 
-                        time_position: str = '00:00:05') -> bool:
-        """创建视频缩略图"""
+                        time_position: str = '00:00:05', keyframe_index=None) -> bool:
+        """
+        创建视频缩略图
+        
+        在输入端定位（只解码目标位置所在的GOP）；提供关键帧索引时直接取目标之前最近的关键帧，
+        只需解码一帧
+        """
         try:
+            seconds = self._parse_duration(time_position) if ':' in str(time_position) else float(time_position)
+            if keyframe_index is not None:
+                seconds = keyframe_index.keyframe_before(seconds)
+            
             cmd = [
                 self.ffmpeg_path,
+                '-ss', f'{seconds:.3f}',
                 '-i', video_path,
-                '-ss', time_position,
                 '-vframes', '1',
                 '-q:v', '2',
+                '-y',
                 output_path
             ]
             
@@ -261,12 +477,19 @@ class FFmpegWrapper:
             print(f"创建缩略图失败: {e}")
             return False
     
-    def merge_videos(self, video_paths: List[str], output_path: str) -> bool:
-        """合并多个视频文件"""
+    def merge_videos(self, video_paths: List[str], output_path: str, temp_dir: str = None) -> bool:
+        """
+        合并多个视频文件
+        
+        concat列表写在temp_dir（默认为第一个输入文件所在目录）中的唯一文件里，并发合并互不影响
+        """
+        list_file = None
         try:
             # 创建文件列表
-            list_file = 'temp_video_list.txt'
-            with open(list_file, 'w', encoding='utf-8') as f:
+            if temp_dir is None and video_paths:
+                temp_dir = os.path.dirname(os.path.abspath(video_paths[0]))
+            fd, list_file = tempfile.mkstemp(prefix='concat_', suffix='.txt', dir=temp_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
                 for path in video_paths:
                     f.write(f"file '{path}'\n")
             
@@ -276,20 +499,21 @@ class FFmpegWrapper:
                 '-safe', '0',
                 '-i', list_file,
                 '-c', 'copy',
+                '-y',
                 output_path
             ]
             
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
             
-            # 清理临时文件
-            if os.path.exists(list_file):
-                os.remove(list_file)
-            
             return result.returncode == 0
             
         except Exception as e:
             print(f"合并视频失败: {e}")
             return False
+        finally:
+            # 清理临时文件
+            if list_file and os.path.exists(list_file):
+                os.remove(list_file)
     
     def add_watermark(self, input_path: str, output_path: str, 
                       watermark_path: str, position: str = 'bottomright') -> bool:
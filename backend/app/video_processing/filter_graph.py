@@ -0,0 +1,170 @@
+"""
+单进程ffmpeg滤镜图渲染
+
+把片段列表和效果（speedx、volumex、fadein/fadeout、without_audio）翻译成一个
+filter_complex，由ffmpeg原生完成解码、处理和编码，没有MoviePy逐帧经过Python的开销和NumPy拷贝。
+每个片段作为一个输入在输入端精确定位，只解码需要的部分；效果的语义与MoviePy路径一致。
+"""
+import os
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .ffmpeg_wrapper import FFmpegWrapper
+
+# 与MoviePy write_videofile的默认设置一致
+OUTPUT_ENCODER_ARGS = ['-c:v', 'libx264', '-preset', 'medium', '-pix_fmt', 'yuv420p', '-c:a', 'aac']
+
+# 预览：低分辨率、最快的编码预设，几秒内即可生成
+PREVIEW_ENCODER_ARGS = ['-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '30', '-pix_fmt', 'yuv420p',
+                        '-c:a', 'aac', '-b:a', '96k']
+
+
+def effects_from_suggestions(audio_suggestions: List[str] = None) -> Dict:
+    """
+    按MoviePyEditor._apply_audio_suggestions的规则把音频建议转换为效果参数
+    （每条建议依次作用于每个片段，音量和速度的倍数相乘）
+    
+    video: 按建议顺序排列的画面效果 [效果, 参数]（speed / fadein / fadeout）。MoviePy依次应用：
+    先淡入再变速时淡入按原速的时长计算、随后一起变速，先变速再淡入则按变速后的时长计算
+    """
+    effects = {'mute': False, 'volume': 1.0, 'speed': 1.0, 'video': []}
+    for suggestion in audio_suggestions or []:
+        suggestion_lower = suggestion.lower()
+        if any(word in suggestion_lower for word in ['静音', '无声', '关闭音频']):
+            effects['mute'] = True
+        elif any(word in suggestion_lower for word in ['降低音量', '减小音量', '音量降低']):
+            effects['volume'] *= 0.3
+        elif any(word in suggestion_lower for word in ['提高音量', '增大音量', '音量提高']):
+            effects['volume'] *= 1.5
+        elif any(word in suggestion_lower for word in ['慢动作', '慢速', '减速']):
+            effects['speed'] *= 0.5
+            effects['video'].append(['speed', 0.5])
+        elif any(word in suggestion_lower for word in ['快动作', '快速', '加速']):
+            effects['speed'] *= 2.0
+            effects['video'].append(['speed', 2.0])
+        elif any(word in suggestion_lower for word in ['淡入', '渐入']):
+            effects['video'].append(['fadein', 1.0])
+        elif any(word in suggestion_lower for word in ['淡出', '渐出']):
+            effects['video'].append(['fadeout', 1.0])
+    return effects
+
+
+class FilterGraphRenderer:
+    """把精彩片段和效果渲染为一次ffmpeg调用"""
+    
+    def __init__(self, ffmpeg: FFmpegWrapper = None):
+        self.ffmpeg = ffmpeg or FFmpegWrapper()
+    
+    def build_command(self, video_path: str, segments: List[Tuple[float, float]], output_path: str,
+                      effects: Dict, has_audio: bool = True, audio_sample_rate: int = 0,
+                      encoder_args: List[str] = None, scale_height: int = 0) -> List[str]:
+        """生成完整的ffmpeg命令，scale_height不为0时最后把画面缩放到该高度"""
+        cmd = [self.ffmpeg.ffmpeg_path, '-v', 'error']
+        for start, end in segments:
+            cmd += ['-ss', f'{start:.6f}', '-t', f'{end - start:.6f}', '-i', video_path]
+        
+        with_audio = has_audio and not effects['mute']
+        speed = effects['speed']
+        filters = []
+        labels = []
+        
+        for i, (start, end) in enumerate(segments):
+            duration = end - start
+            
+            # 按MoviePy的顺序逐个应用，淡入淡出使用应用时片段的时长和时间轴
+            video_chain = [f'trim=duration={end - start:.6f}', 'setpts=PTS-STARTPTS']
+            for effect, value in effects['video']:
+                if effect == 'speed':
+                    video_chain.append(f'setpts=PTS/{value}')
+                    duration /= value
+                elif effect == 'fadein':
+                    video_chain.append(f'fade=t=in:st=0:d={min(value, duration):.3f}')
+                else:
+                    fade = min(value, duration)
+                    video_chain.append(f'fade=t=out:st={duration - fade:.3f}:d={fade:.3f}')
+            filters.append(f"[{i}:v]{','.join(video_chain)}[v{i}]")
+            labels.append(f'[v{i}]')
+            
+            if with_audio:
+                audio_chain = [f'atrim=duration={end - start:.6f}', 'asetpts=PTS-STARTPTS']
+                if speed != 1.0:
+                    # MoviePy的speedx按时间重采样，音调随速度变化
+                    if audio_sample_rate:
+                        audio_chain += [f'asetrate={audio_sample_rate * speed:.0f}',
+                                        f'aresample={audio_sample_rate}']
+                    else:
+                        audio_chain.append(f'atempo={speed}')
+                if effects['volume'] != 1.0:
+                    audio_chain.append(f"volume={effects['volume']}")
+                filters.append(f"[{i}:a]{','.join(audio_chain)}[a{i}]")
+                labels.append(f'[a{i}]')
+        
+        count = len(segments)
+        if with_audio:
+            filters.append(f"{''.join(labels)}concat=n={count}:v=1:a=1[vcat][aout]")
+        else:
+            filters.append(f"{''.join(labels)}concat=n={count}:v=1:a=0[vcat]")
+        
+        video_label = 'vcat'
+        if scale_height:
+            filters.append(f'[{video_label}]scale=-2:{scale_height}[vscaled]')
+            video_label = 'vscaled'
+        
+        cmd += ['-filter_complex', ';'.join(filters), '-map', f'[{video_label}]']
+        if with_audio:
+            cmd += ['-map', '[aout]']
+        cmd += (encoder_args or OUTPUT_ENCODER_ARGS) + ['-movflags', '+faststart', '-y', output_path]
+        return cmd
+    
+    def render(self, video_path: str, segments: List[Tuple[float, float]], output_path: str,
+               audio_suggestions: List[str] = None, video_info: Optional[Dict] = None,
+               preview_height: int = 0) -> bool:
+        """
+        渲染精彩集锦
+        
+        Args:
+            segments: 已按目标时长调整好的 (起点, 终点) 列表
+            video_info: 已探测的视频信息，用于判断是否有音轨及采样率
+            preview_height: 不为0时渲染该高度的快速预览（不超过源视频高度）
+        """
+        if not self.ffmpeg.ffmpeg_path or not segments:
+            return False
+        
+        if not video_info or 'audio_sample_rate' not in video_info:
+            video_info = self.ffmpeg.probe_video(video_path, keyframe_window=0) or {}
+        
+        cmd = self.build_command(
+            video_path, segments, output_path, effects_from_suggestions(audio_suggestions),
+            has_audio=bool(video_info.get('audio_streams')),
+            audio_sample_rate=video_info.get('audio_sample_rate') or 0,
+            encoder_args=PREVIEW_ENCODER_ARGS if preview_height else None,
+            scale_height=self._preview_scale(preview_height, video_info)
+        )
+        
+        started = time.time()
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
+        except Exception as e:
+            print(f"滤镜图渲染失败: {e}")
+            return False
+        
+        if result.returncode != 0:
+            print(f"滤镜图渲染失败: {result.stderr.strip()}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return False
+        
+        tier = '预览' if preview_height else ''
+        print(f"滤镜图渲染{tier}: {len(segments)}个片段, 耗时{time.time() - started:.2f}秒")
+        return True
+    
+    @staticmethod
+    def _preview_scale(preview_height: int, video_info: Dict) -> int:
+        """预览的缩放高度（取偶数），源视频不高于预览高度时不缩放"""
+        if not preview_height:
+            return 0
+        source_height = video_info.get('height') or 0
+        if source_height and source_height <= preview_height:
+            return 0
+        return preview_height - preview_height % 2
@@ -0,0 +1,177 @@
+import subprocess
+import time
+import numpy as np
+from typing import Dict, Iterator, Optional, Tuple
+
+# 支持的输出像素格式及每像素通道数
+PIXEL_FORMATS = {
+    'gray': 1,
+    'bgr24': 3
+}
+
+class FFmpegFramePipe:
+    """
+    低分辨率帧源：ffmpeg解码后在进程内完成fps抽帧和缩放，以rawvideo格式写入管道
+    
+    迭代得到的帧是复用缓冲区上的np.frombuffer视图，不会为每帧分配内存；
+    下一次读取会覆盖其内容，需要保留的帧请自行copy()或使用read_stack()。
+    """
+    
+    def __init__(self, video_path: str, width: int = 320, fps: float = None,
+                 pix_fmt: str = 'gray', start: float = None, duration: float = None,
+                 video_info: Dict = None, ffmpeg_path: str = None):
+        """
+        Args:
+            video_path: 视频文件路径
+            width: 输出宽度，高度按显示宽高比计算（取偶数）
+            fps: 输出帧率，为空时保留原帧率
+            pix_fmt: 输出像素格式，gray或bgr24
+            start: 起始时间（秒），在输入端定位
+            duration: 读取时长（秒）
+            video_info: FFmpegWrapper.get_video_info的结果，为空时自动探测
+            ffmpeg_path: ffmpeg可执行文件路径
+        """
+        if pix_fmt not in PIXEL_FORMATS:
+            raise ValueError(f"不支持的像素格式: {pix_fmt}")
+        
+        if video_info is None or ffmpeg_path is None:
+            from .ffmpeg_wrapper import FFmpegWrapper
+            ffmpeg = FFmpegWrapper()
+            ffmpeg_path = ffmpeg_path or ffmpeg.ffmpeg_path
+            if video_info is None:
+                video_info = ffmpeg.probe_video(video_path, keyframe_window=0) or {}
+        
+        if not ffmpeg_path:
+            raise RuntimeError("FFmpeg不可用，无法创建帧管道")
+        
+        self.video_path = video_path
+        self.pix_fmt = pix_fmt
+        self.fps = fps
+        self.start = start
+        self.duration = duration
+        self.ffmpeg_path = ffmpeg_path
+        self.width, self.height = self.output_size(video_info, width)
+        self.channels = PIXEL_FORMATS[pix_fmt]
+        self.frame_bytes = self.width * self.height * self.channels
+        
+        self._process = None
+        self._buffer = bytearray(self.frame_bytes)
+        self._frame = np.frombuffer(self._buffer, dtype=np.uint8).reshape(self.shape)
+        self.frames_read = 0
+        self.elapsed = 0.0
+    
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        if self.channels == 1:
+            return (self.height, self.width)
+        return (self.height, self.width, self.channels)
+    
+    @staticmethod
+    def output_size(video_info: Dict, width: int) -> Tuple[int, int]:
+        """根据源分辨率和旋转角度计算输出尺寸（ffmpeg默认会自动旋转）"""
+        src_width = video_info.get('width') or 0
+        src_height = video_info.get('height') or 0
+        if video_info.get('rotation', 0) in (90, 270):
+            src_width, src_height = src_height, src_width
+        
+        if not src_width or not src_height:
+            raise ValueError("无法获取视频分辨率")
+        
+        width = min(width, src_width) if width else src_width
+        width -= width % 2
+        height = int(round(src_height * width / src_width / 2)) * 2
+        return width, max(2, height)
+    
+    def build_command(self) -> list:
+        filters = []
+        if self.fps:
+            filters.append(f'fps={self.fps}')
+        filters.append(f'scale={self.width}:{self.height}:flags=area')
+        
+        cmd = [self.ffmpeg_path, '-v', 'error', '-nostdin']
+        if self.start:
+            cmd += ['-ss', f'{self.start:.3f}']
+        cmd += ['-i', self.video_path]
+        if self.duration:
+            cmd += ['-t', f'{self.duration:.3f}']
+        cmd += [
+            '-map', '0:v:0',
+            '-an', '-sn',
+            '-vf', ','.join(filters),
+            '-pix_fmt', self.pix_fmt,
+            '-f', 'rawvideo',
+            'pipe:1'
+        ]
+        return cmd
+    
+    def open(self):
+        if self._process is None:
+            self._process = subprocess.Popen(self.build_command(), stdout=subprocess.PIPE,
+                                             stderr=subprocess.DEVNULL, bufsize=0)
+        return self
+    
+    def read(self) -> Optional[np.ndarray]:
+        """读取下一帧到复用缓冲区，返回其视图；结束时返回None"""
+        return self._frame if self.read_into(self._frame) else None
+    
+    def read_into(self, out: np.ndarray) -> bool:
+        """直接读取到调用方提供的数组（例如预分配的(N, H, W)数组的一个切片）"""
+        if self._process is None:
+            self.open()
+        
+        view = memoryview(out.reshape(-1))
+        started = time.time()
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        self.elapsed += time.time() - started
+        
+        if filled < self.frame_bytes:
+            return False
+        
+        self.frames_read += 1
+        return True
+    
+    def read_stack(self, max_frames: int) -> np.ndarray:
+        """读取最多max_frames帧到一个预分配的(N, H, W[, C])数组"""
+        stack = np.empty((max_frames,) + self.shape, dtype=np.uint8)
+        count = 0
+        while count < max_frames and self.read_into(stack[count]):
+            count += 1
+        return stack[:count]
+    
+    def __iter__(self) -> Iterator[np.ndarray]:
+        try:
+            while True:
+                frame = self.read()
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self.close()
+    
+    def close(self):
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.stdout.close()
+            self._process.wait()
+            self._process = None
+    
+    def __enter__(self):
+        return self.open()
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def stats(self) -> Dict:
+        return {
+            'frames': self.frames_read,
+            'elapsed': self.elapsed,
+            'fps': self.frames_read / self.elapsed if self.elapsed > 0 else 0.0,
+            'resolution': f'{self.width}x{self.height}',
+            'pixFmt': self.pix_fmt
+        }
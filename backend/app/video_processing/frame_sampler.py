@@ -0,0 +1,433 @@
+import cv2
+import numpy as np
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from .keyframe_index import get_keyframe_index
+
+# 采样网格：所有消费者的采样位置都取自同一组等间距位置，保证不同数量的采样可以复用已解码的帧
+DEFAULT_GRID = 100
+
+# 解码代价模型（单位：解码一帧的代价）
+DEFAULT_GOP_FRAMES = 250  # 无法探测时按x264默认keyint估算
+SEEK_OVERHEAD = 5.0  # 每次随机定位时重置解码器、刷新缓冲的额外代价
+
+class SampledFrame:
+    """一个采样位置的解码结果，灰度图和缩放版本按需生成并缓存"""
+    
+    def __init__(self, index: int, timestamp: float, color: Optional[np.ndarray] = None,
+                 gray: Optional[np.ndarray] = None):
+        self.index = index
+        self.timestamp = timestamp
+        self._color = color
+        self._gray = gray
+        self._variants = {}
+    
+    @property
+    def has_color(self) -> bool:
+        return self._color is not None
+    
+    @property
+    def color(self) -> Optional[np.ndarray]:
+        """BGR彩色帧"""
+        return self._color
+    
+    @property
+    def gray(self) -> np.ndarray:
+        """灰度帧"""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self._color, cv2.COLOR_BGR2GRAY)
+        return self._gray
+    
+    def resized(self, width: int, gray: bool = True) -> np.ndarray:
+        """按宽度等比缩放的版本（INTER_AREA），结果会被缓存"""
+        key = (width, gray)
+        if key not in self._variants:
+            source = self.gray if gray or self._color is None else self._color
+            height, src_width = source.shape[:2]
+            if src_width <= width:
+                self._variants[key] = source
+            else:
+                new_height = max(1, int(round(height * width / src_width)))
+                self._variants[key] = cv2.resize(source, (width, new_height),
+                                                 interpolation=cv2.INTER_AREA)
+        return self._variants[key]
+    
+    def drop_color(self):
+        """只保留灰度图以节省内存"""
+        if self._color is not None:
+            if self._gray is None:
+                self._gray = cv2.cvtColor(self._color, cv2.COLOR_BGR2GRAY)
+            self._color = None
+            self._variants = {k: v for k, v in self._variants.items() if k[1]}
+    
+    @property
+    def nbytes(self) -> int:
+        total = sum(v.nbytes for v in self._variants.values())
+        if self._color is not None:
+            total += self._color.nbytes
+        if self._gray is not None:
+            total += self._gray.nbytes
+        return total
+
+
+class _VideoFrames:
+    """单个视频的已解码帧"""
+    
+    def __init__(self, total_frames: int, fps: float):
+        self.total_frames = total_frames
+        self.fps = fps
+        self.gop_frames = None  # 平均关键帧间隔（帧），首次需要时探测
+        self.frames: Dict[int, SampledFrame] = {}
+        self.lock = threading.Lock()
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(frame.nbytes for frame in self.frames.values())
+
+
+class FrameSampler:
+    """
+    共享的帧采样服务
+    
+    每个采样位置只解码一次，彩色帧、灰度帧和缩放版本可供任意数量的消费者使用
+    （SportsClassifier的运动识别、MoviePyEditor的运动强度分析等）。解码结果按视频缓存，
+    同一视频后续的剪辑请求可以直接复用；缓存按字节数做LRU淘汰。
+    """
+    
+    def __init__(self, max_cache_bytes: int = None):
+        if max_cache_bytes is None:
+            max_cache_bytes = int(os.environ.get('FRAME_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+        self.max_cache_bytes = max_cache_bytes
+        self._videos: 'OrderedDict[Tuple, _VideoFrames]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.decoded_frames = 0
+        self.reused_frames = 0
+        self.last_stats: Dict = {}
+    
+    def sample(self, video_path: str, num_frames: int, color: bool = False,
+               grid: int = DEFAULT_GRID, snap_to_keyframes: bool = True) -> List[SampledFrame]:
+        """
+        在视频中等间距采样
+        
+        Args:
+            video_path: 视频文件路径
+            num_frames: 采样数量
+            color: 是否需要彩色帧（否则只保留灰度帧以节省内存）
+            grid: 采样网格大小，num_frames不超过grid时采样位置取自网格，便于复用
+            snap_to_keyframes: 采样稀疏时允许用最近的关键帧代替目标帧（返回帧的index为实际帧号）
+        """
+        entry = self._get_entry(video_path)
+        if entry is None or entry.total_frames <= 0:
+            return []
+        
+        indices = self.frame_indices(entry.total_frames, num_frames, grid)
+        return self._sample_indices(video_path, entry, indices, color, snap_to_keyframes)
+    
+    def sample_at(self, video_path: str, indices: List[int], color: bool = False) -> List[SampledFrame]:
+        """精确解码指定帧号的帧（同样复用缓存）"""
+        entry = self._get_entry(video_path)
+        if entry is None or entry.total_frames <= 0:
+            return []
+        
+        valid = sorted({int(i) for i in indices if 0 <= int(i) < entry.total_frames})
+        return self._sample_indices(video_path, entry, valid, color, False)
+    
+    def release(self, video_path: str, indices: List[int]):
+        """从缓存中移除指定帧（一次性使用的精确解码结果，避免长视频占满单个视频的缓存）"""
+        key = self._cache_key(video_path)
+        with self._lock:
+            entry = self._videos.get(key) if key else None
+        if entry is None:
+            return
+        
+        with entry.lock:
+            for i in indices:
+                entry.frames.pop(int(i), None)
+    
+    def choose_strategy(self, indices: List[int], gop_frames: float, 
+                        snap_to_keyframes: bool = True) -> str:
+        """
+        按解码代价选择采样策略
+        
+        - sequential: 定位到第一个采样点后顺序grab()，只在采样点retrieve()，代价约为跨度帧数
+        - keyframe: 采样间隔大于GOP时直接定位到最近的关键帧，每个采样点只解码一帧
+        - seek: 精确定位，每个采样点需要从前一个关键帧解码，平均代价约为半个GOP
+        """
+        if len(indices) <= 1:
+            return 'seek'
+        
+        span = indices[-1] - indices[0] + 1
+        average_gap = span / len(indices)
+        if snap_to_keyframes and average_gap >= gop_frames:
+            return 'keyframe'
+        
+        sequential_cost = SEEK_OVERHEAD + gop_frames / 2 + span
+        seek_cost = len(indices) * (SEEK_OVERHEAD + gop_frames / 2 + 1)
+        return 'sequential' if sequential_cost <= seek_cost else 'seek'
+    
+    def sample_array(self, video_path: str, num_frames: int, width: int = None,
+                     pix_fmt: str = 'gray', video_info: Dict = None,
+                     grid: int = DEFAULT_GRID) -> Tuple[np.ndarray, float]:
+        """
+        以指定分辨率和像素格式采样，返回 (帧数组, 缩放比例)
+        
+        帧数组形状为 (N, H, W)（gray）或 (N, H, W, 3)（bgr24），缩放比例为输出宽度与源宽度之比。
+        采样密集时使用ffmpeg帧管道（在ffmpeg内完成抽帧和缩放），稀疏时复用缓存的定位解码结果。
+        """
+        entry = self._get_entry(video_path)
+        if entry is None or entry.total_frames <= 0:
+            return np.empty((0, 0, 0), dtype=np.uint8), 1.0
+        
+        if width:
+            stack = self._sample_with_pipe(video_path, entry, num_frames, width, pix_fmt, 
+                                           video_info, grid)
+            if stack is not None:
+                return stack
+        
+        sampled = self.sample(video_path, num_frames, color=(pix_fmt == 'bgr24'), grid=grid)
+        if not sampled:
+            return np.empty((0, 0, 0), dtype=np.uint8), 1.0
+        
+        gray = pix_fmt == 'gray'
+        frames = [frame.resized(width, gray) if width else (frame.gray if gray else frame.color)
+                  for frame in sampled]
+        source_width = (sampled[0].gray if gray else sampled[0].color).shape[1]
+        
+        stack = np.empty((len(frames),) + frames[0].shape, dtype=np.uint8)
+        for i, frame in enumerate(frames):
+            stack[i] = frame
+        return stack, frames[0].shape[1] / source_width
+    
+    def _sample_with_pipe(self, video_path: str, entry: _VideoFrames, num_frames: int, width: int,
+                          pix_fmt: str, video_info: Dict, grid: int) -> Optional[Tuple[np.ndarray, float]]:
+        """采样密集（顺序解码更划算）时通过ffmpeg帧管道读取低分辨率帧"""
+        if entry.gop_frames is None:
+            entry.gop_frames = self._estimate_gop_frames(video_path, entry.fps)
+        indices = self.frame_indices(entry.total_frames, num_frames, grid)
+        if self.choose_strategy(indices, entry.gop_frames, False) != 'sequential':
+            return None
+        
+        try:
+            from .frame_pipe import FFmpegFramePipe
+            from .ffmpeg_wrapper import FFmpegWrapper
+            
+            if not video_info:
+                video_info = FFmpegWrapper().probe_video(video_path, keyframe_window=0) or {}
+            duration = video_info.get('duration') or (entry.total_frames / entry.fps if entry.fps else 0)
+            if duration <= 0:
+                return None
+            
+            pipe = FFmpegFramePipe(video_path, width=width, fps=num_frames / duration,
+                                   pix_fmt=pix_fmt, video_info=video_info)
+            with pipe:
+                stack = pipe.read_stack(num_frames)
+            
+            if len(stack) == 0:
+                return None
+            
+            source_width = FFmpegFramePipe.output_size(video_info, 0)[0]
+            self._record_stats('pipe', len(stack), entry.total_frames, pipe.stats()['elapsed'])
+            return stack, pipe.width / source_width
+            
+        except Exception as e:
+            print(f"帧管道采样失败，回退到定位解码: {e}")
+            return None
+    
+    def video_properties(self, video_path: str) -> Tuple[int, float]:
+        """返回 (总帧数, 帧率)"""
+        entry = self._get_entry(video_path)
+        if entry is None:
+            return 0, 0.0
+        return entry.total_frames, entry.fps
+    
+    @staticmethod
+    def frame_indices(total_frames: int, num_frames: int, grid: int = DEFAULT_GRID) -> List[int]:
+        """计算采样帧号，少量采样取自网格位置的子集"""
+        if total_frames <= 0 or num_frames <= 0:
+            return []
+        
+        if num_frames >= grid:
+            return [int(i) for i in np.linspace(0, total_frames - 1, num_frames, dtype=int)]
+        
+        grid_positions = np.linspace(0, total_frames - 1, grid, dtype=int)
+        picks = np.linspace(0, grid - 1, num_frames).round().astype(int)
+        return [int(grid_positions[i]) for i in picks]
+    
+    def clear(self, video_path: str = None):
+        """清除缓存"""
+        with self._lock:
+            if video_path is None:
+                self._videos.clear()
+            else:
+                for key in [k for k in self._videos if k[0] == os.path.abspath(video_path)]:
+                    del self._videos[key]
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'videos': len(self._videos),
+                'cachedBytes': sum(entry.nbytes for entry in self._videos.values()),
+                'decodedFrames': self.decoded_frames,
+                'reusedFrames': self.reused_frames,
+                'lastSampling': dict(self.last_stats)
+            }
+    
+    def _cache_key(self, video_path: str) -> Optional[Tuple]:
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        return os.path.abspath(video_path), stat.st_size, stat.st_mtime
+    
+    def _get_entry(self, video_path: str) -> Optional[_VideoFrames]:
+        key = self._cache_key(video_path)
+        if key is None:
+            return None
+        
+        with self._lock:
+            entry = self._videos.get(key)
+            if entry is not None:
+                self._videos.move_to_end(key)
+                return entry
+        
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return None
+        entry = _VideoFrames(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), cap.get(cv2.CAP_PROP_FPS) or 0.0)
+        cap.release()
+        
+        with self._lock:
+            entry = self._videos.setdefault(key, entry)
+            self._videos.move_to_end(key)
+        return entry
+    
+    def _sample_indices(self, video_path: str, entry: _VideoFrames, indices: List[int],
+                        color: bool, snap_to_keyframes: bool) -> List[SampledFrame]:
+        # 同一视频的解码串行进行，避免多个消费者同时解码相同位置
+        with entry.lock:
+            missing = sorted({i for i in indices
+                              if i not in entry.frames 
+                              or (color and not entry.frames[i].has_color)
+                              or (not snap_to_keyframes and entry.frames[i].index != i)})
+            self.reused_frames += len(set(indices)) - len(missing)
+            
+            if missing:
+                if entry.gop_frames is None:
+                    entry.gop_frames = self._estimate_gop_frames(video_path, entry.fps)
+                strategy = self.choose_strategy(missing, entry.gop_frames, snap_to_keyframes)
+                
+                started = time.time()
+                decoded = 0
+                for target, actual, frame, cost in self._decode(video_path, missing, strategy, 
+                                                                entry.gop_frames):
+                    sampled = SampledFrame(actual, actual / entry.fps if entry.fps else 0.0, color=frame)
+                    if not color:
+                        sampled.drop_color()
+                    entry.frames[target] = sampled
+                    decoded += cost
+                    self.decoded_frames += 1
+                
+                self._record_stats(strategy, len(missing), decoded, time.time() - started)
+            
+            frames = [entry.frames[i] for i in indices if i in entry.frames]
+        
+        self._evict()
+        return frames
+    
+    def _estimate_gop_frames(self, video_path: str, fps: float) -> float:
+        """平均GOP长度（帧）：优先使用上传时建立的关键帧索引，否则用ffprobe读取开头一段视频包估算"""
+        index = get_keyframe_index(video_path, build=False)
+        if index is not None:
+            return max(1.0, index.average_gop_frames)
+        
+        try:
+            from .ffmpeg_wrapper import FFmpegWrapper
+            info = FFmpegWrapper().probe_video(video_path) or {}
+            interval = info.get('keyframe_interval') or 0.0
+            if interval > 0 and fps > 0:
+                return max(1.0, interval * fps)
+        except Exception as e:
+            print(f"估算GOP长度失败: {e}")
+        return float(DEFAULT_GOP_FRAMES)
+    
+    def _decode(self, video_path: str, indices: List[int], strategy: str, gop_frames: float):
+        """
+        按选定的策略解码，产出 (目标帧号, 实际帧号, 帧, 解码帧数)
+        
+        解码帧数为估算值：顺序模式为实际grab的帧数，定位模式按GOP长度估算
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return
+        
+        keyframes = get_keyframe_index(video_path, build=False) if strategy == 'keyframe' else None
+        
+        try:
+            if strategy == 'sequential':
+                targets = set(indices)
+                cap.set(cv2.CAP_PROP_POS_FRAMES, indices[0])
+                position = indices[0]
+                grabbed = int(gop_frames / 2)
+                while position <= indices[-1]:
+                    if not cap.grab():
+                        break
+                    grabbed += 1
+                    if position in targets:
+                        ret, frame = cap.retrieve()
+                        if ret:
+                            yield position, position, frame, grabbed
+                        grabbed = 0
+                    position += 1
+            else:
+                gop = max(1, int(round(gop_frames)))
+                for idx in indices:
+                    if strategy == 'keyframe':
+                        # 取目标之前的关键帧：有索引时使用实际位置，否则按固定GOP假设
+                        actual = keyframes.keyframe_frame_before(idx) if keyframes else (idx // gop) * gop
+                        cost = 1
+                    else:
+                        actual = idx
+                        cost = int(gop_frames / 2) + 1
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, actual)
+                    ret, frame = cap.read()
+                    if ret:
+                        yield idx, actual, frame, cost
+        finally:
+            cap.release()
+    
+    def _record_stats(self, strategy: str, samples: int, decoded_frames: int, elapsed: float):
+        """记录本次采样的策略和解码吞吐"""
+        self.last_stats = {
+            'strategy': strategy,
+            'samples': samples,
+            'decodedFrames': decoded_frames,
+            'elapsed': elapsed,
+            'decodeFps': decoded_frames / elapsed if elapsed > 0 else 0.0,
+            'samplesPerSecond': samples / elapsed if elapsed > 0 else 0.0
+        }
+        print(f"帧采样: 策略={strategy}, 采样{samples}帧, 解码约{decoded_frames}帧, "
+              f"耗时{elapsed:.2f}秒, {self.last_stats['decodeFps']:.0f} fps")
+    
+    def _evict(self):
+        """按LRU淘汰视频缓存，至少保留最近使用的视频"""
+        with self._lock:
+            total = sum(entry.nbytes for entry in self._videos.values())
+            while total > self.max_cache_bytes and len(self._videos) > 1:
+                _, entry = self._videos.popitem(last=False)
+                total -= entry.nbytes
+
+
+_default_sampler = None
+_default_sampler_lock = threading.Lock()
+
+def get_frame_sampler() -> FrameSampler:
+    """进程内共享的帧采样器"""
+    global _default_sampler
+    with _default_sampler_lock:
+        if _default_sampler is None:
+            _default_sampler = FrameSampler()
+        return _default_sampler
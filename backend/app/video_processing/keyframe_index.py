@@ -0,0 +1,231 @@
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+INDEX_SUFFIX = '.keyframes.npz'
+INDEX_VERSION = 2  # 2: 以容器start_time为0点，并保存最后一帧的结束时间
+
+
+class KeyframeIndex:
+    """
+    视频流的关键帧和数据包时间戳索引
+    
+    上传后通过一次只解复用不解码的ffprobe -show_packets得到，按显示时间排序后以微秒为单位的
+    int64数组保存在上传文件旁（<文件名>.keyframes.npz）。时间以容器的start_time为0点，
+    与ffmpeg -ss定位使用的时间一致（音频先于视频开始或start_time不为0的文件，视频流第一个
+    数据包的时间不为0）。帧号与cv2.VideoCapture一致，即按显示时间排序后的数据包序号。
+    """
+    
+    def __init__(self, packet_us: np.ndarray, keyframe_us: np.ndarray, end_us: int = None):
+        self.packet_us = np.asarray(packet_us, dtype=np.int64)
+        self.keyframe_us = np.asarray(keyframe_us, dtype=np.int64)
+        self.keyframe_frames = np.searchsorted(self.packet_us, self.keyframe_us)
+        # 最后一帧的结束时间（最后一个数据包的时间加其时长）
+        self.end_us = int(end_us) if end_us is not None else int(self.packet_us[-1])
+    
+    @staticmethod
+    def index_path(video_path: str) -> str:
+        return f'{video_path}{INDEX_SUFFIX}'
+    
+    @classmethod
+    def build(cls, video_path: str, ffprobe_path: str = None) -> Optional['KeyframeIndex']:
+        """读取视频流的所有数据包时间戳和关键帧标记（不解码）"""
+        if ffprobe_path is None:
+            from .ffmpeg_wrapper import FFmpegWrapper
+            ffprobe_path = FFmpegWrapper().ffprobe_path
+        if not ffprobe_path:
+            return None
+        
+        cmd = [
+            ffprobe_path,
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,duration_time,flags:format=start_time',
+            '-print_format', 'csv',
+            video_path
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        except Exception as e:
+            print(f"构建关键帧索引失败: {e}")
+            return None
+        if result.returncode != 0:
+            print(f"构建关键帧索引失败: {result.stderr.strip()}")
+            return None
+        
+        return cls.parse(result.stdout)
+    
+    @classmethod
+    def parse(cls, output: str) -> Optional['KeyframeIndex']:
+        """
+        解析ffprobe的csv输出
+        
+        每个数据包一行 "packet,<pts_time>,<duration_time>,<flags>"，
+        容器信息一行 "format,<start_time>"
+        """
+        packets = []
+        keyframes = []
+        end_us = None
+        start_us = None
+        for line in output.splitlines():
+            parts = line.strip().split(',')
+            if parts[0] == 'format' and len(parts) >= 2:
+                start_us = _parse_us(parts[1])
+                continue
+            if parts[0] != 'packet' or len(parts) < 4:
+                continue
+            pts = _parse_us(parts[1])
+            if pts is None:
+                continue  # pts为N/A的数据包
+            packets.append(pts)
+            if 'K' in parts[3]:
+                keyframes.append(pts)
+            duration = _parse_us(parts[2]) or 0
+            end_us = pts + duration if end_us is None else max(end_us, pts + duration)
+        
+        if not packets or not keyframes:
+            return None
+        
+        packet_us = np.sort(np.array(packets, dtype=np.int64))
+        keyframe_us = np.sort(np.array(keyframes, dtype=np.int64))
+        # 时间以容器start_time为0点，与ffmpeg -ss和MoviePy的时间一致；没有start_time时使用第一个数据包
+        origin = start_us if start_us is not None else int(packet_us[0])
+        return cls(packet_us - origin, keyframe_us - origin, end_us - origin)
+    
+    @classmethod
+    def load(cls, video_path: str) -> Optional['KeyframeIndex']:
+        """读取已保存的索引，文件不存在或比视频旧时返回None"""
+        path = cls.index_path(video_path)
+        try:
+            if os.path.getmtime(path) < os.path.getmtime(video_path):
+                return None
+            with np.load(path, allow_pickle=False) as data:
+                if 'version' not in data.files or int(data['version']) != INDEX_VERSION:
+                    return None  # 旧版本的索引时间原点不同，重新构建
+                return cls(data['packet_us'], data['keyframe_us'], int(data['end_us']))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取关键帧索引失败: {e}")
+            return None
+    
+    def save(self, video_path: str):
+        path = self.index_path(video_path)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, packet_us=self.packet_us, keyframe_us=self.keyframe_us,
+                     end_us=np.int64(self.end_us), version=np.int64(INDEX_VERSION))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load_or_build(cls, video_path: str, ffprobe_path: str = None) -> Optional['KeyframeIndex']:
+        index = cls.load(video_path)
+        if index is None:
+            index = cls.build(video_path, ffprobe_path)
+            if index is not None:
+                try:
+                    index.save(video_path)
+                except OSError as e:
+                    print(f"保存关键帧索引失败: {e}")
+        return index
+    
+    @staticmethod
+    def remove(video_path: str):
+        path = KeyframeIndex.index_path(video_path)
+        if os.path.exists(path):
+            os.remove(path)
+    
+    # ---- 按时间查询（秒） ----
+    
+    def keyframe_before(self, t: float) -> float:
+        """不晚于t的最近关键帧时间，t早于第一个关键帧时返回第一个关键帧"""
+        i = np.searchsorted(self.keyframe_us, int(round(t * 1_000_000)), side='right') - 1
+        return self.keyframe_us[max(i, 0)] / 1_000_000
+    
+    def keyframe_after(self, t: float) -> Optional[float]:
+        """不早于t的最近关键帧时间，之后没有关键帧时返回None"""
+        i = np.searchsorted(self.keyframe_us, int(round(t * 1_000_000)), side='left')
+        if i >= len(self.keyframe_us):
+            return None
+        return self.keyframe_us[i] / 1_000_000
+    
+    def gop_containing(self, t: float) -> Tuple[float, float]:
+        """包含t的GOP的 [起始关键帧时间, 下一个关键帧时间)，最后一个GOP以最后一帧的结束时间为终点"""
+        i = max(np.searchsorted(self.keyframe_us, int(round(t * 1_000_000)), side='right') - 1, 0)
+        start = self.keyframe_us[i]
+        end = self.keyframe_us[i + 1] if i + 1 < len(self.keyframe_us) else self.end_us
+        return start / 1_000_000, end / 1_000_000
+    
+    def frame_span(self, start: float, end: float) -> Tuple[int, float, float]:
+        """
+        显示时间在 [start, end) 内的帧：(帧数, 第一帧时间, 下一帧时间)，
+        最后一帧之后没有帧时以最后一帧的结束时间为终点
+        """
+        lo, hi = np.searchsorted(self.packet_us, [int(round(start * 1_000_000)),
+                                                  int(round(end * 1_000_000))], side='left')
+        if hi <= lo:
+            return 0, start, start
+        after = self.packet_us[hi] if hi < len(self.packet_us) else self.end_us
+        return int(hi - lo), self.packet_us[lo] / 1_000_000, after / 1_000_000
+    
+    # ---- 按帧号查询 ----
+    
+    def keyframe_frame_before(self, frame: int) -> int:
+        """不晚于该帧的最近关键帧的帧号"""
+        i = np.searchsorted(self.keyframe_frames, frame, side='right') - 1
+        return int(self.keyframe_frames[max(i, 0)])
+    
+    @property
+    def frame_count(self) -> int:
+        return len(self.packet_us)
+    
+    @property
+    def average_gop_frames(self) -> float:
+        if len(self.keyframe_frames) < 2:
+            return float(self.frame_count)
+        return float(np.mean(np.diff(self.keyframe_frames)))
+    
+    def stats(self) -> Dict:
+        return {
+            'packets': self.frame_count,
+            'keyframes': len(self.keyframe_us),
+            'averageGopFrames': self.average_gop_frames
+        }
+
+
+def _parse_us(value: str) -> Optional[int]:
+    try:
+        return int(round(float(value) * 1_000_000))
+    except ValueError:
+        return None
+
+
+MAX_CACHED_INDEXES = 32
+
+_indexes: 'OrderedDict[Tuple, KeyframeIndex]' = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_keyframe_index(video_path: str, build: bool = True) -> Optional[KeyframeIndex]:
+    """进程内缓存的关键帧索引（按路径、大小和修改时间），build=False时只读取已保存的索引"""
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return None
+    key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+    
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    
+    index = KeyframeIndex.load_or_build(video_path) if build else KeyframeIndex.load(video_path)
+    if index is not None:
+        with _indexes_lock:
+            _indexes[key] = index
+            while len(_indexes) > MAX_CACHED_INDEXES:
+                _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,64 @@
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, Tuple
+
+import cv2
+import numpy as np
+
+from .frame_pipe import FFmpegFramePipe
+
+DEFAULT_ANALYSIS_FPS = 2.0
+DEFAULT_TIMELINE_WIDTH = 160
+
+
+def iter_motion(frames: Iterable[np.ndarray]) -> Iterator[float]:
+    """
+    逐帧计算运动强度（与上一帧的平均绝对差 / 255）
+    
+    只保留上一帧的一份拷贝，内存占用与视频长度无关；输入可以是复用缓冲区的帧视图
+    （例如FFmpegFramePipe），第一帧的运动强度为0。
+    """
+    prev = None
+    diff = None
+    for frame in frames:
+        if prev is None:
+            prev = frame.copy()
+            diff = np.empty_like(prev)
+            yield 0.0
+            continue
+        
+        cv2.absdiff(frame, prev, dst=diff)
+        yield min(float(cv2.mean(diff)[0]) / 255.0, 1.0)
+        np.copyto(prev, frame)
+
+
+def compute_motion_timeline(video_path: str, fps: float = DEFAULT_ANALYSIS_FPS,
+                            width: int = DEFAULT_TIMELINE_WIDTH,
+                            video_info: Dict = None) -> Tuple[np.ndarray, Dict]:
+    """
+    流式计算整段视频的运动强度时间线
+    
+    ffmpeg按analysis fps抽帧并缩放后经管道逐帧送入iter_motion，第i个值对应时间 i / fps。
+    
+    Returns:
+        (float32时间线, 统计信息)
+    """
+    pipe = FFmpegFramePipe(video_path, width=width, fps=fps, pix_fmt='gray', video_info=video_info)
+    timeline = array('f')
+    started = time.time()
+    
+    with pipe:
+        timeline.extend(iter_motion(pipe))
+    
+    elapsed = time.time() - started
+    stats = {
+        'frames': len(timeline),
+        'analysisFps': fps,
+        'resolution': f'{pipe.width}x{pipe.height}',
+        'elapsed': elapsed,
+        'throughputFps': len(timeline) / elapsed if elapsed > 0 else 0.0
+    }
+    print(f"运动时间线: {stats['frames']}帧 @ {fps}fps, {stats['resolution']}, "
+          f"耗时{elapsed:.2f}秒, 吞吐 {stats['throughputFps']:.1f} 帧/秒")
+    
+    return np.frombuffer(timeline, dtype=np.float32).copy(), stats
@@ -5,19 +5,102 @@ import numpy as np
 import cv2
 from typing import List, Tuple, Dict, Optional
 import os
+import shutil
+import tempfile
+from ..storage import ScratchDir, ScratchQuotaExceeded
+from .frame_sampler import get_frame_sampler
+from .score_patterns import SPORT_PATTERNS, TARGET_PATTERNS, apply_patterns, focus_rules
+from .motion_timeline import DEFAULT_ANALYSIS_FPS, compute_motion_timeline
+from .adaptive_search import CoarseToFineSearch
+from .sharded_analysis import analyze_sharded
+from .ffmpeg_renderer import FFmpegRenderer
+from .filter_graph import FilterGraphRenderer
+from .parallel_render import render_segments_parallel
 
 class MoviePyEditor:
-    """MoviePy视频编辑器，负责视频剪辑和合成"""
+    """
+    MoviePy视频编辑器，负责视频剪辑和合成
     
-    def __init__(self):
+    scratch: 任务独占的临时目录（ScratchSpace.job），渲染的中间文件都写在其中并检查配额；
+        未指定时使用系统临时目录。每次渲染在临时目录下创建独立的工作目录，结束时删除。
+    """
+    
+    def __init__(self, scratch: ScratchDir = None):
         self.supported_formats = ['.mp4', '.avi', '.mov', '.mkv', '.flv']
-        self.temp_dir = 'temp_clips'
-        os.makedirs(self.temp_dir, exist_ok=True)
+        self.scratch = scratch
+        self.temp_dir = scratch.path if scratch else tempfile.gettempdir()
+        self._quota_check = scratch.check_quota if scratch else None
     
     def create_highlight_video(self, video_path: str, clip_segments: List[Tuple[float, float]], 
                               output_path: str, target_duration: int = 60, 
-                              audio_suggestions: List[str] = None) -> bool:
-        """创建精彩瞬间视频"""
+                              audio_suggestions: List[str] = None, render_mode: str = 'moviepy',
+                              video_duration: float = None, keyframe_index=None,
+                              video_info: Dict = None, render_workers: int = None,
+                              start_method: str = 'spawn', content_hash: str = None,
+                              segment_cache=None) -> bool:
+        """
+        创建精彩瞬间视频
+        
+        render_mode: moviepy（逐帧解码并重新编码）、copy（按关键帧直接复制数据包）、
+            smart（只重新编码切点处不完整的GOP，边界帧精确）、parallel（各片段在进程池中并行
+            编码后直接拼接）、filtergraph（片段和所有效果翻译为一个ffmpeg滤镜图，单进程原生
+            渲染）或 auto（没有任何效果时依次尝试smart和copy，否则依次尝试filtergraph和
+            parallel）；copy和smart不支持效果
+        render_workers / start_method: parallel模式的进程数上限和进程启动方式
+        content_hash / segment_cache: 已编码片段的缓存（parallel和smart模式），有缓存时auto模式
+            的有效果渲染优先使用parallel以复用其他剪辑请求已编码的片段
+        """
+        if render_mode == 'auto':
+            if audio_suggestions:
+                ffmpeg_modes = (['parallel', 'filtergraph'] if segment_cache is not None and content_hash
+                                else ['filtergraph', 'parallel'])
+            else:
+                ffmpeg_modes = ['smart', 'copy']
+        elif render_mode in ('copy', 'smart', 'parallel', 'filtergraph'):
+            ffmpeg_modes = [render_mode]
+        else:
+            ffmpeg_modes = []
+        
+        renderer = (FFmpegRenderer(temp_dir=self.temp_dir, quota_check=self._quota_check)
+                    if ffmpeg_modes else None)
+        for mode in ffmpeg_modes:
+            if mode == 'filtergraph':
+                segments = renderer.select_segments(clip_segments, target_duration, video_duration)
+                rendered = FilterGraphRenderer(renderer.ffmpeg).render(
+                    video_path, segments, output_path, audio_suggestions, video_info
+                )
+            elif mode == 'parallel':
+                segments = renderer.select_segments(clip_segments, target_duration, video_duration)
+                if len(segments) < 2 and segment_cache is None:
+                    continue  # 只有一个片段且没有缓存时与直接编码相同
+                try:
+                    rendered = render_segments_parallel(
+                        video_path, segments, output_path, audio_suggestions,
+                        max_workers=render_workers, start_method=start_method,
+                        temp_dir=self.temp_dir, fps=(video_info or {}).get('fps') or None,
+                        segment_cache=segment_cache, content_hash=content_hash,
+                        quota_check=self._quota_check
+                    )
+                except ScratchQuotaExceeded:
+                    raise
+                except Exception as e:
+                    print(f"并行渲染失败: {e}")
+                    rendered = False
+            else:
+                rendered = renderer.render(video_path, clip_segments, output_path, target_duration,
+                                           video_duration, keyframe_index, mode=mode, 
+                                           video_info=video_info, segment_cache=segment_cache,
+                                           content_hash=content_hash)
+            
+            if rendered and self._verify_video_file(output_path):
+                return True
+            print(f"FFmpeg渲染({mode})失败")
+        
+        if ffmpeg_modes:
+            print("使用MoviePy串行渲染")
+        
+        os.makedirs(self.temp_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix='moviepy_render_', dir=self.temp_dir)
         try:
             video = VideoFileClip(video_path)
             clips = []
@@ -43,7 +126,7 @@ class MoviePyEditor:
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
-                temp_audiofile='temp-audio.m4a',
+                temp_audiofile=os.path.join(work_dir, 'audio.m4a'),
                 remove_temp=True,
                 verbose=False,
                 logger=None
@@ -64,7 +147,26 @@ class MoviePyEditor:
         except Exception as e:
             print(f"创建精彩瞬间视频失败: {e}")
             return False
-
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def create_preview_video(self, video_path: str, clip_segments: List[Tuple[float, float]],
+                             output_path: str, target_duration: int = 60,
+                             audio_suggestions: List[str] = None, video_duration: float = None,
+                             video_info: Dict = None, preview_height: int = 360) -> bool:
+        """
+        快速生成低分辨率预览（与最终版本相同的片段和效果，ultrafast编码预设）
+        
+        预览只走ffmpeg滤镜图；FFmpeg不可用或渲染失败时返回False，由调用方直接渲染最终版本
+        """
+        renderer = FFmpegRenderer(temp_dir=self.temp_dir)
+        segments = renderer.select_segments(clip_segments, target_duration, video_duration)
+        rendered = FilterGraphRenderer(renderer.ffmpeg).render(
+            video_path, segments, output_path, audio_suggestions, video_info,
+            preview_height=preview_height
+        )
+        return rendered and self._verify_video_file(output_path)
+    
     def _verify_video_file(self, file_path: str) -> bool:
         """验证生成的视频文件是否完整可播放"""
         try:
@@ -122,35 +224,59 @@ class MoviePyEditor:
     def detect_highlight_moments(self, video_path: str, sport_type: str = None, 
                                 clip_target: str = 'highlights', focus_moments: List[str] = None,
                                 clip_style: str = '标准剪辑', audio_suggestions: List[str] = None,
-                                duration_distribution: Dict[str, float] = None) -> List[Tuple[float, float]]:
-        """检测视频中的精彩瞬间"""
+                                duration_distribution: Dict[str, float] = None,
+                                video_duration: float = None, analysis_width: int = None,
+                                video_info: Dict = None, content_hash: str = None,
+                                analysis_cache=None, analysis_mode: str = 'sampled',
+                                analysis_fps: float = None, 
+                                shard_options: Dict = None) -> List[Tuple[float, float]]:
+        """
+        检测视频中的精彩瞬间
+        
+        video_duration: 已探测的视频时长（秒），提供时不再重新打开文件读取时长
+        analysis_width: 运动分析分辨率（宽度），为空时使用原始分辨率
+        video_info: 已探测的视频信息（可选）
+        content_hash / analysis_cache: 提供时运动强度序列按内容哈希缓存，重复请求无需解码
+        analysis_mode: sampled（全片均匀采样100帧）、timeline（按analysis_fps流式计算完整时间线）
+            或 adaptive（由粗到细搜索，只在候选峰值附近密集解码）
+        shard_options: timeline模式下长视频的分片并行参数（min_duration、min_shard_seconds、
+            max_workers、start_method）
+        """
         try:
             print(f"开始检测精彩瞬间 - 目标: {clip_target}, 重点: {focus_moments}")
             
-            frames = self._extract_key_frames(video_path, num_frames=100)
-            motion_scores = self._analyze_motion_intensity(frames)
-            
+            time_interval = None
+            motion_scores = None
+            if analysis_mode == 'timeline':
+                analysis_fps = analysis_fps or DEFAULT_ANALYSIS_FPS
+                motion_scores = self._load_motion_timeline(
+                    video_path, analysis_fps, analysis_width, video_info, content_hash, analysis_cache,
+                    shard_options
+                )
+                if motion_scores is not None:
+                    time_interval = 1.0 / analysis_fps
+            elif analysis_mode == 'adaptive':
+                motion_scores, time_interval = self._load_adaptive_timeline(
+                    video_path, analysis_width, content_hash, analysis_cache
+                )
+            
+            if motion_scores is None:
+                motion_scores = self._load_motion_scores(
+                    video_path, analysis_width, video_info, content_hash, analysis_cache
+                )
+            
+            # 依次应用运动类型、剪辑目标和重点瞬间的模式规则（见score_patterns）
             if sport_type:
-                motion_scores = self._apply_sport_specific_detection(motion_scores, sport_type)
+                motion_scores = apply_patterns(motion_scores, SPORT_PATTERNS.get(sport_type))
             
-            # 根据AI分析结果调整检测策略
-            if clip_target == 'scoring':
-                # 如果是得分目标，增强得分相关的瞬间
-                motion_scores = self._enhance_scoring_moments(motion_scores)
-            elif clip_target == 'defense':
-                # 如果是防守目标，增强防守相关的瞬间
-                motion_scores = self._enhance_defense_moments(motion_scores)
-            elif clip_target == 'teamwork':
-                # 如果是团队配合目标，增强团队相关的瞬间
-                motion_scores = self._enhance_teamwork_moments(motion_scores)
+            motion_scores = apply_patterns(motion_scores, TARGET_PATTERNS.get(clip_target))
             
-            # 根据focus_moments进一步调整检测策略
             if focus_moments:
-                motion_scores = self._enhance_focus_moments(motion_scores, focus_moments, sport_type)
+                motion_scores = apply_patterns(motion_scores, focus_rules(focus_moments))
             
             highlight_segments = self._find_highlight_segments(
                 motion_scores, video_path, clip_target, focus_moments, 
-                clip_style, duration_distribution
+                clip_style, duration_distribution, video_duration, time_interval
             )
             return highlight_segments
             
@@ -158,85 +284,103 @@ class MoviePyEditor:
             print(f"检测精彩瞬间失败: {e}")
             return []
     
-    def _enhance_scoring_moments(self, motion_scores: List[float]) -> List[float]:
-        """增强得分相关的瞬间"""
-        enhanced_scores = motion_scores.copy()
-        for i in range(1, len(motion_scores) - 1):
-            # 寻找突然的高运动强度（可能是得分瞬间）
-            if (motion_scores[i] > 0.7 and 
-                motion_scores[i-1] < 0.4 and 
-                motion_scores[i+1] < 0.4):
-                enhanced_scores[i] *= 1.8  # 大幅增强
-        return enhanced_scores
-    
-    def _enhance_defense_moments(self, motion_scores: List[float]) -> List[float]:
-        """增强防守相关的瞬间"""
-        enhanced_scores = motion_scores.copy()
-        for i in range(2, len(motion_scores) - 2):
-            # 寻找持续的高运动强度（可能是防守动作）
-            if all(motion_scores[j] > 0.6 for j in range(i-1, i+2)):
-                enhanced_scores[i] *= 1.5
-        return enhanced_scores
+    def _load_motion_scores(self, video_path: str, analysis_width: int = None, video_info: Dict = None,
+                            content_hash: str = None, analysis_cache=None, 
+                            num_frames: int = 100) -> np.ndarray:
+        """读取缓存的运动强度序列，未命中时采样计算并写入缓存"""
+        cache_params = {'kind': 'motion', 'num_frames': num_frames, 'width': analysis_width}
+        
+        if analysis_cache and content_hash:
+            cached = analysis_cache.load(content_hash, cache_params)
+            if cached:
+                arrays, _ = cached
+                print(f"命中运动分析缓存: {content_hash[:12]}")
+                return arrays['motion']
+        
+        frames = self._extract_key_frames(video_path, num_frames=num_frames, width=analysis_width,
+                                          video_info=video_info)
+        motion_scores = self._analyze_motion_intensity(frames)
+        
+        if analysis_cache and content_hash:
+            analysis_cache.save(content_hash, cache_params,
+                                arrays={'motion': motion_scores},
+                                meta={'video_info': video_info or {}})
+        
+        return motion_scores
     
-    def _enhance_teamwork_moments(self, motion_scores: List[float]) -> List[float]:
-        """增强团队配合相关的瞬间"""
-        enhanced_scores = motion_scores.copy()
-        for i in range(1, len(motion_scores) - 1):
-            # 寻找中等但稳定的运动强度（可能是团队配合）
-            if (0.4 < motion_scores[i] < 0.7 and 
-                abs(motion_scores[i] - motion_scores[i-1]) < 0.2):
-                enhanced_scores[i] *= 1.3
-        return enhanced_scores
+    def _load_motion_timeline(self, video_path: str, analysis_fps: float, analysis_width: int = None,
+                              video_info: Dict = None, content_hash: str = None,
+                              analysis_cache=None, shard_options: Dict = None) -> Optional[np.ndarray]:
+        """读取或流式计算完整运动时间线，失败时返回None（回退到均匀采样）"""
+        width = analysis_width or 160
+        cache_params = {'kind': 'timeline', 'fps': analysis_fps, 'width': width}
+        shard_options = shard_options or {}
+        
+        if analysis_cache and content_hash:
+            cached = analysis_cache.load(content_hash, cache_params)
+            if cached:
+                arrays, _ = cached
+                print(f"命中运动时间线缓存: {content_hash[:12]}")
+                return arrays['timeline']
+        
+        try:
+            duration = (video_info or {}).get('duration') or 0.0
+            min_duration = shard_options.get('min_duration') or 0
+            if min_duration and duration >= min_duration:
+                result = analyze_sharded(
+                    video_path, video_info, analysis_fps, width,
+                    max_workers=shard_options.get('max_workers'),
+                    min_shard_seconds=shard_options.get('min_shard_seconds') or 300,
+                    start_method=shard_options.get('start_method', 'spawn')
+                )
+                timeline, stats = result['timeline'], result['stats']
+            else:
+                timeline, stats = compute_motion_timeline(video_path, fps=analysis_fps, width=width,
+                                                          video_info=video_info)
+        except Exception as e:
+            print(f"计算运动时间线失败，回退到均匀采样: {e}")
+            return None
+        
+        if len(timeline) < 2:
+            return None
+        
+        if analysis_cache and content_hash:
+            analysis_cache.save(content_hash, cache_params, arrays={'timeline': timeline},
+                                meta={'stats': stats})
+        
+        return timeline
     
-    def _enhance_focus_moments(self, motion_scores: List[float], focus_moments: List[str], sport_type: str = None) -> List[float]:
-        """根据focus_moments增强相关瞬间"""
-        enhanced_scores = motion_scores.copy()
+    def _load_adaptive_timeline(self, video_path: str, analysis_width: int = None,
+                                content_hash: str = None, analysis_cache=None) -> Tuple[Optional[np.ndarray], Optional[float]]:
+        """读取或执行由粗到细搜索，返回 (时间线, 时间间隔)，失败时返回 (None, None)"""
+        search = CoarseToFineSearch(width=analysis_width or 160)
+        cache_params = {
+            'kind': 'adaptive', 'width': search.width, 'coarse_samples': search.coarse_samples,
+            'top_k': search.top_k, 'refine_factor': search.refine_factor, 'min_step': search.min_step
+        }
         
-        for focus in focus_moments:
-            focus_lower = focus.lower()
-            
-            # 根据不同的重点瞬间类型进行增强
-            if any(word in focus_lower for word in ['投篮', '扣篮', '射门', '进球', '得分']):
-                # 增强得分相关瞬间
-                for i in range(1, len(motion_scores) - 1):
-                    if (motion_scores[i] > 0.6 and 
-                        motion_scores[i-1] < 0.3 and 
-                        motion_scores[i+1] < 0.3):
-                        enhanced_scores[i] *= 1.6
-                        print(f"增强得分瞬间: 位置{i}, 分数{motion_scores[i]:.3f} -> {enhanced_scores[i]:.3f}")
-            
-            elif any(word in focus_lower for word in ['抢断', '盖帽', '防守', '解围']):
-                # 增强防守相关瞬间
-                for i in range(2, len(motion_scores) - 2):
-                    if all(motion_scores[j] > 0.5 for j in range(i-1, i+2)):
-                        enhanced_scores[i] *= 1.4
-                        print(f"增强防守瞬间: 位置{i}, 分数{motion_scores[i]:.3f} -> {enhanced_scores[i]:.3f}")
-            
-            elif any(word in focus_lower for word in ['助攻', '传球', '配合', '团队']):
-                # 增强团队配合瞬间
-                for i in range(1, len(motion_scores) - 1):
-                    if (0.3 < motion_scores[i] < 0.6 and 
-                        abs(motion_scores[i] - motion_scores[i-1]) < 0.15):
-                        enhanced_scores[i] *= 1.3
-                        print(f"增强团队配合瞬间: 位置{i}, 分数{motion_scores[i]:.3f} -> {enhanced_scores[i]:.3f}")
-            
-            elif any(word in focus_lower for word in ['技术', '动作', '技巧']):
-                # 增强技术动作瞬间
-                for i in range(1, len(motion_scores) - 1):
-                    if (motion_scores[i] > 0.5 and 
-                        motion_scores[i-1] < motion_scores[i] and 
-                        motion_scores[i+1] < motion_scores[i]):
-                        enhanced_scores[i] *= 1.2
-                        print(f"增强技术动作瞬间: 位置{i}, 分数{motion_scores[i]:.3f} -> {enhanced_scores[i]:.3f}")
-            
-            elif any(word in focus_lower for word in ['精彩', '亮点', '高亮']):
-                # 增强一般精彩瞬间
-                for i in range(1, len(motion_scores) - 1):
-                    if motion_scores[i] > 0.6:
-                        enhanced_scores[i] *= 1.1
-                        print(f"增强精彩瞬间: 位置{i}, 分数{motion_scores[i]:.3f} -> {enhanced_scores[i]:.3f}")
+        if analysis_cache and content_hash:
+            cached = analysis_cache.load(content_hash, cache_params)
+            if cached:
+                arrays, meta = cached
+                print(f"命中由粗到细搜索缓存: {content_hash[:12]}")
+                return arrays['timeline'], meta['time_interval']
+        
+        try:
+            result = search.run(video_path)
+        except Exception as e:
+            print(f"由粗到细搜索失败，回退到均匀采样: {e}")
+            return None, None
+        
+        if result is None:
+            return None, None
         
-        return enhanced_scores
+        timeline, time_interval = result
+        if analysis_cache and content_hash:
+            analysis_cache.save(content_hash, cache_params, arrays={'timeline': timeline},
+                                meta={'time_interval': time_interval, 'stats': search.last_stats})
+        
+        return timeline, time_interval
     
     def _calculate_focus_threshold_adjustment(self, focus_moments: List[str]) -> float:
         """计算根据focus_moments的阈值调整系数"""
@@ -364,96 +508,74 @@ class MoviePyEditor:
         
         return adjusted_clips
     
-    def _extract_key_frames(self, video_path: str, num_frames: int = 100) -> List[np.ndarray]:
-        """提取关键帧"""
-        frames = []
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
+    def _extract_key_frames(self, video_path: str, num_frames: int = 100, width: int = None,
+                            video_info: Dict = None) -> np.ndarray:
+        """提取关键帧（灰度，通过共享帧采样器复用运动识别阶段已解码的帧），返回 (N, H, W) 数组"""
+        if width:
+            frames, _ = get_frame_sampler().sample_array(video_path, num_frames, width=width,
+                                                         video_info=video_info)
             return frames
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        frame_indices = np.linspace(0, total_frames-1, num_frames, dtype=int)
+        sampled = get_frame_sampler().sample(video_path, num_frames)
+        if not sampled:
+            return np.empty((0, 0, 0), dtype=np.uint8)
         
-        for idx in frame_indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if ret:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                frames.append(gray)
-        
-        cap.release()
+        frames = np.empty((len(sampled),) + sampled[0].gray.shape, dtype=np.uint8)
+        for i, frame in enumerate(sampled):
+            frames[i] = frame.gray
         return frames
     
-    def _analyze_motion_intensity(self, frames: List[np.ndarray]) -> List[float]:
-        """分析帧间运动强度"""
-        if len(frames) < 2:
-            return [0.0]
+    def _analyze_motion_intensity(self, frames: np.ndarray, 
+                                  grid: Tuple[int, int] = None) -> np.ndarray:
+        """
+        分析帧间运动强度
         
-        motion_scores = [0.0]
+        frames: (N, H, W) 的uint8灰度帧数组，所有帧差在一次批量调用中完成
+        grid: (行数, 列数)，提供时返回 (N, 行数, 列数) 的分块运动图，否则返回 (N,) 的运动强度
+        """
+        count = len(frames)
+        shape = (max(count, 1),) + (tuple(grid) if grid else ())
+        motion = np.zeros(shape, dtype=np.float32)
+        if count < 2:
+            return motion
         
-        for i in range(1, len(frames)):
-            diff = cv2.absdiff(frames[i], frames[i-1])
-            motion_score = np.mean(diff)
-            motion_score = min(motion_score / 255.0, 1.0)
-            motion_scores.append(motion_score)
+        height, width = frames.shape[1:3]
+        flat = frames.reshape(count, -1)
+        diff = cv2.absdiff(flat[1:], flat[:-1]).reshape(count - 1, height, width)
         
-        return motion_scores
-    
-    def _apply_sport_specific_detection(self, motion_scores: List[float], sport_type: str) -> List[float]:
-        """根据运动类型应用特定的检测策略"""
-        if sport_type == 'basketball':
-            return self._detect_basketball_moments(motion_scores)
-        elif sport_type == 'football':
-            return self._detect_football_moments(motion_scores)
-        elif sport_type == 'tennis':
-            return self._detect_tennis_moments(motion_scores)
+        if grid:
+            rows, cols = grid
+            block_h, block_w = height // rows, width // cols
+            blocks = diff[:, :block_h * rows, :block_w * cols].reshape(
+                count - 1, rows, block_h, cols, block_w
+            )
+            motion[1:] = blocks.mean(axis=(2, 4), dtype=np.float64) / 255.0
         else:
-            return motion_scores
-    
-    def _detect_basketball_moments(self, motion_scores: List[float]) -> List[float]:
-        """检测篮球精彩瞬间"""
-        enhanced_scores = motion_scores.copy()
-        
-        for i in range(1, len(motion_scores) - 1):
-            if (motion_scores[i] > 0.6 and 
-                motion_scores[i-1] < 0.3 and 
-                motion_scores[i+1] < 0.3):
-                enhanced_scores[i] *= 1.5
-        
-        return enhanced_scores
-    
-    def _detect_football_moments(self, motion_scores: List[float]) -> List[float]:
-        """检测足球精彩瞬间"""
-        enhanced_scores = motion_scores.copy()
-        
-        for i in range(2, len(motion_scores) - 2):
-            if all(motion_scores[j] > 0.5 for j in range(i-2, i+3)):
-                enhanced_scores[i] *= 1.3
-        
-        return enhanced_scores
-    
-    def _detect_tennis_moments(self, motion_scores: List[float]) -> List[float]:
-        """检测网球精彩瞬间"""
-        enhanced_scores = motion_scores.copy()
+            motion[1:] = diff.mean(axis=(1, 2), dtype=np.float64) / 255.0
         
-        for i in range(1, len(motion_scores) - 1):
-            if (motion_scores[i] > 0.7 and 
-                motion_scores[i-1] < 0.4):
-                enhanced_scores[i] *= 1.4
-        
-        return enhanced_scores
+        return np.minimum(motion, 1.0, out=motion)
     
-    def _find_highlight_segments(self, motion_scores: List[float], video_path: str, clip_target: str = 'highlights', 
+    def _find_highlight_segments(self, motion_scores: np.ndarray, video_path: str, clip_target: str = 'highlights', 
                                 focus_moments: List[str] = None, clip_style: str = '标准剪辑', 
-                                duration_distribution: Dict[str, float] = None) -> List[Tuple[float, float]]:
-        """找出精彩瞬间时间段"""
+                                duration_distribution: Dict[str, float] = None,
+                                video_duration: float = None, 
+                                time_interval: float = None) -> List[Tuple[float, float]]:
+        """
+        找出精彩瞬间时间段
+        
+        time_interval: 相邻两个分数之间的时间间隔（秒），为空时按视频时长均分
+        """
         try:
-            video = VideoFileClip(video_path)
-            video_duration = video.duration
-            video.close()
+            if not video_duration:
+                if time_interval:
+                    video_duration = len(motion_scores) * time_interval
+                else:
+                    video = VideoFileClip(video_path)
+                    video_duration = video.duration
+                    video.close()
             
-            time_interval = video_duration / len(motion_scores)
+            if not time_interval:
+                time_interval = video_duration / len(motion_scores)
             
             # 根据剪辑目标调整阈值
             if clip_target == 'scoring':
@@ -476,24 +598,15 @@ class MoviePyEditor:
                 threshold = self._adjust_threshold_by_style(threshold, clip_style)
                 print(f"根据clip_style调整阈值: {threshold:.3f} (风格: {clip_style})")
             
-            highlight_times = []
-            for i, score in enumerate(motion_scores):
-                if score > threshold:
-                    time_point = i * time_interval
-                    highlight_times.append(time_point)
+            highlight_times = np.nonzero(motion_scores > threshold)[0] * time_interval
             
             segments = []
-            if highlight_times:
-                start_time = highlight_times[0]
-                prev_time = start_time
-                
-                for time_point in highlight_times[1:]:
-                    if time_point - prev_time > 2.0:
-                        segments.append((start_time, prev_time + 1.0))
-                        start_time = time_point
-                    prev_time = time_point
-                
-                segments.append((start_time, prev_time + 1.0))
+            if len(highlight_times):
+                # 相邻高分时间点间隔超过2秒时切分为新片段
+                breaks = np.nonzero(np.diff(highlight_times) > 2.0)[0]
+                starts = highlight_times[np.concatenate(([0], breaks + 1))]
+                ends = highlight_times[np.concatenate((breaks, [len(highlight_times) - 1]))] + 1.0
+                segments = list(zip(starts.tolist(), ends.tolist()))
             
             adjusted_segments = []
             for start, end in segments:
@@ -616,11 +729,20 @@ class MoviePyEditor:
             return video_clip
     
     def cleanup_temp_files(self):
-        """清理临时文件"""
+        """
+        清理临时文件
+        
+        每次渲染的工作目录在渲染结束时已删除；这里只清空本编辑器独占的任务临时目录，
+        不会删除共享目录中其他任务的文件
+        """
+        if not self.scratch:
+            return
         try:
-            import shutil
-            if os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
-            os.makedirs(self.temp_dir, exist_ok=True)
+            for name in os.listdir(self.scratch.path):
+                path = os.path.join(self.scratch.path, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
         except Exception as e:
             print(f"清理临时文件失败: {e}")
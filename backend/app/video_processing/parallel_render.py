@@ -0,0 +1,132 @@
+"""
+分段并行渲染
+
+需要重新编码（慢动作、淡入淡出、音量等效果）时，每个精彩片段作为独立任务在进程池中
+用完全相同的编码参数编码，最后用concat demuxer直接复制拼接。总耗时接近编码最长片段的时间，
+而不是所有片段之和。
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Tuple
+
+from moviepy.editor import VideoFileClip
+
+from .ffmpeg_wrapper import FFmpegWrapper
+from .filter_graph import effects_from_suggestions
+from .segment_cache import SegmentCache
+
+# 所有分段使用相同的编码参数，保证可以不重新编码直接拼接
+SEGMENT_ENCODER_SETTINGS = {
+    'codec': 'libx264',
+    'audio_codec': 'aac',
+    'audio_fps': 44100,
+    'preset': 'medium',
+    'ffmpeg_params': ['-pix_fmt', 'yuv420p']
+}
+
+
+def encode_segment(video_path: str, start: float, end: float, output_path: str, fps: float,
+                   audio_suggestions: List[str] = None) -> bool:
+    """编码一个片段（在工作进程中执行）"""
+    from .moviepy_editor import MoviePyEditor
+    
+    video = VideoFileClip(video_path)
+    try:
+        clip = video.subclip(start, end)
+        if audio_suggestions:
+            clip = MoviePyEditor()._apply_audio_suggestions([clip], audio_suggestions)[0]
+        
+        clip.write_videofile(
+            output_path,
+            fps=fps,
+            temp_audiofile=f'{output_path}.m4a',
+            remove_temp=True,
+            verbose=False,
+            logger=None,
+            **SEGMENT_ENCODER_SETTINGS
+        )
+        clip.close()
+        return True
+    finally:
+        video.close()
+
+
+def render_segments_parallel(video_path: str, segments: List[Tuple[float, float]], output_path: str,
+                             audio_suggestions: List[str] = None, max_workers: int = None,
+                             start_method: str = 'spawn', temp_dir: str = None,
+                             fps: float = None, segment_cache: SegmentCache = None,
+                             content_hash: str = None, quota_check: Callable[[], None] = None) -> bool:
+    """
+    并行编码各片段后直接复制拼接
+    
+    Args:
+        segments: 已按目标时长调整好的 (起点, 终点) 列表
+        max_workers: 进程数上限，默认按CPU核数
+        fps: 输出帧率，默认使用源视频帧率
+        segment_cache / content_hash: 片段缓存，命中的片段不再编码，新编码的片段写入缓存
+        temp_dir / quota_check: 中间文件所在目录（其下创建独立的工作目录）和编码完成后的配额检查
+    """
+    if not segments:
+        return False
+    
+    ffmpeg = FFmpegWrapper()
+    if not ffmpeg.ffmpeg_path:
+        print("FFmpeg不可用，无法拼接并行编码的片段")
+        return False
+    
+    if not fps:
+        with VideoFileClip(video_path) as video:
+            fps = video.fps
+    
+    temp_dir = temp_dir or tempfile.gettempdir()
+    os.makedirs(temp_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix='parallel_render_', dir=temp_dir)
+    started = time.time()
+    try:
+        parts = [os.path.abspath(os.path.join(work_dir, f'part_{i:04d}.mp4'))
+                 for i in range(len(segments))]
+        
+        # 缓存键中的效果和编码参数
+        effects = effects_from_suggestions(audio_suggestions)
+        encoder = dict(SEGMENT_ENCODER_SETTINGS, fps=fps)
+        
+        pending = []
+        for (start, end), part in zip(segments, parts):
+            if segment_cache is None or not segment_cache.fetch(content_hash, start, end, effects,
+                                                                encoder, part):
+                pending.append((start, end, part))
+        
+        workers = min(len(pending), max_workers or os.cpu_count() or 1)
+        if pending:
+            context = multiprocessing.get_context(start_method)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(encode_segment, video_path, start, end, part, fps, audio_suggestions)
+                           for start, end, part in pending]
+                results = [future.result() for future in futures]
+            
+            if not all(results):
+                return False
+            if quota_check:
+                quota_check()
+            
+            if segment_cache is not None:
+                for start, end, part in pending:
+                    segment_cache.store(content_hash, start, end, effects, encoder, part)
+        
+        encoded = time.time() - started
+        if len(parts) == 1:
+            shutil.move(parts[0], output_path)
+            success = True
+        else:
+            success = ffmpeg.merge_videos(parts, output_path, temp_dir=work_dir)
+        
+        print(f"并行渲染: {len(segments)}个片段(缓存命中{len(segments) - len(pending)}个), "
+              f"{workers}个进程, 编码耗时{encoded:.2f}秒, 总耗时{time.time() - started:.2f}秒")
+        return success
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
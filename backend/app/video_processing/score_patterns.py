@@ -0,0 +1,168 @@
+"""
+声明式的运动强度模式规则
+
+每条规则是一个字典，描述在运动强度序列中要寻找的局部形态以及命中位置的增强系数，例如：
+
+    {'kind': 'peak', 'above': 0.7, 'neighbours_below': 0.4, 'boost': 1.8}
+    {'kind': 'run', 'above': 0.6, 'length': 3, 'margin': 2, 'boost': 1.5}
+
+规则引擎用错位数组比较和滑动窗口视图一次性计算所有位置的命中掩码，
+新增运动类型或剪辑重点只需添加规则，不需要再写逐帧循环。
+
+支持的规则类型：
+    peak       当前值 > above，且前后相邻值均 < neighbours_below
+    rise       当前值 > above，且前一个值 < prev_below
+    run        以当前位置为中心、长度为length的窗口内所有值 > above
+    steady     low < 当前值 < high，且与前一个值之差的绝对值 < max_delta
+    local_max  当前值 > above，且严格大于前后相邻值
+    above      当前值 > above
+
+margin 表示序列两端不参与匹配的位置数，默认为1。
+"""
+import numpy as np
+from typing import Dict, List, Sequence
+
+# 运动类型特定的模式
+SPORT_PATTERNS: Dict[str, List[Dict]] = {
+    'basketball': [
+        {'kind': 'peak', 'above': 0.6, 'neighbours_below': 0.3, 'boost': 1.5}
+    ],
+    'football': [
+        {'kind': 'run', 'above': 0.5, 'length': 5, 'margin': 2, 'boost': 1.3}
+    ],
+    'tennis': [
+        {'kind': 'rise', 'above': 0.7, 'prev_below': 0.4, 'boost': 1.4}
+    ]
+}
+
+# 剪辑目标对应的模式
+TARGET_PATTERNS: Dict[str, List[Dict]] = {
+    # 突然的高运动强度（可能是得分瞬间）
+    'scoring': [
+        {'kind': 'peak', 'above': 0.7, 'neighbours_below': 0.4, 'boost': 1.8}
+    ],
+    # 持续的高运动强度（可能是防守动作）
+    'defense': [
+        {'kind': 'run', 'above': 0.6, 'length': 3, 'margin': 2, 'boost': 1.5}
+    ],
+    # 中等但稳定的运动强度（可能是团队配合）
+    'teamwork': [
+        {'kind': 'steady', 'low': 0.4, 'high': 0.7, 'max_delta': 0.2, 'boost': 1.3}
+    ]
+}
+
+# 重点瞬间关键词对应的模式，按顺序匹配第一个命中的分组
+FOCUS_PATTERNS: List[Dict] = [
+    {
+        'name': '得分',
+        'keywords': ['投篮', '扣篮', '射门', '进球', '得分'],
+        'rules': [{'kind': 'peak', 'above': 0.6, 'neighbours_below': 0.3, 'boost': 1.6}]
+    },
+    {
+        'name': '防守',
+        'keywords': ['抢断', '盖帽', '防守', '解围'],
+        'rules': [{'kind': 'run', 'above': 0.5, 'length': 3, 'margin': 2, 'boost': 1.4}]
+    },
+    {
+        'name': '团队配合',
+        'keywords': ['助攻', '传球', '配合', '团队'],
+        'rules': [{'kind': 'steady', 'low': 0.3, 'high': 0.6, 'max_delta': 0.15, 'boost': 1.3}]
+    },
+    {
+        'name': '技术动作',
+        'keywords': ['技术', '动作', '技巧'],
+        'rules': [{'kind': 'local_max', 'above': 0.5, 'boost': 1.2}]
+    },
+    {
+        'name': '精彩',
+        'keywords': ['精彩', '亮点', '高亮'],
+        'rules': [{'kind': 'above', 'above': 0.6, 'boost': 1.1}]
+    }
+]
+
+
+def _shift(scores: np.ndarray, offset: int) -> np.ndarray:
+    """错位数组：result[i] = scores[i + offset]，越界位置为NaN（任何比较均为False）"""
+    shifted = np.full(len(scores), np.nan)
+    if offset > 0:
+        shifted[:-offset] = scores[offset:]
+    elif offset < 0:
+        shifted[-offset:] = scores[:offset]
+    else:
+        shifted[:] = scores
+    return shifted
+
+
+def _run_mask(scores: np.ndarray, above: float, length: int) -> np.ndarray:
+    """以每个位置为中心的长度为length的窗口是否全部高于above"""
+    mask = np.zeros(len(scores), dtype=bool)
+    if len(scores) < length:
+        return mask
+    windows = np.lib.stride_tricks.sliding_window_view(scores > above, length)
+    half = length // 2
+    mask[half:half + len(windows)] = windows.all(axis=1)
+    return mask
+
+
+def match_pattern(scores: np.ndarray, rule: Dict) -> np.ndarray:
+    """计算单条规则在序列每个位置上的命中掩码"""
+    scores = np.asarray(scores, dtype=np.float64)
+    kind = rule['kind']
+    prev, nxt = _shift(scores, -1), _shift(scores, 1)
+    
+    with np.errstate(invalid='ignore'):
+        if kind == 'peak':
+            limit = rule['neighbours_below']
+            mask = (scores > rule['above']) & (prev < limit) & (nxt < limit)
+        elif kind == 'rise':
+            mask = (scores > rule['above']) & (prev < rule['prev_below'])
+        elif kind == 'run':
+            mask = _run_mask(scores, rule['above'], rule['length'])
+        elif kind == 'steady':
+            mask = ((scores > rule['low']) & (scores < rule['high']) &
+                    (np.abs(scores - prev) < rule['max_delta']))
+        elif kind == 'local_max':
+            mask = (scores > rule['above']) & (prev < scores) & (nxt < scores)
+        elif kind == 'above':
+            mask = scores > rule['above']
+        else:
+            raise ValueError(f"未知的模式类型: {kind}")
+    
+    margin = rule.get('margin', 1)
+    if margin:
+        mask[:margin] = False
+        mask[max(len(mask) - margin, 0):] = False
+    return mask
+
+
+def apply_patterns(scores: np.ndarray, rules: Sequence[Dict], label: str = None) -> np.ndarray:
+    """
+    对运动强度序列应用一组规则
+    
+    所有规则都在输入序列上求值，命中位置的增强系数相乘后一次性作用到输出，
+    因此规则的先后顺序不影响结果。
+    """
+    if not rules or len(scores) == 0:
+        return scores
+    
+    factor = np.ones(len(scores))
+    for rule in rules:
+        mask = match_pattern(scores, rule)
+        factor[mask] *= rule['boost']
+        name = rule.get('name', label)
+        if name:
+            print(f"增强{name}瞬间: {int(mask.sum())}个位置 (x{rule['boost']})")
+    
+    return (scores * factor).astype(np.asarray(scores).dtype, copy=False)
+
+
+def focus_rules(focus_moments: Sequence[str]) -> List[Dict]:
+    """根据重点瞬间描述选出对应规则（每个描述匹配第一个命中的分组）"""
+    rules = []
+    for focus in focus_moments or []:
+        focus_lower = focus.lower()
+        for group in FOCUS_PATTERNS:
+            if any(word in focus_lower for word in group['keywords']):
+                rules.extend(dict(rule, name=group['name']) for rule in group['rules'])
+                break
+    return rules
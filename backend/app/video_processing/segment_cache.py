@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Dict
+
+from .cache_stats import STATS_DIR, CacheStats
+
+
+class SegmentCache:
+    """
+    已编码片段文件的缓存，在同一视频的多个剪辑请求之间共享
+    
+    以 (文件内容哈希, 起点, 终点, 效果, 编码参数) 为键保存编码后的片段文件。不同的剪辑需求
+    往往选中重叠的精彩片段，渲染时命中的片段直接复用，只编码新的片段再拼接。
+    缓存目录按总字节数做LRU淘汰（以文件修改时间作为最近访问时间）。
+    
+    取出和写入都使用硬链接（跨文件系统时复制）：取出的文件即使随后被淘汰也不受影响。
+    命中、未命中和写入次数保存在缓存目录中，汇总所有进程（进程池和独立的任务worker）。
+    """
+    
+    def __init__(self, root: str = 'storage/segment_cache', max_bytes: int = 5 * 1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.counters = CacheStats(root, ('hits', 'misses', 'stored'))
+    
+    def key(self, content_hash: str, start: float, end: float, effects: Dict, encoder: Dict) -> str:
+        payload = json.dumps({
+            'content_hash': content_hash,
+            'start': f'{start:.6f}',
+            'end': f'{end:.6f}',
+            'effects': effects,
+            'encoder': encoder
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:40]
+    
+    def path(self, key: str, ext: str = '.mp4') -> str:
+        return os.path.join(self.root, f'{key}{ext}')
+    
+    def fetch(self, content_hash: str, start: float, end: float, effects: Dict, encoder: Dict,
+              output_path: str) -> bool:
+        """命中时把缓存的片段放到output_path并返回True"""
+        if not content_hash:
+            return False
+        
+        ext = os.path.splitext(output_path)[1] or '.mp4'
+        path = self.path(self.key(content_hash, start, end, effects, encoder), ext)
+        try:
+            _link_or_copy(path, output_path)
+            os.utime(path)  # 更新最近访问时间
+            self.counters.increment('hits')
+            return True
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取片段缓存失败，忽略: {e}")
+        
+        self.counters.increment('misses')
+        return False
+    
+    def store(self, content_hash: str, start: float, end: float, effects: Dict, encoder: Dict,
+              segment_path: str):
+        """把新编码的片段加入缓存（先写临时文件再原子替换）"""
+        if not content_hash:
+            return
+        
+        ext = os.path.splitext(segment_path)[1] or '.mp4'
+        path = self.path(self.key(content_hash, start, end, effects, encoder), ext)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            _link_or_copy(segment_path, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入片段缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        
+        self.counters.increment('stored')
+        self._evict()
+    
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith('.tmp') or name == STATS_DIR:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+    
+    def _evict(self):
+        """按最近访问时间淘汰，直到缓存总大小不超过上限"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+                total -= size
+            except OSError:
+                continue
+    
+    def stats(self) -> Dict:
+        entries = self._entries()
+        counts = self.counters.totals()
+        lookups = counts['hits'] + counts['misses']
+        return {
+            'hits': counts['hits'],
+            'misses': counts['misses'],
+            'hitRate': counts['hits'] / lookups if lookups else 0.0,
+            'stored': counts['stored'],
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'maxBytes': self.max_bytes,
+            'root': self.root
+        }
+
+
+def _link_or_copy(src: str, dst: str):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+_caches: Dict[str, SegmentCache] = {}
+_caches_lock = threading.Lock()
+
+def get_segment_cache(root: str = 'storage/segment_cache',
+                      max_bytes: int = 5 * 1024 * 1024 * 1024) -> SegmentCache:
+    """进程内按目录共享的片段缓存实例"""
+    with _caches_lock:
+        if root not in _caches:
+            _caches[root] = SegmentCache(root, max_bytes)
+        return _caches[root]
@@ -0,0 +1,160 @@
+"""
+长视频的分片并行分析
+
+按时间把视频切成若干分片，每个分片由独立进程中的ffmpeg解码器从分片起点（输入端定位到
+之前的关键帧后精确解码）开始读取低分辨率灰度帧计算运动强度时间线，并在分片内定位采样
+少量彩色帧累加运动识别特征分数，最后按顺序合并为一条完整的时间线。
+
+分片边界对齐到分析帧率的帧网格上，除第一个分片外每个分片多读取边界前的一帧，
+使分片第一帧的帧差与单进程顺序计算的结果一致。
+"""
+import math
+import multiprocessing
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .frame_pipe import FFmpegFramePipe
+from .motion_timeline import iter_motion
+
+DEFAULT_MIN_SHARD_SECONDS = 300.0
+
+
+def plan_shards(duration: float, fps: float, max_workers: int = None,
+                min_shard_seconds: float = DEFAULT_MIN_SHARD_SECONDS) -> List[Tuple[int, int]]:
+    """
+    计算分片，返回 [(起始帧号, 帧数)]，帧号以分析帧率计
+    
+    分片数量取 CPU核数、max_workers 和 时长/min_shard_seconds 三者的最小值。
+    """
+    total = int(math.ceil(duration * fps))
+    if total <= 0:
+        return []
+    
+    workers = os.cpu_count() or 1
+    if max_workers:
+        workers = min(workers, max_workers)
+    count = max(1, min(workers, int(duration // max(min_shard_seconds, 1.0))))
+    
+    per_shard = int(math.ceil(total / count))
+    return [(start, min(per_shard, total - start)) for start in range(0, total, per_shard)]
+
+
+def analyze_shard(video_path: str, start_frame: int, frame_count: int, fps: float, width: int,
+                  video_info: Dict, classify_samples: int = 0) -> Dict:
+    """
+    分析一个分片（在工作进程中执行，参数和返回值均可pickle）
+    
+    时间线只解码灰度帧；运动识别需要彩色帧，在分片内等间距的classify_samples个时间点
+    分别定位后各解码一帧，不为整个分片输出彩色帧。
+    
+    Returns:
+        {'timeline': float32数组, 'sport_sums': 特征分数累加值, 'classified': 参与识别的帧数, 'frames': 读取帧数}
+    """
+    overlap = 1 if start_frame > 0 else 0
+    pipe = FFmpegFramePipe(video_path, width=width, fps=fps, pix_fmt='gray',
+                           start=(start_frame - overlap) / fps,
+                           duration=(frame_count + overlap) / fps, video_info=video_info)
+    
+    timeline = array('f')
+    with pipe:
+        timeline.extend(iter_motion(pipe))
+    
+    sport_sums: Dict[str, float] = {}
+    classified = 0
+    if classify_samples and frame_count:
+        positions = np.linspace(0, frame_count - 1, min(classify_samples, frame_count))
+        times = [(start_frame + int(p)) / fps for p in positions]
+        sport_sums, classified = classify_at(video_path, times, width, video_info)
+    
+    values = np.frombuffer(timeline, dtype=np.float32)[overlap:overlap + frame_count].copy()
+    return {
+        'timeline': values,
+        'sport_sums': sport_sums,
+        'classified': classified,
+        'frames': len(timeline)
+    }
+
+
+def classify_at(video_path: str, times: List[float], width: int,
+                video_info: Dict) -> Tuple[Dict[str, float], int]:
+    """在给定时间点各定位解码一帧彩色帧并累加运动识别特征分数，返回 (分数累加值, 帧数)"""
+    from ..ai_services.sports_classifier import SportsClassifier
+    
+    classifier = SportsClassifier()
+    source_width = FFmpegFramePipe.output_size(video_info, 0)[0]
+    sport_sums: Dict[str, float] = {}
+    classified = 0
+    for timestamp in times:
+        pipe = FFmpegFramePipe(video_path, width=width, pix_fmt='bgr24', start=timestamp,
+                               video_info=video_info)
+        with pipe:
+            frame = pipe.read()
+            if frame is None:
+                continue
+            scale = pipe.width / source_width
+            for sport, score in classifier.accumulate_frame_scores([frame], scale).items():
+                sport_sums[sport] = sport_sums.get(sport, 0.0) + score
+        classified += 1
+    return sport_sums, classified
+
+
+def analyze_sharded(video_path: str, video_info: Dict, fps: float, width: int,
+                    max_workers: int = None, min_shard_seconds: float = DEFAULT_MIN_SHARD_SECONDS,
+                    classify_samples: int = 0, start_method: str = 'spawn') -> Dict:
+    """
+    分片并行计算完整运动时间线（可选同时累加运动识别特征分数）
+    
+    Args:
+        classify_samples: 运动识别的总采样帧数，按分片平均分配；0表示只计算运动时间线
+    
+    Returns:
+        {'timeline': float32时间线, 'sport_sums': 合并后的特征分数累加值,
+         'classified': 参与识别的帧数, 'stats': 统计信息}
+    """
+    duration = video_info.get('duration') or 0.0
+    shards = plan_shards(duration, fps, max_workers, min_shard_seconds)
+    if not shards:
+        raise ValueError("无法获取视频时长，不能分片分析")
+    
+    per_shard_samples = int(math.ceil(classify_samples / len(shards))) if classify_samples else 0
+    jobs = [(video_path, start, count, fps, width, video_info, per_shard_samples)
+            for start, count in shards]
+    
+    started = time.time()
+    if len(shards) == 1:
+        results = [analyze_shard(*jobs[0])]
+    else:
+        context = multiprocessing.get_context(start_method)
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as pool:
+            results = list(pool.map(analyze_shard, *zip(*jobs)))
+    elapsed = time.time() - started
+    
+    # 按分片顺序合并
+    timeline = np.concatenate([result['timeline'] for result in results]).astype(np.float32)
+    sport_sums: Dict[str, float] = {}
+    for result in results:
+        for sport, score in result['sport_sums'].items():
+            sport_sums[sport] = sport_sums.get(sport, 0.0) + score
+    
+    frames = sum(result['frames'] for result in results)
+    stats = {
+        'shards': len(shards),
+        'frames': len(timeline),
+        'analysisFps': fps,
+        'elapsed': elapsed,
+        'throughputFps': frames / elapsed if elapsed > 0 else 0.0
+    }
+    print(f"分片分析: {len(shards)}个分片, {len(timeline)}帧 @ {fps}fps, "
+          f"耗时{elapsed:.2f}秒, 吞吐 {stats['throughputFps']:.1f} 帧/秒")
+    
+    return {
+        'timeline': timeline,
+        'sport_sums': sport_sums,
+        'classified': sum(result['classified'] for result in results),
+        'stats': stats
+    }
@@ -0,0 +1,285 @@
+"""
+上传过程中的流式分析
+
+分块上传时，后台线程跟随已连续写入的分块读取文件，送入一个从stdin读取的ffmpeg进程；
+ffmpeg按分析帧率抽帧、缩放为低分辨率灰度图后以yuv4mpegpipe格式输出，由读取线程逐帧计算
+运动强度时间线。最后一个分块到达后只需处理剩余的少量数据，时间线即可写入分析缓存。
+
+管道输入不能定位，moov位于文件末尾的MP4等格式无法从管道解码，此时ffmpeg会提前退出，
+分析结果为None，由上传完成后的常规分析任务计算。分析跟不上上传速度或完成上传时不能在
+短时间内得到结果时同样放弃，不拖慢上传请求。
+"""
+import queue
+import subprocess
+import threading
+import time
+from array import array
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .motion_timeline import iter_motion
+
+FEED_QUEUE_BLOCKS = 32  # 等待送入ffmpeg的数据块数上限
+FEED_TIMEOUT = 5.0  # 队列已满时最多等待的秒数，超时说明分析跟不上上传速度，放弃流式分析
+FINISH_TIMEOUT = 5.0  # 完成上传时等待分析结果的秒数，超时后由常规分析任务计算
+FOLLOW_BLOCK_SIZE = 1024 * 1024
+FOLLOW_POLL_INTERVAL = 0.2
+
+
+class StreamingMotionAnalyzer:
+    """把上传流送入ffmpeg并同步计算运动时间线（时间线与compute_motion_timeline一致）"""
+    
+    def __init__(self, fps: float, width: int, ffmpeg_path: str = None):
+        if ffmpeg_path is None:
+            from .ffmpeg_wrapper import FFmpegWrapper
+            ffmpeg_path = FFmpegWrapper().ffmpeg_path
+        if not ffmpeg_path:
+            raise RuntimeError("FFmpeg不可用，无法进行流式分析")
+        
+        self.fps = fps
+        self.width = width
+        self.ffmpeg_path = ffmpeg_path
+        self.failed: Optional[str] = None
+        self.resolution = ''
+        self._timeline = array('f')
+        self._queue: 'queue.Queue[Optional[bytes]]' = queue.Queue(maxsize=FEED_QUEUE_BLOCKS)
+        self._process = None
+        self._writer = None
+        self._reader = None
+        self._started = 0.0
+    
+    def build_command(self) -> list:
+        # 与FFmpegFramePipe.output_size一致：宽度不超过源视频宽度且取偶数，高度按宽高比取偶数
+        scale = f"scale=w='trunc(min({self.width}\\,iw)/2)*2':h=-2:flags=area"
+        return [
+            self.ffmpeg_path, '-v', 'error', '-nostdin',
+            '-i', 'pipe:0',
+            '-map', '0:v:0',
+            '-an', '-sn',
+            '-vf', f'fps={self.fps},{scale}',
+            '-pix_fmt', 'gray',
+            '-f', 'yuv4mpegpipe',
+            'pipe:1'
+        ]
+    
+    def start(self) -> 'StreamingMotionAnalyzer':
+        self._started = time.time()
+        self._process = subprocess.Popen(self.build_command(), stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._writer = threading.Thread(target=self._write_loop, name='stream-analysis-writer',
+                                        daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name='stream-analysis-reader',
+                                        daemon=True)
+        self._writer.start()
+        self._reader.start()
+        return self
+    
+    def feed(self, data: bytes, timeout: float = 0) -> bool:
+        """
+        送入一段数据（按文件顺序），返回是否仍在分析
+        
+        队列已满时最多等待timeout秒（0为不等待），仍然放不下说明ffmpeg处理速度跟不上，
+        放弃流式分析
+        """
+        if self.failed or not data:
+            return not self.failed
+        try:
+            if timeout > 0:
+                self._queue.put(bytes(data), timeout=timeout)
+            else:
+                self._queue.put_nowait(bytes(data))
+        except queue.Full:
+            self.abandon("分析速度跟不上上传速度")
+        return not self.failed
+    
+    def close_input(self, timeout: float = FEED_TIMEOUT):
+        """所有数据已送入；timeout秒内ffmpeg仍未取走排队的数据时放弃"""
+        try:
+            self._queue.put(None, timeout=max(timeout, 0.001))
+        except queue.Full:
+            self.abandon("等待流式分析结果超时")
+    
+    def finish(self, timeout: float = FINISH_TIMEOUT) -> Optional[Tuple[np.ndarray, Dict]]:
+        """等待ffmpeg处理完剩余数据（最多timeout秒），返回 (float32时间线, 统计信息)，失败时返回None"""
+        deadline = time.monotonic() + timeout
+        self.close_input(deadline - time.monotonic())
+        self._reader.join(max(deadline - time.monotonic(), 0))
+        if self._reader.is_alive():
+            self.abandon("等待流式分析结果超时")
+        self._writer.join(1.0)
+        try:
+            returncode = self._process.wait(max(deadline - time.monotonic(), 1.0))
+        except subprocess.TimeoutExpired:
+            self.abandon("等待流式分析结果超时")
+            returncode = self._process.wait()
+        
+        if self.failed or returncode != 0 or not len(self._timeline):
+            if not self.failed:
+                self.failed = f"ffmpeg退出码 {returncode}"
+            print(f"流式分析未完成（{self.failed}），上传后使用常规分析")
+            return None
+        
+        elapsed = time.time() - self._started
+        stats = {
+            'frames': len(self._timeline),
+            'analysisFps': self.fps,
+            'resolution': self.resolution,
+            'elapsed': elapsed,
+            'throughputFps': len(self._timeline) / elapsed if elapsed > 0 else 0.0,
+            'source': 'upload_stream'
+        }
+        print(f"流式分析: {stats['frames']}帧 @ {self.fps}fps, {self.resolution}, 与上传同时完成")
+        return np.frombuffer(self._timeline, dtype=np.float32).copy(), stats
+    
+    def abandon(self, reason: str):
+        """放弃流式分析并结束ffmpeg"""
+        if self.failed:
+            return
+        self.failed = reason
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+        # 唤醒等待中的写入线程
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+    
+    def _write_loop(self):
+        stdin = self._process.stdin
+        try:
+            while not self.failed:
+                data = self._queue.get()
+                if data is None:
+                    break
+                stdin.write(data)
+        except (BrokenPipeError, OSError):
+            # ffmpeg提前退出（例如无法从管道解码的格式），不再接收数据
+            self.abandon("ffmpeg提前退出")
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+            # 丢弃剩余数据，不阻塞feed
+            while not self._queue.empty():
+                self._queue.get_nowait()
+    
+    def _read_loop(self):
+        try:
+            self._timeline.extend(iter_motion(self._iter_frames()))
+        except Exception as e:
+            self.abandon(f"解析分析输出失败: {e}")
+    
+    def _iter_frames(self):
+        """解析yuv4mpegpipe输出：一行文件头，之后每帧为一行FRAME加一帧灰度数据"""
+        stdout = self._process.stdout
+        header = stdout.readline().decode('ascii', 'replace').split()
+        if not header or header[0] != 'YUV4MPEG2':
+            return
+        params = {token[0]: token[1:] for token in header[1:]}
+        width, height = int(params['W']), int(params['H'])
+        self.resolution = f'{width}x{height}'
+        
+        buffer = bytearray(width * height)
+        frame = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width)
+        view = memoryview(buffer)
+        while True:
+            line = stdout.readline()
+            if not line.startswith(b'FRAME'):
+                return
+            filled = 0
+            while filled < len(buffer):
+                count = stdout.readinto(view[filled:])
+                if not count:
+                    return
+                filled += count
+            yield frame
+
+
+def follow_growing_file(analyzer: StreamingMotionAnalyzer, upload, stop: threading.Event,
+                        complete: threading.Event):
+    """
+    分块上传时按文件顺序读取已连续写入的部分送入分析器（在后台线程中执行）
+    
+    upload: ChunkedUpload；分块可能乱序到达，只送入从头开始连续已收到的分块。
+    complete 表示全部分块已确认写入（完成上传时位图已删除，不再查询位图）。
+    ffmpeg在FEED_TIMEOUT内仍取不走数据时放弃，不无限落后于上传
+    """
+    next_chunk = 0
+    try:
+        with open(upload.path, 'rb') as f:
+            while not stop.is_set() and not analyzer.failed and next_chunk < upload.chunk_count:
+                if not complete.is_set():
+                    received = upload.received()
+                    if next_chunk >= len(received) or not received[next_chunk]:
+                        complete.wait(FOLLOW_POLL_INTERVAL)
+                        continue
+                
+                f.seek(next_chunk * upload.chunk_size)
+                remaining = upload.chunk_length(next_chunk)
+                while remaining > 0 and not analyzer.failed:
+                    block = f.read(min(FOLLOW_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    analyzer.feed(block, timeout=FEED_TIMEOUT)
+                    remaining -= len(block)
+                next_chunk += 1
+    except OSError as e:
+        analyzer.abandon(f"读取上传文件失败: {e}")
+    
+    if next_chunk >= upload.chunk_count:
+        analyzer.close_input()
+    elif not analyzer.failed:
+        analyzer.abandon("上传未完成")
+
+
+class UploadAnalysis:
+    """一个分块上传会话的流式分析（分析器和跟随读取线程）"""
+    
+    def __init__(self, analyzer: StreamingMotionAnalyzer, upload):
+        self.analyzer = analyzer
+        self._stop = threading.Event()
+        self._complete = threading.Event()
+        self._thread = threading.Thread(target=follow_growing_file,
+                                        args=(analyzer, upload, self._stop, self._complete),
+                                        name='stream-analysis-follow', daemon=True)
+        self._thread.start()
+    
+    def finish(self, timeout: float = FINISH_TIMEOUT) -> Optional[Tuple[np.ndarray, Dict]]:
+        """
+        全部分块已写入后调用：读完剩余部分并等待分析结果
+        
+        在完成上传的请求中执行，总共最多等待timeout秒；超时放弃，由常规分析任务计算
+        """
+        deadline = time.monotonic() + timeout
+        self._complete.set()  # 同时唤醒等待位图的轮询
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self._stop.set()
+            self.analyzer.abandon("等待流式分析结果超时")
+            return self.analyzer.finish(0)
+        return self.analyzer.finish(max(deadline - time.monotonic(), 0))
+    
+    def abort(self):
+        self._stop.set()
+        self.analyzer.abandon("上传已取消")
+
+
+# 进程内的分块上传流式分析；完成请求由其他进程处理时找不到对应的分析，回退到常规分析
+_upload_analyses: Dict[str, UploadAnalysis] = {}
+_upload_analyses_lock = threading.Lock()
+
+def start_upload_analysis(upload_id: str, upload, fps: float, width: int) -> Optional[UploadAnalysis]:
+    try:
+        analysis = UploadAnalysis(StreamingMotionAnalyzer(fps, width).start(), upload)
+    except Exception as e:
+        print(f"启动流式分析失败: {e}")
+        return None
+    with _upload_analyses_lock:
+        _upload_analyses[upload_id] = analysis
+    return analysis
+
+def pop_upload_analysis(upload_id: str) -> Optional[UploadAnalysis]:
+    with _upload_analyses_lock:
+        return _upload_analyses.pop(upload_id, None)
@@ -18,9 +18,67 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'storage/uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 1073741824))  # 1GB
     
+    # 分块上传配置（每个分块是一个独立请求，总大小受MAX_UPLOAD_SIZE限制）
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 1073741824))  # 1GB
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8388608))  # 默认分块大小 8MB
+    UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get('UPLOAD_MAX_CHUNK_SIZE', 67108864))  # 64MB
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 86400))  # 未完成的上传保留时间（秒）
+    
+    # 上传去重：文件按内容哈希保存在BLOB_STORE_DIR，内容相同的上传共享文件并继承已有的分析结果
+    BLOB_STORE_DIR = os.environ.get('BLOB_STORE_DIR', 'storage/blobs')
+    UPLOAD_HASH_MODE = os.environ.get('UPLOAD_HASH_MODE', 'full')  # full（按完整SHA-256查找重复上传）或 sampled（先按快速指纹查找候选，再比较完整SHA-256）
+    
     # 视频处理配置
     MAX_VIDEO_DURATION = int(os.environ.get('MAX_VIDEO_DURATION', 3600))  # 最大视频时长（秒）
     TARGET_CLIP_DURATION = int(os.environ.get('TARGET_CLIP_DURATION', 60))  # 目标剪辑时长（秒）
+    ANALYSIS_WIDTH = int(os.environ.get('ANALYSIS_WIDTH', 0))  # 运动分析分辨率宽度（如320），0表示原始分辨率
+    ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', 'sampled')  # sampled（均匀采样100帧）、timeline（完整运动时间线）或 adaptive（由粗到细搜索）
+    ANALYSIS_FPS = float(os.environ.get('ANALYSIS_FPS', 2.0))  # timeline模式下的分析帧率
+    UPLOAD_STREAM_ANALYSIS = int(os.environ.get('UPLOAD_STREAM_ANALYSIS', 0))  # 1表示timeline模式下边接收上传边计算运动时间线，0表示上传完成后再分析
+    
+    # 渲染方式：moviepy（重新编码）、copy（按关键帧直接复制）、smart（只重新编码切点处的GOP）、
+    # parallel（分段并行编码）、filtergraph（单个ffmpeg滤镜图）、
+    # auto（无效果时依次尝试smart和copy，有效果时依次尝试filtergraph和parallel）
+    RENDER_MODE = os.environ.get('RENDER_MODE', 'moviepy')
+    RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 0))  # parallel模式的进程数上限，0表示按CPU核数
+    RENDER_PREVIEW_HEIGHT = int(os.environ.get('RENDER_PREVIEW_HEIGHT', 0))  # 先渲染的快速预览高度（如360），0表示不生成预览
+    
+    # 长视频分片并行分析（timeline模式）
+    ANALYSIS_SHARD_MIN_DURATION = float(os.environ.get('ANALYSIS_SHARD_MIN_DURATION', 1800))  # 达到该时长（秒）才分片，0表示不分片
+    ANALYSIS_SHARD_SECONDS = float(os.environ.get('ANALYSIS_SHARD_SECONDS', 300))  # 单个分片的最短时长（秒）
+    ANALYSIS_SHARD_WORKERS = int(os.environ.get('ANALYSIS_SHARD_WORKERS', 0))  # 分片进程数上限，0表示按CPU核数
+    
+    # 分析结果缓存（按文件内容哈希 + 分析参数）
+    ANALYSIS_CACHE_DIR = os.environ.get('ANALYSIS_CACHE_DIR', 'storage/analysis_cache')
+    ANALYSIS_CACHE_MAX_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_BYTES', 1073741824))  # 1GB
+    
+    # 已编码片段缓存（按文件内容哈希 + 起止时间 + 效果 + 编码参数），在剪辑请求之间共享
+    SEGMENT_CACHE_DIR = os.environ.get('SEGMENT_CACHE_DIR', 'storage/segment_cache')
+    SEGMENT_CACHE_MAX_BYTES = int(os.environ.get('SEGMENT_CACHE_MAX_BYTES', 5368709120))  # 5GB
+    
+    # 任务临时目录：每个渲染任务独占一个子目录，结束时删除
+    SCRATCH_DIR = os.environ.get('SCRATCH_DIR', 'storage/temp')
+    SCRATCH_TMPFS_DIR = os.environ.get('SCRATCH_TMPFS_DIR', '')  # 如 /dev/shm，空闲空间足够时优先使用
+    SCRATCH_JOB_QUOTA_BYTES = int(os.environ.get('SCRATCH_JOB_QUOTA_BYTES', 0))  # 每个任务的临时文件上限（如10737418240即10GB），0表示不限制
+    
+    # 后台任务配置
+    LIGHT_JOB_WORKERS = int(os.environ.get('LIGHT_JOB_WORKERS', 2))  # 分析任务并发数
+    LIGHT_JOB_QUEUE_SIZE = int(os.environ.get('LIGHT_JOB_QUEUE_SIZE', 20))  # 分析任务最大排队数
+    HEAVY_JOB_WORKERS = int(os.environ.get('HEAVY_JOB_WORKERS', 1))  # 渲染任务并发数
+    HEAVY_JOB_QUEUE_SIZE = int(os.environ.get('HEAVY_JOB_QUEUE_SIZE', 10))  # 渲染任务最大排队数
+    JOB_RETRY_AFTER = int(os.environ.get('JOB_RETRY_AFTER', 30))  # 队列已满时建议客户端重试的秒数
+    # thread: 在API进程的线程中执行；process: 在独立进程池中执行（CPU密集型分析可按核数扩展）
+    JOB_EXECUTION_MODE = os.environ.get('JOB_EXECUTION_MODE', 'thread')
+    JOB_PROCESS_START_METHOD = os.environ.get('JOB_PROCESS_START_METHOD', 'spawn')
+    
+    # 分布式任务队列配置（JOB_BACKEND=redis 时任务由 worker.py 消费）
+    JOB_BACKEND = os.environ.get('JOB_BACKEND', 'local')  # local / redis
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')  # memory:// 使用进程内实现，任务由API进程内的工作线程执行
+    JOB_QUEUE_PREFIX = os.environ.get('JOB_QUEUE_PREFIX', 'video_jobs')
+    JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT', 600))  # 未确认任务重新入队的超时（秒）
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_BACKOFF = int(os.environ.get('JOB_RETRY_BACKOFF', 10))  # 首次重试延迟（秒），之后指数增长
+    JOB_RETRY_BACKOFF_MAX = int(os.environ.get('JOB_RETRY_BACKOFF_MAX', 600))
     
     # OpenAI配置
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
@@ -33,7 +91,10 @@ class Config:
         'uploads': 'storage/uploads',
         'results': 'storage/results',
         'temp': 'storage/temp',
-        'thumbnails': 'storage/thumbnails'
+        'thumbnails': 'storage/thumbnails',
+        'analysis_cache': 'storage/analysis_cache',
+        'segment_cache': 'storage/segment_cache',
+        'blobs': 'storage/blobs'
     }
     
     @staticmethod
@@ -12,14 +12,18 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from app import create_app
+from config import config
 
 def main():
     """主函数"""
     print("🎬 运动视频智能剪辑平台 - 后端服务")
     print("=" * 50)
     
-    # 创建应用实例
-    app = create_app('development')
+    # 创建应用实例（后台任务复用此实例的上下文和数据库连接池）
+    config_name = os.environ.get('FLASK_ENV', 'development')
+    if config_name not in config:
+        config_name = 'default'
+    app = create_app(config_name)
     
     # 获取配置
     host = os.environ.get('FLASK_HOST', '0.0.0.0')
@@ -28,6 +32,7 @@ def main():
     
     print(f"🚀 启动后端服务...")
     print(f"📍 地址: http://{host}:{port}")
+    print(f"⚙️ 配置: {config_name}")
     print(f"🔧 调试模式: {'开启' if debug else '关闭'}")
     print(f"🌐 API文档: http://{host}:{port}/api/videos")
     print(f"🏥 健康检查: http://{host}:{port}/health")
@@ -0,0 +1,66 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='需要ffmpeg')
+requires_ffprobe = pytest.mark.skipif(shutil.which('ffprobe') is None, reason='需要ffprobe')
+
+
+def make_video(path, duration: float = 6.0, fps=25, gop: int = 25, size: str = '320x240',
+               audio: bool = False):
+    """用ffmpeg的测试源生成H.264视频（固定GOP，便于验证按关键帧剪切；fps可以是 30000/1001 形式）"""
+    cmd = ['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={fps}']
+    if audio:
+        cmd += ['-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000']
+    cmd += ['-t', str(duration), '-pix_fmt', 'yuv420p', '-c:v', 'libx264', '-g', str(gop),
+            '-keyint_min', str(gop), '-sc_threshold', '0']
+    if audio:
+        cmd += ['-c:a', 'aac', '-shortest']
+    cmd.append(str(path))
+    subprocess.run(cmd, check=True)
+    return str(path)
+
+
+def count_frames(path) -> int:
+    """解码视频流并返回帧数（不依赖ffprobe）"""
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-nostats', '-i', str(path), '-map', '0:v:0',
+                             '-f', 'null', '-progress', 'pipe:1', '-'],
+                            capture_output=True, text=True, check=True)
+    frames = [line for line in result.stdout.splitlines() if line.startswith('frame=')]
+    return int(frames[-1].split('=', 1)[1])
+
+
+@pytest.fixture(scope='session')
+def sample_video(tmp_path_factory):
+    """6秒、25fps、每秒一个关键帧的测试视频"""
+    if shutil.which('ffmpeg') is None:
+        pytest.skip('需要ffmpeg')
+    return make_video(tmp_path_factory.mktemp('videos') / 'sample.mp4')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """使用临时存储目录和内存数据库的应用实例"""
+    monkeypatch.chdir(tmp_path)
+    from app import create_app
+    
+    app = create_app('testing')
+    app.config['BLOB_STORE_DIR'] = str(tmp_path / 'storage' / 'blobs')
+    yield app
+    
+    for executor in app.extensions['job_executors'].values():
+        if hasattr(executor, 'shutdown'):
+            executor.shutdown(wait=False)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
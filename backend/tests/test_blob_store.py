@@ -0,0 +1,47 @@
+import hashlib
+import os
+
+from app.storage import BlobStore
+
+
+def write(path, data: bytes) -> str:
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def test_ingest_moves_file_into_store(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    data = b'video data'
+    content_hash = hashlib.sha256(data).hexdigest()
+    
+    blob_path = store.ingest(write(tmp_path / 'a.MP4', data), content_hash)
+    assert blob_path == store.path_for(content_hash, '.mp4')
+    assert not os.path.exists(tmp_path / 'a.MP4')
+    assert store.find(content_hash) == blob_path
+    
+    # 文件已在存储中时直接返回
+    assert store.ingest(blob_path, content_hash) == blob_path
+    assert os.path.exists(blob_path)
+
+
+def test_ingest_reuses_existing_blob(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    data = b'video data'
+    content_hash = hashlib.sha256(data).hexdigest()
+    first = store.ingest(write(tmp_path / 'a.mp4', data), content_hash)
+    
+    # 扩展名不同的相同内容复用已有文件，丢弃新上传的副本
+    second = store.ingest(write(tmp_path / 'b.mov', data), content_hash)
+    assert second == first
+    assert not os.path.exists(tmp_path / 'b.mov')
+
+
+def test_find_skips_derived_files(tmp_path):
+    store = BlobStore(str(tmp_path / 'blobs'))
+    content_hash = hashlib.sha256(b'x').hexdigest()
+    index_path = f"{store.path_for(content_hash, '.mp4')}.keyframes.npz"
+    os.makedirs(os.path.dirname(index_path))
+    write(index_path, b'index')
+    
+    assert store.find(content_hash) is None
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from app.video_processing import cache_stats
+from app.video_processing.analysis_cache import AnalysisCache
+from app.video_processing.cache_stats import CacheStats
+from app.video_processing.segment_cache import SegmentCache
+
+
+def _lookup(cache: SegmentCache, start: float):
+    cache.fetch('hash', start, start + 1, {}, {}, f'{cache.root}/../out_{start}.mp4')
+
+
+def test_counts_from_worker_processes_are_shared(tmp_path):
+    root = str(tmp_path / 'segments')
+    cache = SegmentCache(root)
+    segment = tmp_path / 'segment.mp4'
+    segment.write_bytes(b'segment')
+    cache.store('hash', 0.0, 1.0, {}, {}, str(segment))
+    _lookup(cache, 0.0)
+    
+    # fork出的子进程继承同一个实例，计数写入自己的文件而不覆盖父进程的
+    context = multiprocessing.get_context('fork')
+    for start in (0.0, 5.0):
+        process = context.Process(target=_lookup, args=(cache, start))
+        process.start()
+        process.join()
+    
+    stats = SegmentCache(root).stats()
+    assert (stats['hits'], stats['misses'], stats['stored']) == (2, 1, 1)
+    assert stats['hitRate'] == 2 / 3
+    # 统计文件不计入缓存条目
+    assert stats['entries'] == 1
+
+
+def test_analysis_cache_stats(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    cache.save('hash', {'kind': 'timeline'}, {'timeline': np.zeros(3, dtype=np.float32)})
+    assert cache.load('hash', {'kind': 'timeline'}) is not None
+    assert cache.load('hash', {'kind': 'other'}) is None
+    
+    stats = AnalysisCache(str(tmp_path)).stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_health_endpoint_reports_shared_counts(app, client, tmp_path):
+    app.config['SEGMENT_CACHE_DIR'] = str(tmp_path / 'shared_segments')
+    SegmentCache(app.config['SEGMENT_CACHE_DIR']).fetch('hash', 0.0, 1.0, {}, {},
+                                                        str(tmp_path / 'out.mp4'))
+    
+    assert client.get('/health/cache').get_json()['segmentCache']['misses'] == 1
+
+
+def test_counts_are_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_stats, 'FLUSH_EVERY', 3)
+    stats = CacheStats(str(tmp_path), ('hits',))
+    
+    stats.increment('hits')
+    stats.increment('hits')
+    assert _count_files(stats) == 0
+    # 当前进程未写入的计数也计入汇总
+    assert stats.totals() == {'hits': 2}
+    
+    stats.increment('hits')
+    assert _count_files(stats) == 1
+    assert stats.totals() == {'hits': 3}
+
+
+def test_exited_process_files_are_folded(tmp_path):
+    root = str(tmp_path)
+    context = multiprocessing.get_context('fork')
+    for _ in range(3):
+        process = context.Process(target=_increment, args=(root,))
+        process.start()
+        process.join()
+    
+    stats = CacheStats(root, ('hits',))
+    assert _count_files(stats) == 3
+    assert stats.totals() == {'hits': 3}
+    # 已退出进程的文件并入汇总文件
+    assert sorted(os.listdir(stats.dir)) == [cache_stats.LOCK_FILE, cache_stats.AGGREGATE_FILE]
+    
+    process = context.Process(target=_increment, args=(root,))
+    process.start()
+    process.join()
+    assert stats.totals() == {'hits': 4}
+    assert _count_files(stats) == 0
+
+
+def _increment(root: str):
+    CacheStats(root, ('hits',)).increment('hits')
+
+
+def _count_files(stats: CacheStats) -> int:
+    return len([name for name in os.listdir(stats.dir)
+                if name.endswith('.json') and name != cache_stats.AGGREGATE_FILE])
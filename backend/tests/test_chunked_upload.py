@@ -0,0 +1,218 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.api import routes
+from app.jobs import LIGHT_POOL, QueueFullError
+from app.models import UploadSession, Video
+
+CHUNK_SIZE = 256 * 1024
+
+
+class StubExecutor:
+    """accept=False时提交任务抛出QueueFullError（模拟检查后队列被占满）"""
+    
+    name = LIGHT_POOL
+    retry_after = 30
+    
+    def __init__(self):
+        self.accept = True
+        self.submitted = []
+    
+    def is_full(self):
+        return False
+    
+    def submit_task(self, task, job_id, *args):
+        if not self.accept:
+            raise QueueFullError(self.name, self.retry_after)
+        self.submitted.append((task, job_id, args))
+        return 1
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = StubExecutor()
+    monkeypatch.setattr(routes, 'get_executor', lambda name: executor)
+    return executor
+
+
+def create_session(client, size: int, filename: str = 'clip.mp4') -> str:
+    response = client.post('/api/videos/uploads',
+                           json={'filename': filename, 'size': size, 'chunkSize': CHUNK_SIZE})
+    assert response.status_code == 201
+    return response.get_json()['uploadId']
+
+
+def put_chunk(client, upload_id: str, data: bytes, offset: int):
+    return client.put(f'/api/videos/uploads/{upload_id}?offset={offset}', data=data)
+
+
+def upload(client, data: bytes) -> str:
+    """上传全部分块，返回上传会话ID"""
+    upload_id = create_session(client, len(data))
+    for offset in range(0, len(data), CHUNK_SIZE):
+        assert put_chunk(client, upload_id, data[offset:offset + CHUNK_SIZE], offset).status_code == 200
+    return upload_id
+
+
+def test_chunk_keeps_session_from_expiring(app, client):
+    app.config['UPLOAD_SESSION_TTL'] = 3600
+    data = bytes(range(256)) * (2 * CHUNK_SIZE // 256)
+    upload_id = create_session(client, len(data))
+    
+    with app.app_context():
+        session = UploadSession.query.get(upload_id)
+        session.updated_at = datetime.utcnow() - timedelta(hours=2)
+        db.session.commit()
+    
+    assert put_chunk(client, upload_id, data[:CHUNK_SIZE], 0).status_code == 200
+    with app.app_context():
+        assert UploadSession.query.get(upload_id).updated_at > datetime.utcnow() - timedelta(minutes=1)
+    
+    # 创建新会话时清理过期会话，仍在上传的会话保留
+    create_session(client, len(data))
+    response = client.get(f'/api/videos/uploads/{upload_id}')
+    assert response.status_code == 200
+    assert response.get_json()['missingChunks'] == [1]
+
+
+def test_idle_session_expires(app, client):
+    app.config['UPLOAD_SESSION_TTL'] = 3600
+    upload_id = create_session(client, CHUNK_SIZE)
+    
+    with app.app_context():
+        session = UploadSession.query.get(upload_id)
+        session.updated_at = datetime.utcnow() - timedelta(hours=2)
+        db.session.commit()
+    
+    create_session(client, CHUNK_SIZE)
+    assert client.get(f'/api/videos/uploads/{upload_id}').status_code == 404
+
+
+def test_aborting_completed_session_keeps_shared_blob(app, client, executor):
+    data = os.urandom(CHUNK_SIZE + 1000)
+    response = client.post(f'/api/videos/uploads/{upload(client, data)}/complete')
+    assert response.status_code == 201
+    video_id = response.get_json()['videoId']
+    
+    # 相同内容的第二次上传在存储后遇到队列已满，会话引用同一个存储文件
+    executor.accept = False
+    upload_id = upload(client, data)
+    assert client.post(f'/api/videos/uploads/{upload_id}/complete').status_code == 429
+    with app.app_context():
+        blob_path = Video.query.get(video_id).filepath
+        assert UploadSession.query.get(upload_id).filepath == blob_path
+    
+    assert client.delete(f'/api/videos/uploads/{upload_id}').status_code == 200
+    assert os.path.exists(blob_path)
+    with open(blob_path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_aborting_completed_session_releases_unshared_blob(app, client, executor):
+    executor.accept = False
+    upload_id = upload(client, os.urandom(CHUNK_SIZE))
+    assert client.post(f'/api/videos/uploads/{upload_id}/complete').status_code == 429
+    with app.app_context():
+        blob_path = UploadSession.query.get(upload_id).filepath
+    assert os.path.exists(blob_path)
+    
+    assert client.delete(f'/api/videos/uploads/{upload_id}').status_code == 200
+    assert not os.path.exists(blob_path)
+
+
+@pytest.fixture
+def sampled_mode(app, monkeypatch):
+    """sampled模式，缩小采样块使只有中间一个字节不同的文件得到相同的快速指纹"""
+    from app.storage import hashing
+    
+    app.config['UPLOAD_HASH_MODE'] = 'sampled'
+    monkeypatch.setattr(hashing, 'SAMPLED_BLOCK_SIZE', 4096)
+
+
+def complete_and_analyze(app, client, data: bytes) -> str:
+    response = client.post(f'/api/videos/uploads/{upload(client, data)}/complete')
+    assert response.status_code == 201
+    video_id = response.get_json()['videoId']
+    with app.app_context():
+        video = Video.query.get(video_id)
+        video.status = 'analyzed'
+        db.session.commit()
+    return video_id
+
+
+def test_sampled_fingerprint_collision_is_not_shared(app, client, executor, sampled_mode):
+    first = os.urandom(2 * CHUNK_SIZE)
+    second = bytearray(first)
+    second[20000] ^= 0xFF  # 不在任何采样块内
+    second = bytes(second)
+    first_id = complete_and_analyze(app, client, first)
+    
+    response = client.post(f'/api/videos/uploads/{upload(client, second)}/complete')
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['status'] == 'uploaded' and 'deduplicatedFrom' not in body
+    
+    with app.app_context():
+        original, duplicate = Video.query.get(first_id), Video.query.get(body['videoId'])
+        assert original.fingerprint == duplicate.fingerprint
+        # 分析缓存和片段缓存以完整哈希为键，两个文件互不共享
+        assert original.content_hash == hashlib.sha256(first).hexdigest()
+        assert duplicate.content_hash == hashlib.sha256(second).hexdigest()
+        paths = original.filepath, duplicate.filepath
+    task, _, args = executor.submitted[-1]
+    assert task == 'analyze_video' and args[-1]['content_hash'] == hashlib.sha256(second).hexdigest()
+    with open(paths[0], 'rb') as f:
+        assert f.read() == first
+    with open(paths[1], 'rb') as f:
+        assert f.read() == second
+
+
+def test_sampled_mode_dedups_identical_content(app, client, executor, sampled_mode):
+    data = os.urandom(CHUNK_SIZE)
+    first_id = complete_and_analyze(app, client, data)
+    
+    response = client.post(f'/api/videos/uploads/{upload(client, data)}/complete')
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['deduplicatedFrom'] == first_id
+    assert body['contentHash'] == hashlib.sha256(data).hexdigest()
+    with app.app_context():
+        assert Video.query.get(body['videoId']).filepath == Video.query.get(first_id).filepath
+
+
+def test_received_chunk_cannot_be_overwritten(app, client, executor):
+    first = b'a' * CHUNK_SIZE
+    upload_id = create_session(client, 2 * CHUNK_SIZE)
+    assert put_chunk(client, upload_id, first, 0).status_code == 200
+    
+    # 第0块已计入增量哈希，覆盖后哈希会与文件内容不一致
+    response = put_chunk(client, upload_id, b'b' * CHUNK_SIZE, 0)
+    assert response.status_code == 409
+    assert response.get_json()['receivedBytes'] == CHUNK_SIZE
+    
+    second = b'c' * CHUNK_SIZE
+    assert put_chunk(client, upload_id, second, CHUNK_SIZE).status_code == 200
+    response = client.post(f'/api/videos/uploads/{upload_id}/complete')
+    assert response.status_code == 201
+    with app.app_context():
+        filepath = Video.query.get(response.get_json()['videoId']).filepath
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    assert data == first + second
+    assert response.get_json()['contentHash'] == hashlib.sha256(data).hexdigest()
+
+
+def test_form_upload_keys_on_full_hash(app, client, executor, sampled_mode):
+    data = os.urandom(CHUNK_SIZE)
+    response = client.post('/api/videos/upload', data={'video': (io.BytesIO(data), 'clip.mp4')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['contentHash'] == hashlib.sha256(data).hexdigest()
+    with app.app_context():
+        assert Video.query.get(body['videoId']).fingerprint.startswith('s:')
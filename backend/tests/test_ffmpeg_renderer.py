@@ -0,0 +1,59 @@
+import os
+import subprocess
+
+import numpy as np
+
+from app.video_processing.ffmpeg_renderer import FFmpegRenderer
+from app.video_processing.keyframe_index import KeyframeIndex
+from conftest import count_frames, make_video, requires_ffmpeg
+
+# 直接复制时 -t 按解码时间戳截断，B帧重排会在片段末尾多带几帧
+REORDER_FRAMES = 3
+
+
+@requires_ffmpeg
+def test_cut_segment_starts_at_sub_millisecond_keyframe(tmp_path):
+    # 29.97fps、每25帧一个关键帧：第二个关键帧在 25 * 1001 / 30000 = 0.834166...秒，
+    # 舍入到毫秒（0.834）会早于关键帧
+    video_path = make_video(tmp_path / 'video.mp4', fps='30000/1001', gop=25)
+    keyframe = 25 * 1001 / 30000
+    output_path = tmp_path / 'cut.mp4'
+    
+    assert FFmpegRenderer().cut_segment(video_path, keyframe, keyframe, str(output_path))
+    
+    frames = count_frames(output_path)
+    assert 25 <= frames <= 25 + REORDER_FRAMES
+
+
+def _index(duration: float, fps: int = 25, gop: int = 25) -> KeyframeIndex:
+    """make_video生成的视频的关键帧索引（固定帧率和GOP，容器start_time为0）"""
+    frame_us = 1_000_000 // fps
+    packet_us = np.arange(int(duration * fps), dtype=np.int64) * frame_us
+    return KeyframeIndex(packet_us, packet_us[::gop], len(packet_us) * frame_us)
+
+
+@requires_ffmpeg
+def test_smart_render_splices_reencoded_and_copied_pieces(tmp_path):
+    # 源视频用与边界段编码参数不同的设置编码，SPS/PPS不同
+    video_path = str(tmp_path / 'video.mp4')
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=25',
+                    '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000', '-t', '6',
+                    '-pix_fmt', 'yuv420p', '-c:v', 'libx264', '-preset', 'slow', '-refs', '4',
+                    '-g', '25', '-keyint_min', '25', '-sc_threshold', '0', '-c:a', 'aac', '-shortest',
+                    video_path], check=True)
+    video_info = {'codec': 'h264', 'pix_fmt': 'yuv420p', 'profile': 'High', 'time_base': '1/12800',
+                  'audio_streams': 1, 'audio_codec': 'aac', 'audio_sample_rate': 48000,
+                  'audio_channels': 1}
+    renderer = FFmpegRenderer(temp_dir=str(tmp_path / 'scratch'))
+    index = _index(6.0)
+    segments = [(0.3, 2.7), (3.5, 5.2)]
+    output_path = tmp_path / 'smart.mp4'
+    
+    assert [mode for mode, _, _ in renderer.plan_smart_pieces(segments, 60, 6.0, index)] == \
+        ['encode', 'copy', 'encode', 'encode', 'copy', 'encode']
+    assert renderer.render(video_path, segments, str(output_path), 60, 6.0, index, mode='smart',
+                           video_info=video_info)
+    
+    # [0.32, 2.68] 60帧 + [3.52, 5.16] 42帧，帧精确且不重复
+    assert count_frames(output_path) == 102
+    assert os.listdir(tmp_path / 'scratch') == []
@@ -0,0 +1,41 @@
+from app.video_processing.filter_graph import FilterGraphRenderer, effects_from_suggestions
+from conftest import count_frames, requires_ffmpeg
+
+VIDEO_INFO = {'audio_streams': 0, 'audio_sample_rate': 0, 'height': 240}
+
+
+def video_chain(audio_suggestions):
+    renderer = FilterGraphRenderer()
+    renderer.ffmpeg.ffmpeg_path = 'ffmpeg'
+    cmd = renderer.build_command('in.mp4', [(10.0, 14.0)], 'out.mp4',
+                                 effects_from_suggestions(audio_suggestions), has_audio=False)
+    graph = cmd[cmd.index('-filter_complex') + 1]
+    return graph.split(';')[0].split(']', 1)[1].rsplit('[', 1)[0].split(',')
+
+
+def test_effects_follow_suggestion_order():
+    # 先淡入再慢动作：1秒的淡入随片段一起变慢
+    assert video_chain(['淡入', '慢动作']) == [
+        'trim=duration=4.000000', 'setpts=PTS-STARTPTS', 'fade=t=in:st=0:d=1.000', 'setpts=PTS/0.5'
+    ]
+    # 先慢动作再淡出：淡出按变速后的8秒计算
+    assert video_chain(['慢动作', '淡出']) == [
+        'trim=duration=4.000000', 'setpts=PTS-STARTPTS', 'setpts=PTS/0.5',
+        'fade=t=out:st=7.000:d=1.000'
+    ]
+
+
+def test_speed_multiplies_for_audio():
+    effects = effects_from_suggestions(['加速', '慢动作', '加速'])
+    assert effects['speed'] == 2.0
+    assert [effect for effect, _ in effects['video']] == ['speed', 'speed', 'speed']
+
+
+@requires_ffmpeg
+def test_render_slow_motion(sample_video, tmp_path):
+    output_path = tmp_path / 'slow.mp4'
+    assert FilterGraphRenderer().render(sample_video, [(1.0, 2.0)], str(output_path),
+                                        ['淡入', '慢动作'], VIDEO_INFO)
+    
+    # 1秒的片段放慢一倍，按源帧率输出2秒
+    assert abs(count_frames(output_path) - 50) <= 1
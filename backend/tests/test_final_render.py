@@ -0,0 +1,123 @@
+import pytest
+
+from app import db
+from app.jobs import HEAVY_POOL, QueueFullError, final_render_job_id, tasks
+from app.models import ClipRequest, Video
+
+
+class FullThenOpenExecutor:
+    """前full次提交时队列已满，之后接受"""
+    
+    def __init__(self, full: int):
+        self.full = full
+        self.submitted = []
+    
+    def submit_task(self, task, job_id, *args):
+        if self.full:
+            self.full -= 1
+            raise QueueFullError(HEAVY_POOL, 30)
+        self.submitted.append((task, job_id, args))
+        return 1
+    
+    def queue_position(self, job_id):
+        return 0 if any(submitted[1] == job_id for submitted in self.submitted) else None
+
+
+class ImmediateTimer:
+    """立即执行的threading.Timer"""
+    
+    def __init__(self, function):
+        self.function = function
+        self.daemon = False
+    
+    def start(self):
+        self.function()
+
+
+@pytest.fixture
+def clip(app):
+    with app.app_context():
+        video = Video(filename='a.mp4', filepath='a.mp4', status='analyzed')
+        db.session.add(video)
+        db.session.commit()
+        clip_request = ClipRequest(video_id=video.id, text_input='精彩进球', status='processing')
+        db.session.add(clip_request)
+        db.session.commit()
+        return video.id, clip_request.id
+
+
+@pytest.fixture
+def retries(monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(tasks, '_schedule_final_render_retry',
+                        lambda clip_id, delay, attempt=1: scheduled.append((clip_id, delay)))
+    return scheduled
+
+
+def preview_result(preview_path):
+    return {'success': True, 'tier': 'preview', 'preview_path': str(preview_path),
+            'segments': [[0.0, 1.0]], 'final_args': [{'filepath': 'a.mp4'}, [[0.0, 1.0]], 60, {}]}
+
+
+def test_full_queue_completes_clip_with_preview(app, client, clip, retries, tmp_path):
+    video_id, clip_id = clip
+    executor = FullThenOpenExecutor(full=2)
+    app.extensions['job_executors'][HEAVY_POOL] = executor
+    preview_path = tmp_path / 'preview.mp4'
+    preview_path.write_bytes(b'preview')
+    
+    with app.app_context():
+        tasks.save_clip_result(clip_id, preview_result(preview_path))
+        clip_request = ClipRequest.query.get(clip_id)
+        assert (clip_request.status, clip_request.render_tier) == ('completed', 'preview')
+        assert clip_request.playable_path == str(preview_path)
+    assert retries == [(clip_id, 30)]
+    
+    # 队列仍然已满：查询结果为预览完成，参数保留
+    response = client.get(f'/api/videos/{video_id}/clip/{clip_id}').get_json()
+    assert (response['status'], response['renderTier']) == ('completed', 'preview')
+    assert client.get(response['previewUrl']).data == b'preview'
+    
+    # 队列有空位后重新提交最终版本
+    response = client.get(f'/api/videos/{video_id}/clip/{clip_id}').get_json()
+    assert response['queuePosition'] == 0
+    assert executor.submitted == [('render_clip_final', final_render_job_id(clip_id),
+                                   (clip_id, {'filepath': 'a.mp4'}, [[0.0, 1.0]], 60, {}))]
+    with app.app_context():
+        assert ClipRequest.query.get(clip_id).final_render_args is None
+        assert tasks.resubmit_final_render(ClipRequest.query.get(clip_id))
+    assert len(executor.submitted) == 1
+
+
+def test_final_result_replaces_deferred_preview(app, clip, retries, tmp_path):
+    _, clip_id = clip
+    app.extensions['job_executors'][HEAVY_POOL] = FullThenOpenExecutor(full=1)
+    preview_path = tmp_path / 'preview.mp4'
+    preview_path.write_bytes(b'preview')
+    
+    with app.app_context():
+        tasks.save_clip_result(clip_id, preview_result(preview_path))
+        tasks.resubmit_final_render(ClipRequest.query.get(clip_id))
+        tasks.save_final_clip_result(final_render_job_id(clip_id), {
+            'success': True, 'tier': 'final', 'result_path': str(tmp_path / 'final.mp4')
+        })
+        clip_request = ClipRequest.query.get(clip_id)
+        assert (clip_request.status, clip_request.render_tier) == ('completed', 'final')
+        assert clip_request.playable_path == str(tmp_path / 'final.mp4')
+    assert not preview_path.exists()
+
+
+def test_deferred_final_render_is_retried_in_background(app, clip, tmp_path):
+    _, clip_id = clip
+    executor = FullThenOpenExecutor(full=2)
+    app.extensions['job_executors'][HEAVY_POOL] = executor
+    preview_path = tmp_path / 'preview.mp4'
+    preview_path.write_bytes(b'preview')
+    
+    with app.app_context():
+        with pytest.MonkeyPatch.context() as patch:
+            # 定时重试的间隔使用队列建议的retry_after，测试中缩短
+            patch.setattr(tasks.threading, 'Timer', lambda delay, function: ImmediateTimer(function))
+            tasks.save_clip_result(clip_id, preview_result(preview_path))
+        assert ClipRequest.query.get(clip_id).final_render_args is None
+    assert [job_id for _, job_id, _ in executor.submitted] == [final_render_job_id(clip_id)]
@@ -0,0 +1,74 @@
+import pytest
+
+from app.video_processing.keyframe_index import KeyframeIndex
+from conftest import make_video, requires_ffprobe
+
+# 25fps、每秒一个关键帧，容器start_time为0.5秒（例如音频先于视频开始）
+FFPROBE_OUTPUT = '\n'.join(
+    [f'packet,{0.5 + i * 0.04:.6f},0.040000,{"K_" if i % 25 == 0 else "__"}' for i in range(75)]
+    + ['format,0.500000']
+)
+
+
+def test_times_are_relative_to_container_start_time():
+    output = FFPROBE_OUTPUT.replace('format,0.500000', 'format,0.400000')
+    index = KeyframeIndex.parse(output)
+    
+    # 视频流第一个数据包在start_time之后0.1秒
+    assert index.keyframe_before(0.5) == pytest.approx(0.1)
+    assert index.keyframe_after(0.5) == pytest.approx(1.1)
+
+
+def test_falls_back_to_first_packet_without_start_time():
+    output = FFPROBE_OUTPUT.replace('format,0.500000', 'format,N/A')
+    index = KeyframeIndex.parse(output)
+    
+    assert index.keyframe_before(0.0) == 0.0
+    assert index.keyframe_after(0.01) == pytest.approx(1.0)
+
+
+def test_last_gop_ends_after_last_frame_duration():
+    index = KeyframeIndex.parse(FFPROBE_OUTPUT)
+    
+    assert index.gop_containing(1.5) == pytest.approx((1.0, 2.0))
+    # 最后一帧显示时间为2.96秒，持续0.04秒
+    assert index.gop_containing(2.5) == pytest.approx((2.0, 3.0))
+
+
+def test_frame_queries():
+    index = KeyframeIndex.parse(FFPROBE_OUTPUT)
+    
+    assert index.frame_count == 75
+    assert index.keyframe_frame_before(49) == 25
+    assert index.keyframe_frame_before(50) == 50
+    assert index.average_gop_frames == 25.0
+
+
+def test_frame_span():
+    index = KeyframeIndex.parse(FFPROBE_OUTPUT)
+    
+    assert index.frame_span(0.3, 1.0) == (17, pytest.approx(0.32), pytest.approx(1.0))
+    # 到最后一帧为止时以最后一帧的结束时间为终点
+    assert index.frame_span(2.5, 10.0) == (12, pytest.approx(2.52), pytest.approx(3.0))
+    assert index.frame_span(1.01, 1.02)[0] == 0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    video_path = tmp_path / 'video.mp4'
+    video_path.write_bytes(b'')
+    index = KeyframeIndex.parse(FFPROBE_OUTPUT)
+    index.save(str(video_path))
+    
+    loaded = KeyframeIndex.load(str(video_path))
+    assert loaded.end_us == index.end_us
+    assert list(loaded.keyframe_us) == list(index.keyframe_us)
+
+
+@requires_ffprobe
+def test_build_from_video(tmp_path):
+    video_path = make_video(tmp_path / 'video.mp4', duration=3.0)
+    index = KeyframeIndex.build(video_path)
+    
+    assert index.frame_count == 75
+    assert [index.keyframe_after(t) for t in (0.0, 0.5, 1.5)] == pytest.approx([0.0, 1.0, 2.0])
+    assert index.gop_containing(2.5) == pytest.approx((2.0, 3.0))
@@ -0,0 +1,211 @@
+import time
+
+import pytest
+from flask import Flask
+
+from app.jobs import redis_queue
+from app.jobs.redis_queue import JobExpiredError, MemoryBroker, RedisJobQueue
+from app.jobs.worker import JobWorker
+
+
+class Clock:
+    """替换队列模块中的time.time，测试中手动推进时间"""
+    
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+    
+    def time(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(redis_queue, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queue(clock):
+    return RedisJobQueue('light', MemoryBroker(), max_queue_size=3, visibility_timeout=60,
+                         max_attempts=3, retry_backoff=10, retry_backoff_max=25)
+
+
+def test_claim_returns_jobs_in_submission_order(queue, clock):
+    assert queue.submit_task('analyze_video', 'a', 'x.mp4') == 1
+    clock.advance(1)
+    assert queue.submit_task('analyze_video', 'b', 'y.mp4') == 2
+    
+    job_id, payload, attempts = queue.claim()
+    assert (job_id, attempts) == ('a', 1)
+    assert payload == {'task': 'analyze_video', 'args': ['x.mp4']}
+    assert queue.queue_position('a') == 0
+    assert queue.queue_position('b') == 1
+
+
+def test_submit_rejects_when_full(queue):
+    for job_id in 'abc':
+        queue.submit_task('analyze_video', job_id)
+    with pytest.raises(redis_queue.QueueFullError):
+        queue.submit_task('analyze_video', 'd')
+
+
+def test_ack_removes_job(queue):
+    queue.submit_task('analyze_video', 'a')
+    queue.claim()
+    queue.ack('a')
+    
+    assert queue.queue_position('a') is None
+    assert queue.stats()['queued'] == 0
+    assert queue.stats()['running'] == 0
+    assert queue.claim() is None
+
+
+def test_unacked_job_is_invisible_until_visibility_timeout(queue, clock):
+    queue.submit_task('analyze_video', 'a')
+    assert queue.claim()[0] == 'a'
+    
+    clock.advance(59)
+    assert queue.claim() is None
+    
+    clock.advance(2)
+    job_id, _, attempts = queue.claim()
+    assert (job_id, attempts) == ('a', 2)
+
+
+def test_heartbeat_extends_visibility_timeout(queue, clock):
+    queue.submit_task('analyze_video', 'a')
+    queue.claim()
+    
+    clock.advance(50)
+    queue.heartbeat('a')
+    clock.advance(50)
+    assert queue.claim() is None
+    
+    clock.advance(11)
+    assert queue.claim()[0] == 'a'
+
+
+def test_retry_backs_off_exponentially_up_to_max(queue, clock):
+    queue.submit_task('analyze_video', 'a')
+    _, _, attempts = queue.claim()
+    assert queue.retry('a', attempts)
+    
+    clock.advance(9)
+    assert queue.claim() is None
+    clock.advance(1)
+    _, _, attempts = queue.claim()
+    assert attempts == 2
+    
+    # 第二次失败：min(10 * 2, 25) = 20秒
+    assert queue.retry('a', attempts)
+    clock.advance(19)
+    assert queue.claim() is None
+    clock.advance(1)
+    _, _, attempts = queue.claim()
+    assert attempts == 3
+    
+    # 达到最大尝试次数，不再入队
+    assert not queue.retry('a', attempts)
+
+
+def test_resubmitting_resets_attempts(queue):
+    queue.submit_task('analyze_video', 'a')
+    queue.claim()
+    queue.ack('a')
+    queue.submit_task('analyze_video', 'a')
+    assert queue.claim()[2] == 1
+
+
+def test_expired_job_is_dead_lettered_after_max_attempts(queue, clock):
+    queue.submit_task('analyze_video', 'a', 'x.mp4')
+    for attempt in range(1, 4):
+        job_id, _, attempts = queue.claim()
+        assert (job_id, attempts) == ('a', attempt)
+        clock.advance(61)  # 工作进程崩溃，任务未被确认
+    
+    assert queue.claim() is None
+    job_id, payload, attempts = queue.claim_dead()
+    assert (job_id, attempts) == ('a', 3)
+    assert payload['args'] == ['x.mp4']
+    assert queue.claim_dead() is None
+    
+    queue.ack('a')
+    assert queue.queue_position('a') is None
+
+
+@pytest.fixture
+def handler_calls(monkeypatch):
+    from app.jobs import tasks
+    
+    calls = []
+    
+    def run(value):
+        if value == 'fail':
+            raise RuntimeError('失败')
+        return value
+    
+    monkeypatch.setitem(tasks.TASK_HANDLERS, 'dummy', {
+        'run': run,
+        'on_start': lambda job_id: calls.append(('start', job_id)),
+        'on_success': lambda job_id, result: calls.append(('success', job_id, result)),
+        'on_error': lambda job_id, error: calls.append(('error', job_id, type(error)))
+    })
+    return calls
+
+
+def test_worker_runs_job_and_acks(queue, handler_calls):
+    worker = JobWorker(Flask(__name__), [queue])
+    queue.submit_task('dummy', 'a', 'ok')
+    
+    assert worker.run_once()
+    assert handler_calls == [('start', 'a'), ('success', 'a', 'ok')]
+    assert queue.queue_position('a') is None
+    assert not worker.run_once()
+
+
+def test_worker_calls_on_error_after_last_attempt(queue, clock, handler_calls):
+    worker = JobWorker(Flask(__name__), [queue])
+    queue.submit_task('dummy', 'a', 'fail')
+    
+    for _ in range(3):
+        assert worker.run_once()
+        clock.advance(60)
+    
+    assert handler_calls[-1] == ('error', 'a', RuntimeError)
+    assert [call[0] for call in handler_calls].count('error') == 1
+    assert queue.queue_position('a') is None
+
+
+def test_worker_fails_dead_lettered_job(queue, clock, handler_calls):
+    worker = JobWorker(Flask(__name__), [queue])
+    queue.submit_task('dummy', 'a', 'ok')
+    for _ in range(3):
+        queue.claim()
+        clock.advance(61)
+    
+    assert worker.run_once()
+    assert handler_calls == [('error', 'a', JobExpiredError)]
+    assert queue.claim_dead() is None
+    assert queue.queue_position('a') is None
+
+
+def test_memory_backend_runs_jobs_in_process(handler_calls):
+    from app.jobs import LIGHT_POOL, init_job_executors
+    
+    app = Flask(__name__)
+    app.config.update(JOB_BACKEND='redis', REDIS_URL='memory://')
+    init_job_executors(app)
+    worker = app.extensions['job_worker']
+    
+    app.extensions['job_executors'][LIGHT_POOL].submit_task('dummy', 'a', 'ok')
+    deadline = time.monotonic() + 10
+    try:
+        while ('success', 'a', 'ok') not in handler_calls and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        worker.stop()
+    assert ('success', 'a', 'ok') in handler_calls
@@ -0,0 +1,36 @@
+import numpy as np
+
+from app.video_processing import sharded_analysis
+from app.video_processing.sharded_analysis import analyze_shard, analyze_sharded, plan_shards
+
+VIDEO_INFO = {'width': 320, 'height': 240, 'duration': 6.0}
+
+
+def test_plan_shards_covers_every_frame_once(monkeypatch):
+    monkeypatch.setattr(sharded_analysis.os, 'cpu_count', lambda: 4)
+    shards = plan_shards(1000.0, 2.0, min_shard_seconds=300)
+    
+    assert len(shards) == 3
+    assert shards[0][0] == 0
+    assert sum(count for _, count in shards) == 2000
+    for (start, count), (next_start, _) in zip(shards, shards[1:]):
+        assert start + count == next_start
+
+
+def test_sharded_timeline_matches_single_pass(sample_video, monkeypatch):
+    monkeypatch.setattr(sharded_analysis.os, 'cpu_count', lambda: 3)
+    single = analyze_shard(sample_video, 0, 30, 5.0, 160, VIDEO_INFO)
+    sharded = analyze_sharded(sample_video, VIDEO_INFO, 5.0, 160, min_shard_seconds=2,
+                              start_method='fork')
+    
+    assert sharded['stats']['shards'] == 3
+    assert len(sharded['timeline']) == 30
+    np.testing.assert_allclose(sharded['timeline'], single['timeline'], atol=1e-6)
+
+
+def test_shard_classifies_only_sampled_frames(sample_video):
+    result = analyze_shard(sample_video, 10, 20, 5.0, 160, VIDEO_INFO, classify_samples=4)
+    
+    assert result['classified'] == 4
+    assert set(result['sport_sums']) == {'basketball', 'football', 'tennis', 'swimming', 'athletics'}
+    assert len(result['timeline']) == 20
@@ -0,0 +1,78 @@
+import io
+import time
+
+import numpy as np
+import pytest
+
+from app.storage import ChunkedUpload
+from app.video_processing import stream_analysis
+from app.video_processing.stream_analysis import StreamingMotionAnalyzer, UploadAnalysis
+from conftest import make_video, requires_ffmpeg
+
+CHUNK_SIZE = 256 * 1024
+
+
+class StalledAnalyzer(StreamingMotionAnalyzer):
+    """不读取输入的“ffmpeg”，模拟处理速度跟不上上传"""
+    
+    def __init__(self):
+        super().__init__(2.0, 160, ffmpeg_path='sleep')
+    
+    def build_command(self) -> list:
+        return ['sleep', '30']
+
+
+def write_upload(path, data: bytes) -> ChunkedUpload:
+    upload = ChunkedUpload(str(path), len(data), CHUNK_SIZE)
+    upload.create()
+    for offset in range(0, len(data), CHUNK_SIZE):
+        chunk = data[offset:offset + CHUNK_SIZE]
+        upload.write_chunk(offset, io.BytesIO(chunk), len(chunk))
+    return upload
+
+
+def test_feed_abandons_when_analysis_falls_behind():
+    analyzer = StalledAnalyzer().start()
+    block = bytes(stream_analysis.FOLLOW_BLOCK_SIZE)
+    
+    fed = 0
+    while analyzer.feed(block, timeout=0.1):
+        fed += 1
+        assert fed < 1000
+    assert analyzer.failed
+    
+    started = time.monotonic()
+    assert analyzer.finish(1.0) is None
+    assert time.monotonic() - started < 5
+
+
+def test_finish_does_not_block_on_stalled_analysis(tmp_path, monkeypatch):
+    monkeypatch.setattr(stream_analysis, 'FEED_TIMEOUT', 0.2)
+    upload = write_upload(tmp_path / 'upload.mp4', bytes(64 * CHUNK_SIZE))
+    analysis = UploadAnalysis(StalledAnalyzer().start(), upload)
+    
+    started = time.monotonic()
+    assert analysis.finish(timeout=0.5) is None
+    assert time.monotonic() - started < 5
+    assert analysis.analyzer.failed
+
+
+@requires_ffmpeg
+def test_upload_analysis_matches_timeline(tmp_path):
+    from app.video_processing.motion_timeline import compute_motion_timeline
+    
+    # Matroska可以从管道解码（moov在文件末尾的MP4不行）
+    source = make_video(tmp_path / 'source.mkv', duration=4.0)
+    with open(source, 'rb') as f:
+        data = f.read()
+    upload = write_upload(tmp_path / 'upload.mkv', data)
+    
+    analysis = UploadAnalysis(StreamingMotionAnalyzer(2.0, 160).start(), upload)
+    result = analysis.finish(timeout=30)
+    assert result is not None
+    timeline, stats = result
+    
+    expected, _ = compute_motion_timeline(source, fps=2.0, width=160,
+                                          video_info={'width': 320, 'height': 240})
+    assert stats['frames'] == len(expected)
+    assert np.allclose(timeline, expected, atol=1e-4)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+运动视频智能剪辑平台 - 后台任务工作进程
+
+从Redis队列中消费视频分析和剪辑渲染任务，可以在多台机器上启动任意数量的实例：
+    JOB_BACKEND=redis REDIS_URL=redis://localhost:6379/0 python worker.py --queues heavy,light
+"""
+
+import argparse
+import os
+import signal
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from app import create_app
+from app.jobs import create_redis_queues, LIGHT_POOL, HEAVY_POOL
+from app.jobs.worker import JobWorker
+from config import config
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='后台任务工作进程')
+    parser.add_argument('--queues', default=f'{LIGHT_POOL},{HEAVY_POOL}',
+                        help='按优先级排列的队列名称，逗号分隔')
+    parser.add_argument('--concurrency', type=int, 
+                        default=int(os.environ.get('WORKER_CONCURRENCY', 1)),
+                        help='每个进程并发执行的任务数')
+    args = parser.parse_args()
+    
+    print("🛠️ 运动视频智能剪辑平台 - 任务工作进程")
+    print("=" * 50)
+    
+    # 应用实例只创建一次，所有任务共享其数据库连接池
+    config_name = os.environ.get('FLASK_ENV', 'development')
+    if config_name not in config:
+        config_name = 'default'
+    app = create_app(config_name)
+    
+    if app.config.get('REDIS_URL', '').startswith('memory://'):
+        print("❌ 进程内队列由API进程自行消费，工作进程需要配置 REDIS_URL 指向Redis服务")
+        return 1
+    
+    all_queues = create_redis_queues(app)
+    queue_names = [name.strip() for name in args.queues.split(',') if name.strip()]
+    unknown = [name for name in queue_names if name not in all_queues]
+    if unknown:
+        print(f"❌ 未知的队列: {', '.join(unknown)}")
+        return 1
+    
+    worker = JobWorker(app, [all_queues[name] for name in queue_names], 
+                       concurrency=args.concurrency)
+    
+    print(f"📥 队列: {', '.join(queue_names)}")
+    print(f"🔢 并发数: {worker.concurrency}")
+    print(f"🔗 Redis: {app.config.get('REDIS_URL')}")
+    print("=" * 50)
+    
+    # 收到终止信号后不再领取新任务，正在执行的任务完成后退出；
+    # 被强制杀死时未确认的任务会在可见性超时后由其他工作进程重新执行
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.request_stop())
+    
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        print("\n⚠️ 工作进程被用户中断，等待正在执行的任务完成...")
+        worker.stop()
+    
+    return 0
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.exit(exit_code)